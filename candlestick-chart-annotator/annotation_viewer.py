@@ -54,22 +54,13 @@ class AnnotationViewer:
         """Fetch annotations with optional filtering."""
         try:
             if self.db_manager:
-                # Use DBManager to get annotations
-                df = self.db_manager.get_annotations()
-                
-                # Apply filters if provided
-                if stock:
-                    df = df[df['stock'] == stock]
-                if signal:
-                    df = df[df['signal'] == signal]
-                if start_date:
-                    start_date = pd.to_datetime(start_date)
-                    df = df[df['timestamp'] >= start_date]
-                if end_date:
-                    end_date = pd.to_datetime(end_date)
-                    df = df[df['timestamp'] <= end_date]
-                
-                return df
+                # Filters are applied in SQL by DBManager
+                return self.db_manager.get_annotations(
+                    stock=stock,
+                    signal=signal,
+                    start=pd.to_datetime(start_date).to_pydatetime() if start_date else None,
+                    end=pd.to_datetime(end_date).to_pydatetime() if end_date else None
+                )
             
             elif self.engine:
                 # Direct SQL query to get annotations
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, Response, render_template, jsonify, request, send_from_directory, stream_with_context
 from flask_caching import Cache
 from flask_socketio import SocketIO, emit
 import pandas as pd
@@ -7,8 +7,9 @@ from datetime import datetime
 import os
 import json
 import traceback
+import bisect
+import logging
 import pytz
-from gevent.pywsgi import WSGIServer
 
 # Try to import the database manager
 try:
@@ -23,15 +24,92 @@ except ImportError:
 
 # Try to import data provider
 try:
-    from data_provider import get_data_provider
+    from data_provider import get_data_provider, OUTPUT_OHLCV
 except ImportError:
     print("Error importing data_provider from current directory")
     try:
-        from data_annotator.data_provider import get_data_provider
+        from data_annotator.data_provider import get_data_provider, OUTPUT_OHLCV
     except ImportError:
         print("Error importing data_provider from data_annotator package")
         # Define a dummy data provider in case the real one is not available
 
+# Try to import the download scheduler
+try:
+    from download_scheduler import DownloadScheduler
+except ImportError:
+    print("Error importing download_scheduler from current directory")
+    try:
+        from data_annotator.download_scheduler import DownloadScheduler
+    except ImportError:
+        print("Error importing download_scheduler from data_annotator package")
+        raise
+
+# Try to import the columnar candle encoder
+try:
+    from candle_json import dumps, encode_columnar, iter_columnar
+except ImportError:
+    print("Error importing candle_json from current directory")
+    try:
+        from data_annotator.candle_json import dumps, encode_columnar, iter_columnar
+    except ImportError:
+        print("Error importing candle_json from data_annotator package")
+        raise
+
+# Try to import the binary candle encoders
+try:
+    from candle_binary import ARROW_MIME, PACKED_MIME, arrow_available, encode_arrow, encode_packed, iter_arrow, iter_packed
+except ImportError:
+    print("Error importing candle_binary from current directory")
+    try:
+        from data_annotator.candle_binary import ARROW_MIME, PACKED_MIME, arrow_available, encode_arrow, encode_packed, iter_arrow, iter_packed
+    except ImportError:
+        print("Error importing candle_binary from data_annotator package")
+        raise
+
+# Try to import the resampling helpers
+try:
+    from resampling import DEFAULT_MAX_POINTS, MAX_POINTS_LIMIT, bucket_minutes, choose_bucket, lttb, resolution_minutes
+except ImportError:
+    print("Error importing resampling from current directory")
+    try:
+        from data_annotator.resampling import DEFAULT_MAX_POINTS, MAX_POINTS_LIMIT, bucket_minutes, choose_bucket, lttb, resolution_minutes
+    except ImportError:
+        print("Error importing resampling from data_annotator package")
+        raise
+
+# Try to import the background job manager
+try:
+    from jobs import JobManager
+except ImportError:
+    print("Error importing jobs from current directory")
+    try:
+        from data_annotator.jobs import JobManager
+    except ImportError:
+        print("Error importing jobs from data_annotator package")
+        raise
+
+try:
+    from response_cache import Prefetcher, TieredCache
+except ImportError:
+    print("Error importing response_cache from current directory")
+    try:
+        from data_annotator.response_cache import Prefetcher, TieredCache
+    except ImportError:
+        print("Error importing response_cache from data_annotator package")
+        raise
+
+try:
+    from metrics import Metrics, configure_slow_query_log
+except ImportError:
+    print("Error importing metrics from current directory")
+    try:
+        from data_annotator.metrics import Metrics, configure_slow_query_log
+    except ImportError:
+        print("Error importing metrics from data_annotator package")
+        raise
+
+logger = logging.getLogger(__name__)
+
 # Pre-defined list of NIFTY 50 stocks
 NIFTY50_STOCKS = [
     'AXISBANK', 'INFY', 'WIPRO', 'ONGC', 'RELIANCE', 'APOLLOHOSP', 'POWERGRID', 
@@ -46,15 +124,40 @@ NIFTY50_STOCKS = [
 
 # Initialize Flask app
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# server.py picks the async mode and, with several workers, the message queue they share
+socketio = SocketIO(app, cors_allowed_origins="*",
+                    async_mode=os.environ.get('SOCKETIO_ASYNC_MODE'),
+                    message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE'))
 
 # Setup caching
 cache = Cache(app, config={
     'CACHE_TYPE': 'filesystem',
     'CACHE_DIR': 'cache-directory',
-    'CACHE_DEFAULT_TIMEOUT': 300  # 5 minutes
+    'CACHE_DEFAULT_TIMEOUT': 300,  # 5 minutes
+    'CACHE_THRESHOLD': 20000  # historical days are kept until evicted
 })
 
+# Request, query and cache metrics served at /metrics; queries over SLOW_QUERY_MS go to the slow-query log
+metrics = Metrics(slow_query_seconds=float(os.environ.get('SLOW_QUERY_MS', 200)) / 1000)
+metrics.init_app(app)
+configure_slow_query_log(os.environ.get('SLOW_QUERY_LOG'))
+
+# In-process LRU in front of the shared filesystem cache for chart data
+chart_cache = TieredCache(cache, memory_bytes=int(os.environ.get('CACHE_MEMORY_MB', 256)) * 1024 * 1024,
+                          on_lookup=metrics.record_cache_lookup)
+
+# Seconds to keep data that can still change outside the app (today's candles, symbol metadata)
+LIVE_CACHE_TIMEOUT = 60
+METADATA_CACHE_TIMEOUT = 300
+
+# Past days only change through backfills; writes made by this app invalidate them at once,
+# writes from other processes (migrate_data.py, scripts) show up after this long
+HISTORICAL_CACHE_TIMEOUT = int(os.environ.get('HISTORICAL_CACHE_HOURS', 24)) * 3600
+
+# Trading days on each side of a served day that are loaded ahead of navigation
+PREFETCH_DAYS = int(os.environ.get('PREFETCH_DAYS', 2))
+prefetcher = Prefetcher(max_workers=2)
+
 # Constants
 VIEW_MODE = 'day'  # 'day' or 'custom'
 VIEW_SIZE = 100  # Number of data points to view at a time for custom view
@@ -75,46 +178,112 @@ COLORS = {
 
 # Initialize database and data provider
 db = DBManager()
+metrics.instrument_engine(db.engine)
 try:
-    data_provider = get_data_provider('fyers')
+    # Downloads only store OHLCV, so skip the derived broker-style columns
+    data_provider = get_data_provider('fyers', output=OUTPUT_OHLCV)
 except Exception as e:
     print(f"Error initializing data provider: {e}")
     # Use dummy provider if real one fails
     data_provider = get_data_provider('dummy')
 
+def invalidate_chart_cache(changes):
+    """Bump the cache versions of symbols and days whose candles were written or deleted"""
+    scopes = ['symbols']
+    for symbol, days in changes.items():
+        scopes.append(f'symbol:{symbol}')
+        if days is None:
+            scopes.append(f'epoch:{symbol}')
+        else:
+            scopes.extend(f'day:{symbol}:{day.isoformat()}' for day in days)
+    chart_cache.bump(*scopes)
+
+db.add_write_listener(invalidate_chart_cache)
+
+# Background jobs report status and progress to every connected client
+jobs = JobManager(on_event=lambda event, payload: socketio.emit(event, payload))
+
 # Global variable to store sample data
 SAMPLE_DATA = {}
 
+# Maximum annotation changes returned by one resync request
+ANNOTATION_CHANGES_LIMIT = 1000
+
+# Maximum annotations per page of a filtered annotation query
+ANNOTATIONS_PAGE_LIMIT = 5000
+
+# Maximum operations in one annotation batch
+ANNOTATION_BATCH_LIMIT = 5000
+
+def parse_annotation_timestamp(value):
+    """Parse an annotation timestamp sent by the chart (JS Date string) or a script (ISO format)
+
+    Raises ValueError if no format matches.
+    """
+    # The chart sends Date.toString() output, e.g. 'Mon Jan 01 2024 09:15:00 GMT+0530'
+    try:
+        return datetime.strptime(value[4:24], "%b %d %Y %H:%M:%S")
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f')
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+def annotation_to_json(record):
+    """Make an annotation record JSON-serializable, adding the display timestamp"""
+    record = {key: value for key, value in record.items() if key != 'version'}
+    timestamp = record['timestamp']
+    record['formatted_timestamp'] = timestamp.strftime('%Y-%m-%d %H:%M:%S') if hasattr(timestamp, 'strftime') else str(timestamp)
+    record['timestamp'] = timestamp.isoformat() if hasattr(timestamp, 'isoformat') else str(timestamp)
+    return record
+
+def annotation_filters(args):
+    """Annotation query filters (stock, date, start, end, signal, limit, offset) from request args or a socket payload
+
+    Raises ValueError for malformed values.
+    """
+    filters = {key: args.get(key) for key in ('stock', 'date', 'signal') if args.get(key)}
+    if 'date' in filters:
+        datetime.strptime(filters['date'], '%Y-%m-%d')
+    for key in ('start', 'end'):
+        if args.get(key):
+            filters[key] = datetime.fromisoformat(args.get(key))
+    if args.get('limit') is not None:
+        filters['limit'] = max(1, min(int(args.get('limit')), ANNOTATIONS_PAGE_LIMIT))
+    if args.get('offset') is not None:
+        filters['offset'] = max(0, int(args.get('offset')))
+    return filters
+
+def annotations_snapshot(**filters):
+    """Annotations matching the filters plus the change version they reflect"""
+    # Read the version first: changes racing the snapshot are replayed, and replays are idempotent
+    version = db.get_annotation_version()
+    annotations_df = db.get_annotations(**filters)
+    annotations = [annotation_to_json(record) for record in annotations_df.to_dict(orient='records')]
+    snapshot = {'annotations': annotations, 'version': version}
+    if filters.get('limit') and len(annotations) == filters['limit']:
+        snapshot['next_offset'] = filters.get('offset', 0) + len(annotations)
+    return snapshot
+
 # Socket.IO event handlers
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
-    print('Client connected')
+    logger.debug('Client connected')
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
-    print('Client disconnected')
+    logger.debug('Client disconnected')
 
 @socketio.on('get_annotations')
-def handle_get_annotations():
-    """Send annotations to client"""
-    try:
-        annotations_df = db.get_annotations()
-        if not annotations_df.empty:
-            # Add formatted timestamp for display
-            annotations_df['formatted_timestamp'] = annotations_df['timestamp'].apply(
-                lambda x: x.strftime('%Y-%m-%d %H:%M:%S') if hasattr(x, 'strftime') else str(x)
-            )
-            # Convert timestamps to ISO strings for JSON serialization
-            annotations_df['timestamp'] = annotations_df['timestamp'].apply(
-                lambda ts: ts.isoformat() if hasattr(ts, 'isoformat') else str(ts)
-            )
-            # Convert to dict before sending via socket.io
-            annotations_dict = annotations_df.to_dict(orient='records')
-            emit('annotations_data', {'annotations': annotations_dict})
-        else:
-            emit('annotations_data', {'annotations': []})
+def handle_get_annotations(data=None):
+    """Send annotations to client, scoped by the optional filters in data"""
+    try:
+        with metrics.track('get_annotations'):
+            snapshot = annotations_snapshot(**annotation_filters(data or {}))
+        emit('annotations_data', snapshot)
     except Exception as e:
         emit('error', {'message': str(e)})
         print(f"Error handling get_annotations: {e}")
@@ -124,24 +293,7 @@ def handle_get_annotations():
 @app.route('/')
 def index():
     """Render the main page"""
-    available_stocks = db.get_available_stocks()
-    # Get date ranges for each stock
-    stock_date_ranges = {}
-    for stock in available_stocks:
-        try:
-            data = db.get_stock_data(stock)
-            if data is not None and not data.empty:
-                min_date = data['timestamp'].min()
-                max_date = data['timestamp'].max()
-                stock_date_ranges[stock] = {
-                    'min_date': min_date.strftime('%Y-%m-%d'),
-                    'max_date': max_date.strftime('%Y-%m-%d')
-                }
-        except Exception as e:
-            print(f"Error getting date range for {stock}: {e}")
-    return render_template('index.html', 
-                         available_stocks=available_stocks,
-                         stock_date_ranges=stock_date_ranges)
+    return render_template('index.html', available_stocks=load_available_stocks())
 
 @app.route('/data')
 def data_management():
@@ -153,6 +305,12 @@ def serve_static(filename):
     """Serve static files"""
     return send_from_directory('static', filename)
 
+@app.route('/metrics')
+def get_metrics():
+    """Request, database and cache metrics in the Prometheus text format"""
+    metrics.set_gauge('cache_memory_bytes', chart_cache.memory.used_bytes)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/stocks/summary', methods=['GET'])
 def get_stocks_summary():
     """Get summary of available stock data"""
@@ -176,6 +334,60 @@ def get_stocks_summary():
             "error": str(e)
         })
 
+def summarize_download(result):
+    """Turn a DownloadScheduler result into a job result with a readable message"""
+    success_count = 0
+    up_to_date = 0
+    error_messages = []
+    for symbol, symbol_result in result['symbols'].items():
+        if symbol_result['errors']:
+            error_messages.extend(f"Error processing {symbol}: {error}" for error in symbol_result['errors'])
+        elif symbol_result['chunks'] == 0:
+            up_to_date += 1
+        elif symbol_result['rows'] == 0:
+            error_messages.append(f"No data available for {symbol}")
+        else:
+            success_count += 1
+
+    totals = result['totals']
+    message = (f"Downloaded data for {success_count} symbol(s): "
+               f"{totals['inserted']} inserted, {totals['updated']} updated, "
+               f"{totals['skipped']} unchanged")
+    if up_to_date:
+        message += f"; {up_to_date} symbol(s) already up to date"
+    if result['cancelled']:
+        message += " (cancelled)"
+    if error_messages:
+        message += f". Errors: {'; '.join(error_messages)}"
+    return {
+        'message': message,
+        'success_count': success_count,
+        'up_to_date': up_to_date,
+        'errors': error_messages,
+        'symbols': result['symbols'],
+        **totals
+    }
+
+def submit_download_job(symbols, resolution, start_date, end_date):
+    """Queue a historical download and return the job"""
+    def run(job):
+        # Fetch all (symbol, chunk) units concurrently and stream them into the DB
+        scheduler = DownloadScheduler(data_provider, db)
+        result = scheduler.run(
+            symbols, resolution, start_date, end_date,
+            on_progress=lambda progress: jobs.update_progress(job, progress),
+            cancel_event=job.cancel_event
+        )
+        return summarize_download(result)
+
+    params = {
+        'symbols': symbols,
+        'resolution': resolution,
+        'start_date': start_date,
+        'end_date': end_date
+    }
+    return jobs.submit('download', params, run)
+
 @app.route('/api/stocks/download', methods=['POST'])
 def download_stocks():
     try:
@@ -185,53 +397,108 @@ def download_stocks():
         end_date = data.get('end_date')
         resolution = data.get('resolution', '1D')
 
-        success_count = 0
-        error_messages = []
+        if not symbols:
+            return jsonify({"error": "No symbols provided"}), 400
 
-        # Download data for each symbol
-        for symbol in symbols:
-            try:
-                # Get data using Fyers provider
-                df = data_provider.get_historical_data(
-                    ticker=symbol,
-                    resolution=resolution,
-                    start_date=start_date,
-                    end_date=end_date
-                )
-                if df is not None and not df.empty:
-                    # Format the data according to our schema
-                    df = df.rename(columns={
-                        'datetime': 'timestamp',
-                        'open_price': 'open',
-                        'high_price': 'high',
-                        'low_price': 'low',
-                        'ltp': 'close',
-                        'last_traded_qty': 'volume'
-                    })
-                    df['symbol'] = symbol
-                    df['resolution'] = resolution
-                    print(df.shape)
-                    success = db.save_stock_data(df)
-                    if success:
-                        success_count += 1
-                    else:
-                        error_messages.append(f"Failed to save data for {symbol}")
-                else:
-                    error_messages.append(f"No data available for {symbol}")
-            except Exception as e:
-                error_messages.append(f"Error processing {symbol}: {str(e)}")
-
-        if success_count > 0:
-            message = f"Successfully downloaded data for {success_count} symbol(s)"
-            if error_messages:
-                message += f". Errors: {'; '.join(error_messages)}"
-            return jsonify({"message": message})
+        job = submit_download_job(symbols, resolution, start_date, end_date)
+        return jsonify({
+            "message": f"Download queued for {len(symbols)} symbol(s)",
+            "job_id": job.id,
+            "status": job.status
+        }), 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def submit_sync_job(symbols, resolution, start_date=None, end_date=None):
+    """Queue a sync that fetches only candles missing from the database"""
+    def run(job):
+        scheduler = DownloadScheduler(data_provider, db)
+        result = scheduler.sync(
+            symbols, resolution, start_date, end_date,
+            on_progress=lambda progress: jobs.update_progress(job, progress),
+            cancel_event=job.cancel_event
+        )
+        return summarize_download(result)
+
+    params = {
+        'symbols': symbols,
+        'resolution': resolution,
+        'start_date': start_date,
+        'end_date': end_date
+    }
+    return jobs.submit('sync', params, run)
+
+@app.route('/api/stocks/sync', methods=['POST'])
+def sync_stocks():
+    """Fetch only the missing and latest candles for the given symbols"""
+    try:
+        data = request.json or {}
+        symbols = data.get('symbols') or db.get_available_stocks()
+        resolution = data.get('resolution', '1')
+
+        if not symbols:
+            return jsonify({"error": "No symbols provided"}), 400
+
+        job = submit_sync_job(symbols, resolution, data.get('start_date'), data.get('end_date'))
+        return jsonify({
+            "message": f"Sync queued for {len(symbols)} symbol(s)",
+            "job_id": job.id,
+            "status": job.status
+        }), 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stocks/download/plan', methods=['POST'])
+def plan_download():
+    """Dry run: report the API calls and time a download or sync would need"""
+    try:
+        data = request.json or {}
+        mode = data.get('mode', 'download')
+        symbols = data.get('symbols') or (db.get_available_stocks() if mode == 'sync' else [])
+        start_date = data.get('start_date')
+        end_date = data.get('end_date')
+
+        if not symbols:
+            return jsonify({"error": "No symbols provided"}), 400
+
+        scheduler = DownloadScheduler(data_provider, db)
+        if mode == 'sync':
+            units = scheduler.plan_sync(symbols, data.get('resolution', '1'), start_date, end_date)
+        elif mode == 'download':
+            if not start_date or not end_date:
+                return jsonify({"error": "start_date and end_date are required"}), 400
+            units = scheduler.plan(symbols, data.get('resolution', '1D'), start_date, end_date)
         else:
-            return jsonify({"error": '; '.join(error_messages)}), 500
+            return jsonify({"error": f"Unknown mode {mode}"}), 400
+
+        return jsonify(scheduler.estimate(units))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/jobs')
+def list_jobs():
+    """List background jobs"""
+    return jsonify({'jobs': [job.to_dict() for job in jobs.list()]})
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Get the status, progress and result of a background job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job {job_id}'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running background job"""
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job {job_id}'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/api/stocks/nifty50', methods=['GET'])
 def get_nifty50_stocks():
     try:
@@ -243,19 +510,16 @@ def get_nifty50_stocks():
 def get_stocks_data_summary():
     """Get detailed summary of available stock data including min/max dates"""
     try:
-        stocks = db.get_available_stocks()
         summary = []
-        
-        for stock in stocks:
-            data = db.get_stock_data(stock)
-            if not data.empty:
-                summary.append({
-                    'symbol': stock,
-                    'start_date': data['timestamp'].min().isoformat(),
-                    'end_date': data['timestamp'].max().isoformat(),
-                    'row_count': len(data),
-                    'resolution': '1min'  # Assuming all data is 1-minute resolution
-                })
+        for entry in db.get_stock_catalog():
+            summary.append({
+                'symbol': entry['symbol'],
+                'start_date': entry['start_date'].isoformat(),
+                'end_date': entry['end_date'].isoformat(),
+                'row_count': entry['row_count'],
+                'trading_days': entry['trading_days'],
+                'resolution': entry['resolution']
+            })
         
         return jsonify({'summary': summary})
     except Exception as e:
@@ -276,48 +540,14 @@ def download_stock_data():
         if not data_provider:
             return jsonify({'error': 'Data provider not available'}), 400
             
-        # Initialize provider
-        provider = get_data_provider('fyers')
-        all_data = []
-        
-        for symbol in symbols:
-            try:
-                # Get data with 1-minute resolution
-                data = provider.get_historical_data(
-                    symbol, 
-                    resolution='1',
-                    start_date=start_date,
-                    end_date=end_date
-                )
-                
-                if not data.empty:
-                    data['stock'] = symbol
-                    all_data.append(data)
-                    
-            except Exception as e:
-                return jsonify({'error': f'Error downloading {symbol}: {str(e)}'}), 500
-                
-        if not all_data:
-            return jsonify({'error': 'No data downloaded'}), 400
-            
-        # Combine and format data
-        df = pd.concat(all_data)
-        df = df[['last_traded_time', 'open_price', 'high_price', 'low_price', 'ltp', 'last_traded_qty', 'stock']]
-        df.columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'stock']
-        df['timestamp'] = df['timestamp'].apply(lambda x: datetime.fromtimestamp(x))
-        df = df.sort_values(by=['stock','timestamp'])
-        df = df.reset_index(drop=True)
-        # Save to database
-        success = db.save_stock_data(df)
-        
-        if success:
-            return jsonify({
-                'message': 'Data downloaded successfully',
-                'rows': len(df),
-                'symbols': symbols
-            })
-        else:
-            return jsonify({'error': 'Failed to save data to database'}), 500
+        # Download 1-minute candles in the background
+        job = submit_download_job(symbols, '1', start_date, end_date)
+        return jsonify({
+            'message': f'Download queued for {len(symbols)} symbol(s)',
+            'job_id': job.id,
+            'status': job.status,
+            'symbols': symbols
+        }), 202
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -341,39 +571,194 @@ def delete_stock_data(symbol):
 @app.route('/api/stocks')
 def get_stocks():
     """Get list of available stocks"""
-    stocks = db.get_available_stocks()
-    return jsonify({'stocks': stocks})
+    return jsonify({'stocks': load_available_stocks()})
+
+def negotiate_candle_format():
+    """Pick the candle encoding from the Accept header (columnar JSON by default)"""
+    offered = ['application/json', PACKED_MIME]
+    if arrow_available():
+        offered.append(ARROW_MIME)
+    return request.accept_mimetypes.best_match(offered, default='application/json')
+
+def encode_candles(data, mimetype, **meta):
+    """Encode a candle frame in the given format"""
+    if mimetype == PACKED_MIME:
+        return encode_packed(data)
+    if mimetype == ARROW_MIME:
+        return encode_arrow(data)
+    return encode_columnar(data, **meta)
+
+def candle_body_response(body, mimetype):
+    """Wrap encoded candles in a response that varies on Accept"""
+    response = Response(body, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+def candle_response(data, mimetype, **meta):
+    """Encode a candle frame in the negotiated format"""
+    return candle_body_response(encode_candles(data, mimetype, **meta), mimetype)
+
+def stream_candle_response(frames, mimetype, **meta):
+    """Stream candle frames in the negotiated format"""
+    if mimetype == PACKED_MIME:
+        body = iter_packed(frames)
+    elif mimetype == ARROW_MIME:
+        body = iter_arrow(frames)
+    else:
+        body = iter_columnar(frames, **meta)
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+def market_today():
+    """Current date in IST, the timezone candles are stored in"""
+    return datetime.now(pytz.timezone('Asia/Kolkata')).date()
+
+def load_day_candles(symbol, date, mimetype='application/json'):
+    """Encoded candles of one day, or None if there are none
+
+    Past days are cached for HISTORICAL_CACHE_TIMEOUT, or until a write to that day bumps its version.
+    """
+    day = pd.Timestamp(date).date().isoformat()
+
+    def compute():
+        data = db.get_stock_data(symbol, date=day)
+        if data is None or data.empty:
+            return None
+        return encode_candles(data, mimetype, symbol=symbol, date=day)
+
+    return chart_cache.get_or_compute(
+        f'candles:{symbol}:{day}:{mimetype}',
+        [f'epoch:{symbol}', f'day:{symbol}:{day}'],
+        compute,
+        timeout=HISTORICAL_CACHE_TIMEOUT if day < market_today().isoformat() else LIVE_CACHE_TIMEOUT
+    )
+
+def prefetch_adjacent_days(symbol, date, mimetype):
+    """Load the trading days around date into the cache in the background"""
+    if PREFETCH_DAYS <= 0:
+        return
+    day = pd.Timestamp(date).date().isoformat()
+
+    def prefetch():
+        dates = load_stock_dates(symbol)['dates']
+        position = bisect.bisect_left(dates, day)
+        after = position + 1 if position < len(dates) and dates[position] == day else position
+        # Nearest days first, alternating forwards and backwards
+        for offset in range(PREFETCH_DAYS):
+            for index in (after + offset, position - 1 - offset):
+                if 0 <= index < len(dates):
+                    load_day_candles(symbol, dates[index], mimetype)
+
+    prefetcher.submit(f'adjacent:{symbol}:{day}:{mimetype}', prefetch)
+
+def warm_chart_cache():
+    """Preload the date catalogs of every symbol in the background"""
+    def warm():
+        load_stock_date_ranges()
+        for symbol in db.get_available_stocks():
+            load_stock_dates(symbol)
+            load_date_range(symbol)
+
+    prefetcher.submit('warm-up', warm)
+
+def load_candle_buckets(symbol, start_date, end_date, minutes, resolution):
+    """Aggregated candles for a range, cached per bucket size until the symbol is written"""
+    return chart_cache.get_or_compute(
+        f'buckets:{symbol}:{start_date}:{end_date}:{minutes}:{resolution}',
+        [f'symbol:{symbol}'],
+        lambda: db.get_stock_buckets(symbol, start_date, end_date, minutes, resolution),
+        timeout=HISTORICAL_CACHE_TIMEOUT if end_date < market_today() else LIVE_CACHE_TIMEOUT
+    )
+
+def finest_resolution(resolutions):
+    """Pick the finest of the stored resolutions"""
+    def sort_key(resolution):
+        minutes = resolution_minutes(resolution)
+        return (minutes is None, minutes or 0)
+    return min(resolutions, key=sort_key)
+
+@app.route('/api/stock/<symbol>/candles')
+def get_stock_candles(symbol):
+    """Candles for a date range re-aggregated to fit max_points, or an LTTB line of closes with line_points"""
+    try:
+        entries = db.get_stock_catalog(symbol)
+        if not entries:
+            return jsonify({'error': f'No data available for {symbol}'}), 404
+
+        resolution = request.args.get('resolution') or finest_resolution([e['resolution'] for e in entries])
+        entry = next((e for e in entries if e['resolution'] == resolution), None)
+        if entry is None:
+            return jsonify({'error': f'No {resolution} data available for {symbol}'}), 404
+
+        try:
+            start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else entry['start_date'].date()
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else entry['end_date'].date()
+        except ValueError:
+            return jsonify({'error': 'start and end must be in YYYY-MM-DD format'}), 400
+        if start > end:
+            return jsonify({'error': 'start must not be after end'}), 400
+
+        line_points = request.args.get('line_points', type=int)
+        if line_points is not None:
+            # LTTB keeps the first and last point plus one per bucket, so fewer than 3 would not downsample
+            if line_points < 3:
+                return jsonify({'error': 'line_points must be at least 3'}), 400
+            # Pixel-aware line overlay: keep the visually significant closes only
+            closes = db.get_stock_closes(symbol, start, end, resolution)
+            t = closes['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+            values = closes['close'].to_numpy()
+            keep = lttb(t, values, min(line_points, MAX_POINTS_LIMIT))
+            body = dumps({
+                'format': 'line',
+                'symbol': symbol,
+                't': t[keep],
+                'close': values[keep],
+                'count': len(keep)
+            })
+            return Response(body, mimetype='application/json')
+
+        max_points = min(request.args.get('max_points', DEFAULT_MAX_POINTS, type=int), MAX_POINTS_LIMIT)
+        bucket = request.args.get('bucket', 'auto')
+        if bucket == 'auto':
+            bucket, minutes = choose_bucket(start, end, max_points, resolution)
+        else:
+            try:
+                minutes = bucket_minutes(bucket)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+        data = load_candle_buckets(symbol, start, end, minutes, resolution)
+        response = candle_response(data, negotiate_candle_format(), symbol=symbol, bucket=bucket,
+                                   start=start.isoformat(), end=end.isoformat())
+        response.headers['X-Candle-Bucket'] = bucket
+        return response
+    except Exception as e:
+        print(f"Error in get_stock_candles: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/stock/<symbol>/data')
-@cache.memoize(timeout=180)
 def get_stock_data_route(symbol):
-    """Get stock data for a specific symbol"""
+    """Stream the full history of a symbol as columnar JSON, packed floats or Arrow"""
     try:
-        data = db.get_stock_data(symbol)
-        if data is not None and not data.empty:
-            data_dict = data.to_dict(orient='records')
-            return jsonify({'data': data_dict})
-        return jsonify({'error': f'No data available for {symbol}'}), 404
+        min_date, _ = db.get_stock_date_range(symbol)
+        if min_date is None:
+            return jsonify({'error': f'No data available for {symbol}'}), 404
+        # Rows are read and encoded chunk by chunk while the response is sent
+        return stream_candle_response(db.iter_stock_data(symbol), negotiate_candle_format(), symbol=symbol)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/annotations')
 def get_annotations_route():
-    """Get all annotations"""
-    try:
-        annotations_df = db.get_annotations()
-        if not annotations_df.empty:
-            # Add formatted timestamp for display
-            annotations_df['formatted_timestamp'] = annotations_df['timestamp'].apply(
-                lambda x: x.strftime('%Y-%m-%d %H:%M:%S') if hasattr(x, 'strftime') else str(x)
-            )
-            # Convert timestamps to ISO strings for JSON serialization
-            annotations_df['timestamp'] = annotations_df['timestamp'].apply(
-                lambda ts: ts.isoformat() if hasattr(ts, 'isoformat') else str(ts)
-            )
-            annotations_dict = annotations_df.to_dict(orient='records')
-            return jsonify({'annotations': annotations_dict})
-        return jsonify({'annotations': []})
+    """Get annotations, filtered by ?stock=&date=&start=&end=&signal= and paged by ?limit=&offset="""
+    try:
+        try:
+            filters = annotation_filters(request.args)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid filter: {e}'}), 400
+        return jsonify(annotations_snapshot(**filters))
     except Exception as e:
         print(f"Error getting annotations: {e}")
         traceback.print_exc()
@@ -393,31 +778,20 @@ def add_annotation():
     """Add a new annotation"""
     try:
         data = request.json
-        print(f"Received annotation data: {data}")
+        logger.debug("Received annotation data: %s", data)
         
         # Parse timestamp if it's a string
         timestamp = data['timestamp']
         if isinstance(timestamp, str):
             try:
-                # Try to parse ISO format with timezone info
-                # Remove Z and assume local time if no timezone specified
-                # timestamp_str = timestamp.replace('Z', '')
-                # timestamp = datetime.fromisoformat(timestamp_str)
-                timestamp = datetime.strptime(timestamp[4:24], "%b %d %Y %H:%M:%S")
-                # timestamp = timestamp.astimezone(pytz.timezone('Asia/Kolkata'))
-                print(f"Parsed timestamp: {timestamp}")
-            except ValueError as e:
-                print(f"Error parsing timestamp: {e}")
-                try:
-                    # Try alternative format
-                    timestamp = datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S.%f')
-                    print(f"Parsed timestamp with alternative format: {timestamp}")
-                except ValueError:
-                    print(f"Could not parse timestamp: {timestamp}")
-                    return jsonify({'error': f'Invalid timestamp format: {timestamp}'}), 400
+                timestamp = parse_annotation_timestamp(timestamp)
+                logger.debug("Parsed timestamp: %s", timestamp)
+            except ValueError:
+                print(f"Could not parse timestamp: {timestamp}")
+                return jsonify({'error': f'Invalid timestamp format: {timestamp}'}), 400
         
         # Store the timestamp in the database
-        success = db.save_annotation(
+        annotation = db.save_annotation(
             timestamp,
             data['stock'],
             data['signal'],
@@ -425,56 +799,101 @@ def add_annotation():
             data.get('reason')
         )
         
-        if success:
-            # Get the latest annotations to broadcast to all clients
-            annotations_df = db.get_annotations()
-            if not annotations_df.empty:
-                # Make sure to convert pandas timestamps to strings before sending via Socket.IO
-                # First create the formatted_timestamp field for display
-                annotations_df['formatted_timestamp'] = annotations_df['timestamp'].apply(
-                    lambda x: x.strftime('%Y-%m-%d %H:%M:%S') if hasattr(x, 'strftime') else str(x)
-                )
-                
-                # Convert the original timestamp to ISO strings for proper serialization
-                annotations_df['timestamp'] = annotations_df['timestamp'].apply(
-                    lambda x: x.isoformat() if hasattr(x, 'isoformat') else str(x)
-                )
-                
-                # Convert to dictionary for JSON serialization
-                annotations_dict = annotations_df.to_dict(orient='records')
-                socketio.emit('annotations_updated', {'annotations': annotations_dict})
-            return jsonify({'message': 'Annotation saved successfully'})
+        if annotation:
+            # Broadcast just the new row; clients that missed a version resync
+            socketio.emit('annotation_added', {
+                'annotation': annotation_to_json(annotation),
+                'version': annotation['version']
+            })
+            return jsonify({'message': 'Annotation saved successfully', 'id': annotation['id'], 'version': annotation['version']})
         return jsonify({'error': 'Failed to save annotation'}), 500
     except Exception as e:
         print(f"Error saving annotation: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/annotations/batch', methods=['POST'])
+def annotation_batch():
+    """Apply many annotation creates/deletes in one transaction
+
+    Body: {"operations": [{"op": "create", "client_id", "timestamp", "stock",
+    "signal", "price", "reason"}, {"op": "delete", "id" or "client_id"}, ...]}.
+    Replaying a batch is safe: creates whose client_id exists are skipped.
+    """
+    try:
+        operations = (request.json or {}).get('operations') or []
+        if len(operations) > ANNOTATION_BATCH_LIMIT:
+            return jsonify({'error': f'At most {ANNOTATION_BATCH_LIMIT} operations per batch'}), 400
+        for index, op in enumerate(operations):
+            if op.get('op') == 'create':
+                missing = [key for key in ('timestamp', 'stock', 'signal') if not op.get(key)]
+                if missing:
+                    return jsonify({'error': f'Operation {index} is missing {", ".join(missing)}'}), 400
+                try:
+                    op['timestamp'] = parse_annotation_timestamp(op['timestamp'])
+                except (TypeError, ValueError):
+                    return jsonify({'error': f'Operation {index} has an invalid timestamp: {op["timestamp"]}'}), 400
+            elif op.get('op') == 'delete':
+                if op.get('id') is None and not op.get('client_id'):
+                    return jsonify({'error': f'Operation {index} needs an id or client_id'}), 400
+            else:
+                return jsonify({'error': f'Operation {index} has an unknown op: {op.get("op")}'}), 400
+
+        result = db.apply_annotation_batch(operations)
+        changes = [{
+            'action': change['action'],
+            'annotation': annotation_to_json(change['annotation']),
+            'version': change['version']
+        } for change in result['changes']]
+        if changes:
+            # One event for the whole batch
+            socketio.emit('annotations_changed', {'changes': changes, 'version': changes[-1]['version']})
+        return jsonify({
+            'created': [annotation_to_json(r) for r in result['created']],
+            'deleted': [annotation_to_json(r) for r in result['deleted']],
+            'existing': [annotation_to_json(r) for r in result['existing']],
+            'missing': [{key: value for key, value in op.items() if key in ('id', 'client_id')} for op in result['missing']],
+            'version': changes[-1]['version'] if changes else db.get_annotation_version()
+        })
+    except Exception as e:
+        print(f"Error applying annotation batch: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+def broadcast_annotation_deleted(annotation):
+    """Tell every client which annotation was removed"""
+    socketio.emit('annotation_deleted', {
+        'id': annotation['id'],
+        'annotation': annotation_to_json(annotation),
+        'version': annotation['version']
+    })
+
+@app.route('/api/annotations/changes')
+def get_annotation_changes():
+    """Get annotation changes after ?since=<version> so clients can catch up"""
+    try:
+        since = request.args.get('since', 0, type=int)
+        changes = db.get_annotation_changes(since, limit=ANNOTATION_CHANGES_LIMIT)
+        for change in changes:
+            change['annotation'] = annotation_to_json(change['annotation'])
+        version = changes[-1]['version'] if changes else max(since, db.get_annotation_version())
+        return jsonify({
+            'changes': changes,
+            'version': version,
+            'more': len(changes) == ANNOTATION_CHANGES_LIMIT
+        })
+    except Exception as e:
+        print(f"Error getting annotation changes: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/annotations/last', methods=['DELETE'])
 def delete_last():
     """Delete the last annotation"""
     try:
-        success = db.delete_last_annotation()
-        if success:
-            # Broadcast updated annotations
-            annotations_df = db.get_annotations()
-            if not annotations_df.empty:
-                # Make sure to convert pandas timestamps to strings before sending via Socket.IO
-                # First create the formatted_timestamp field for display
-                annotations_df['formatted_timestamp'] = annotations_df['timestamp'].apply(
-                    lambda x: x.strftime('%Y-%m-%d %H:%M:%S') if hasattr(x, 'strftime') else str(x)
-                )
-                
-                # Convert the original timestamp to ISO strings for proper serialization
-                annotations_df['timestamp'] = annotations_df['timestamp'].apply(
-                    lambda x: x.isoformat() if hasattr(x, 'isoformat') else str(x)
-                )
-                
-                # Convert to dictionary for JSON serialization
-                annotations_dict = annotations_df.to_dict(orient='records')
-            else:
-                annotations_dict = []
-            socketio.emit('annotations_updated', {'annotations': annotations_dict})
+        annotation = db.delete_last_annotation()
+        if annotation:
+            broadcast_annotation_deleted(annotation)
             return jsonify({'message': 'Last annotation deleted successfully'})
         return jsonify({'error': 'Failed to delete annotation'}), 500
     except Exception as e:
@@ -486,27 +905,9 @@ def delete_last():
 def delete_specific(annotation_id):
     """Delete a specific annotation"""
     try:
-        success = db.delete_annotation(annotation_id)
-        if success:
-            # Broadcast updated annotations
-            annotations_df = db.get_annotations()
-            if not annotations_df.empty:
-                # Make sure to convert pandas timestamps to strings before sending via Socket.IO
-                # First create the formatted_timestamp field for display
-                annotations_df['formatted_timestamp'] = annotations_df['timestamp'].apply(
-                    lambda x: x.strftime('%Y-%m-%d %H:%M:%S') if hasattr(x, 'strftime') else str(x)
-                )
-                
-                # Convert the original timestamp to ISO strings for proper serialization
-                annotations_df['timestamp'] = annotations_df['timestamp'].apply(
-                    lambda x: x.isoformat() if hasattr(x, 'isoformat') else str(x)
-                )
-                
-                # Convert to dictionary for JSON serialization
-                annotations_dict = annotations_df.to_dict(orient='records')
-            else:
-                annotations_dict = []
-            socketio.emit('annotations_updated', {'annotations': annotations_dict})
+        annotation = db.delete_annotation(annotation_id)
+        if annotation:
+            broadcast_annotation_deleted(annotation)
             return jsonify({'message': 'Annotation deleted successfully'})
         return jsonify({'error': 'Failed to delete annotation'}), 500
     except Exception as e:
@@ -514,100 +915,139 @@ def delete_specific(annotation_id):
         traceback.print_exc() 
         return jsonify({'error': str(e)}), 500
 
+def load_date_range(symbol):
+    """Min and max timestamp of a symbol, or None if it has no data"""
+    def compute():
+        min_date, max_date = db.get_stock_date_range(symbol)
+        if min_date is None:
+            return None
+        return {'min_date': min_date.isoformat(), 'max_date': max_date.isoformat() if max_date else None}
+    return chart_cache.get_or_compute(f'date-range:{symbol}', [f'symbol:{symbol}'], compute,
+                                      timeout=METADATA_CACHE_TIMEOUT)
+
+def load_stock_dates(symbol):
+    """Trading days of a symbol at its finest stored resolution"""
+    def compute():
+        resolutions = [entry['resolution'] for entry in db.get_stock_catalog(symbol)]
+        if not resolutions:
+            return {'dates': [], 'min_date': None, 'max_date': None}
+        # 1-minute data has a daily rollup row per trading day; other resolutions fall back to a distinct-date query
+        resolution = finest_resolution(resolutions)
+        dates = db.get_stock_trading_days(symbol, resolution if resolution == '1' else None)
+        if dates:
+            return {
+                'dates': [date.strftime('%Y-%m-%d') for date in dates],
+                'min_date': dates[0].strftime('%Y-%m-%d'),
+                'max_date': dates[-1].strftime('%Y-%m-%d')
+            }
+        return {'dates': [], 'min_date': None, 'max_date': None}
+    return chart_cache.get_or_compute(f'dates:{symbol}', [f'symbol:{symbol}'], compute,
+                                      timeout=METADATA_CACHE_TIMEOUT)
+
+def load_available_stocks():
+    """Symbols with stored candles, from the catalog"""
+    return chart_cache.get_or_compute('stocks', ['symbols'], db.get_available_stocks, timeout=METADATA_CACHE_TIMEOUT)
+
+def load_stock_date_ranges():
+    """Date range of every stored symbol"""
+    def compute():
+        return {
+            stock: {
+                'min_date': date_range['min_date'].strftime('%Y-%m-%d'),
+                'max_date': date_range['max_date'].strftime('%Y-%m-%d')
+            }
+            for stock, date_range in db.get_stock_date_ranges().items()
+        }
+    return chart_cache.get_or_compute('date-ranges', ['symbols'], compute, timeout=METADATA_CACHE_TIMEOUT)
+
 @app.route('/api/stock/<symbol>/date-range')
-@cache.memoize(timeout=300)
 def get_date_range(symbol):
     """Get date range for a specific stock"""
     try:
-        data = db.get_stock_data(symbol)
-        if data is not None and not data.empty:
-            min_date = data['timestamp'].min()
-            max_date = data['timestamp'].max()
-            return jsonify({
-                'min_date': min_date.isoformat() if min_date else None,
-                'max_date': max_date.isoformat() if max_date else None
-            })
+        date_range = load_date_range(symbol)
+        if date_range is not None:
+            return jsonify(date_range)
         return jsonify({'error': f'No data available for {symbol}'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/stock/<symbol>/dates')
-@cache.memoize(timeout=300)
 def get_stock_dates(symbol):
     """Get all available dates for a specific stock"""
     try:
-        data = db.get_stock_data(symbol)
-        if data is not None and not data.empty:
-            # Convert timestamps to dates and get unique dates
-            dates = data['timestamp'].dt.date.unique()
-            return jsonify({
-                'dates': [date.strftime('%Y-%m-%d') for date in sorted(dates)],
-                'min_date': min(dates).strftime('%Y-%m-%d'),
-                'max_date': max(dates).strftime('%Y-%m-%d')
-            })
-        return jsonify({'dates': [], 'min_date': None, 'max_date': None})
+        return jsonify(load_stock_dates(symbol))
     except Exception as e:
         print(f"Error getting stock dates: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/stock-date-ranges')
-@cache.memoize(timeout=300)
 def get_all_stock_date_ranges():
     """Get date ranges for all available stocks"""
     try:
-        stocks = db.get_available_stocks()
-        date_ranges = {}
-        for stock in stocks:
-            try:
-                data = db.get_stock_data(stock)
-                if data is not None and not data.empty:
-                    min_date = data['timestamp'].min()
-                    max_date = data['timestamp'].max()
-                    date_ranges[stock] = {
-                        'min_date': min_date.strftime('%Y-%m-%d'),
-                        'max_date': max_date.strftime('%Y-%m-%d')
-                    }
-            except Exception as e:
-                print(f"Error processing stock {stock}: {e}")
-        return jsonify(date_ranges)
+        return jsonify(load_stock_date_ranges())
     except Exception as e:
         print(f"Error getting stock date ranges: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/bootstrap')
+def get_bootstrap():
+    """Everything the chart page needs to draw its first day, in one response
+
+    ?stock=&date= pick the initial view (e.g. the saved preference); otherwise
+    the first stock and its latest trading day are used. Returns the symbol
+    list, the stock's trading days, that day's candles as columnar JSON and
+    the day's annotations with their change version.
+    """
+    try:
+        stocks = load_available_stocks()
+        stock = request.args.get('stock')
+        if stock not in stocks:
+            stock = stocks[0] if stocks else None
+        dates = load_stock_dates(stock)['dates'] if stock else []
+        date = request.args.get('date')
+        if date not in dates:
+            date = dates[-1] if dates else None
+
+        candles = None
+        annotations = {'annotations': [], 'version': db.get_annotation_version()}
+        if date:
+            candles = load_day_candles(stock, date)
+            prefetch_adjacent_days(stock, date, 'application/json')
+            annotations = annotations_snapshot(stock=stock, date=date)
+
+        # The cached day body is already JSON, so splice it in rather than re-encoding it
+        rest = dumps({
+            'stocks': stocks,
+            'stock': stock,
+            'dates': dates,
+            'date': date,
+            'annotations': annotations['annotations'],
+            'version': annotations['version']
+        })
+        body = b'{"candles":' + (candles or b'null') + b',' + rest[1:]
+        return Response(body, mimetype='application/json')
+    except Exception as e:
+        print(f"Error in get_bootstrap: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/stock/<symbol>/date/<date>')
-@cache.memoize(timeout=180)
 def get_stock_data_for_date(symbol, date):
     """Get stock data for a specific symbol and date"""
     try:
-        print(f"API - Getting data for {symbol} on {date}")
-        
-        # Get data from database
-        print(f"Calling db.get_stock_data with symbol={symbol}, date={date}")
-        data = db.get_stock_data(symbol, date=date)
-        
-        # Debug log data properties
-        if data is not None and not data.empty:
-            print(f"Found {len(data)} records")
-            print(f"Data columns: {data.columns.tolist()}")
-            print(f"First record timestamp: {data.iloc[0]['timestamp'] if len(data) > 0 else 'N/A'}")
-            
-            # Handle timestamp serialization
-            try:
-                # Convert timestamp columns to ISO format strings for JSON serialization
-                if 'timestamp' in data.columns:
-                    data['timestamp'] = data['timestamp'].apply(lambda x: x.isoformat() if hasattr(x, 'isoformat') else str(x))
-                
-                # Convert DataFrame to dict for JSON serialization
-                data_dict = data.to_dict(orient='records')
-                print(f"Returning {len(data_dict)} records for {symbol} on {date}")
-                return jsonify({'data': data_dict})
-            except Exception as e:
-                print(f"Error converting data to JSON: {e}")
-                traceback.print_exc()
-                return jsonify({'error': f'Error converting data to JSON: {str(e)}'}), 500
-        else:
-            print(f"No data found for {symbol} on {date}")
+        try:
+            pd.Timestamp(date)
+        except ValueError:
+            return jsonify({'error': 'date must be in YYYY-MM-DD format'}), 400
+
+        # Serialize as parallel arrays (JSON, packed floats or Arrow), served from the cache when possible
+        mimetype = negotiate_candle_format()
+        body = load_day_candles(symbol, date, mimetype)
+        # Annotators step through days in order, so have the neighbours ready
+        prefetch_adjacent_days(symbol, date, mimetype)
+        if body is None:
             return jsonify({'error': f'No data available for {symbol} on {date}'}), 404
+        return candle_body_response(body, mimetype)
     except Exception as e:
         print(f"Error in get_stock_data_for_date: {e}")
         traceback.print_exc()
@@ -706,5 +1146,6 @@ def get_test_stock_data(symbol, date):
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    warm_chart_cache()
     # Use SocketIO for WebSocket support
     socketio.run(app, host='0.0.0.0', port=8050, debug=False)
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Binary encodings of candle data for the chart endpoints.
+
+Two formats are offered next to columnar JSON:
+
+* PACKED_MIME: a sequence of blocks, each an 8-byte header (b'CNDL' and a
+  little-endian uint32 row count) followed by six little-endian float64 columns
+  of that many values: t (epoch ms of the IST wall-clock time, as in
+  candle_json), open, high, low, close and volume. Blocks are 8-byte aligned so
+  browsers can view them directly as Float64Array.
+* ARROW_MIME: an Arrow IPC stream with one record batch per chunk (requires pyarrow).
+"""
+
+import io
+import struct
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from candle_json import CANDLE_FIELDS, to_columns
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+PACKED_MIME = 'application/x-candles'
+ARROW_MIME = 'application/vnd.apache.arrow.stream'
+
+PACKED_MAGIC = b'CNDL'
+PACKED_COLUMNS = ['t'] + CANDLE_FIELDS
+
+
+def arrow_available() -> bool:
+    """Whether Arrow IPC responses can be produced."""
+    return pa is not None
+
+
+def encode_packed(df: pd.DataFrame) -> bytes:
+    """
+    Encode candles as one packed block.
+
+    Args:
+        df: Candles with timestamp and OHLCV columns
+
+    Returns:
+        bytes: Header and column data
+    """
+    columns = to_columns(df)
+    packed = np.empty((len(PACKED_COLUMNS), len(df)), dtype='<f8')
+    for row, name in enumerate(PACKED_COLUMNS):
+        packed[row] = columns[name]
+    return struct.pack('<4sI', PACKED_MAGIC, len(df)) + packed.tobytes()
+
+
+def iter_packed(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    """Encode frames lazily as consecutive packed blocks."""
+    for frame in frames:
+        if not frame.empty:
+            yield encode_packed(frame)
+
+
+def _arrow_schema():
+    return pa.schema([
+        ('timestamp', pa.timestamp('ms')),
+        ('open', pa.float64()),
+        ('high', pa.float64()),
+        ('low', pa.float64()),
+        ('close', pa.float64()),
+        ('volume', pa.int64())
+    ])
+
+
+def iter_arrow(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    """
+    Encode frames lazily as an Arrow IPC stream.
+
+    Args:
+        frames: Candle frames in timestamp order
+
+    Yields:
+        bytes: The schema message, one message per record batch and the end-of-stream marker
+    """
+    schema = _arrow_schema()
+    sink = io.BytesIO()
+
+    def drain() -> bytes:
+        # Hand out what the writer produced so far and reuse the buffer
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for frame in frames:
+            if frame.empty:
+                continue
+            writer.write_batch(pa.RecordBatch.from_pandas(frame[schema.names], schema=schema, preserve_index=False))
+            yield drain()
+    # Schema message if nothing was written, plus the end-of-stream marker
+    yield drain()
+
+
+def encode_arrow(df: pd.DataFrame) -> bytes:
+    """Encode candles as a single-batch Arrow IPC stream."""
+    return b''.join(iter_arrow([df]))
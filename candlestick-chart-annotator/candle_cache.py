@@ -0,0 +1,261 @@
+"""
+On-disk candle cache for data providers.
+
+Raw candles are stored as one Parquet dataset per (resolution, symbol),
+partitioned into one file per IST trading day. A small manifest records which
+days are fully covered (including days that had no candles), so any requested
+range is served from the overlapping partitions and only uncovered days are
+fetched again. Total size is bounded by a byte budget with least-recently-used
+eviction of day partitions.
+
+Requires pyarrow; without it the cache reports itself as unavailable.
+"""
+
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pandas as pd
+import pytz
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+IST = pytz.timezone('Asia/Kolkata')
+
+# Raw candle columns as returned by the broker: epoch seconds and OHLCV
+CANDLE_COLUMNS = ['t', 'o', 'h', 'l', 'c', 'v']
+
+MANIFEST_NAME = '_manifest.json'
+
+# Default size budget for the whole cache
+DEFAULT_MAX_BYTES = int(os.getenv('CANDLE_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+
+
+def empty_candles() -> pd.DataFrame:
+    """Return an empty raw candle frame with the cached column types."""
+    return pd.DataFrame({
+        column: pd.Series(dtype='int64' if column == 't' else 'float64')
+        for column in CANDLE_COLUMNS
+    })
+
+
+class CandleCache:
+    """Day-partitioned Parquet cache of raw candles with an LRU size budget."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Root directory of the cache
+            max_bytes: Maximum total size of cached partitions in bytes
+        """
+        self.root = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+
+    @staticmethod
+    def available() -> bool:
+        """Whether the Parquet backend is installed."""
+        return pq is not None
+
+    def _dataset_dir(self, ticker: str, resolution: str) -> Path:
+        safe_ticker = ticker.replace(':', '_').replace('/', '_')
+        return self.root / f"resolution={resolution}" / f"symbol={safe_ticker}"
+
+    @staticmethod
+    def _partition_path(dataset: Path, day: date) -> Path:
+        return dataset / f"date={day.isoformat()}.parquet"
+
+    def _load_manifest(self, dataset: Path) -> dict:
+        path = dataset / MANIFEST_NAME
+        if not path.exists():
+            return {'days': {}}
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'days': {}}
+
+    def _save_manifest(self, dataset: Path, manifest: dict) -> None:
+        path = dataset / MANIFEST_NAME
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+
+    def _covered(self, dataset: Path, manifest: dict, day: date) -> bool:
+        rows = manifest['days'].get(day.isoformat())
+        if rows is None:
+            return False
+        # Days without candles have no partition file
+        return rows == 0 or self._partition_path(dataset, day).exists()
+
+    def lookup(self, ticker: str, resolution: str, start_date: str, end_date: str) -> Tuple[pd.DataFrame, List[Tuple[str, str]]]:
+        """
+        Read cached candles for a range and report the windows that still need fetching.
+
+        Args:
+            ticker: Stock ticker symbol
+            resolution: Time resolution
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+
+        Returns:
+            Tuple[pd.DataFrame, List[Tuple[str, str]]]: Cached raw candles and the
+            (start_date, end_date) windows of uncovered days
+        """
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+        dataset = self._dataset_dir(ticker, resolution)
+
+        with self._lock:
+            manifest = self._load_manifest(dataset)
+            paths = []
+            missing = []
+            day = start
+            while day <= end:
+                if self._covered(dataset, manifest, day):
+                    if manifest['days'][day.isoformat()] > 0:
+                        paths.append(self._partition_path(dataset, day))
+                else:
+                    missing.append(day)
+                day += timedelta(days=1)
+
+            frame = empty_candles()
+            if paths:
+                # Paths carry hive-style names; keep them out of the returned columns
+                dataset_files = pq.ParquetDataset([str(p) for p in paths], partitioning=None)
+                frame = dataset_files.read(columns=CANDLE_COLUMNS).to_pandas()
+                # Bump modification times so eviction drops the least recently used days
+                for path in paths:
+                    os.utime(path)
+
+        return frame, self._coalesce(missing)
+
+    @staticmethod
+    def _coalesce(days: List[date]) -> List[Tuple[str, str]]:
+        windows = []
+        for day in days:
+            if windows and windows[-1][1] == day - timedelta(days=1):
+                windows[-1][1] = day
+            else:
+                windows.append([day, day])
+        return [(first.isoformat(), last.isoformat()) for first, last in windows]
+
+    def store(self, ticker: str, resolution: str, start_date: str, end_date: str, candles: pd.DataFrame) -> None:
+        """
+        Store the candles fetched for a window and mark its completed days as covered.
+
+        Today and future days are not cached, since they may still receive candles.
+
+        Args:
+            ticker: Stock ticker symbol
+            resolution: Time resolution
+            start_date: Start date of the fetched window in YYYY-MM-DD format
+            end_date: End date of the fetched window in YYYY-MM-DD format
+            candles: Raw candles with CANDLE_COLUMNS
+        """
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+        today = datetime.now(IST).date()
+        dataset = self._dataset_dir(ticker, resolution)
+
+        candles = candles[CANDLE_COLUMNS]
+        days = pd.to_datetime(candles['t'], unit='s', utc=True).dt.tz_convert(IST).dt.date
+
+        with self._lock:
+            dataset.mkdir(parents=True, exist_ok=True)
+            manifest = self._load_manifest(dataset)
+            written = 0
+            for day, rows in candles.groupby(days.values):
+                if day >= today:
+                    continue
+                path = self._partition_path(dataset, day)
+                tmp_path = path.with_suffix('.tmp')
+                pq.write_table(pa.Table.from_pandas(rows, preserve_index=False), tmp_path)
+                previous = path.stat().st_size if path.exists() else 0
+                os.replace(tmp_path, path)
+                written += path.stat().st_size - previous
+                manifest['days'][day.isoformat()] = len(rows)
+
+            day = start
+            while day <= end and day < today:
+                manifest['days'].setdefault(day.isoformat(), 0)
+                day += timedelta(days=1)
+
+            self._save_manifest(dataset, manifest)
+            if self._size is not None:
+                self._size += written
+            self._evict()
+
+    def _partitions(self) -> List[Tuple[float, int, Path]]:
+        partitions = []
+        if not self.root.exists():
+            return partitions
+        for path in self.root.glob('resolution=*/symbol=*/date=*.parquet'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            partitions.append((stat.st_mtime, stat.st_size, path))
+        return partitions
+
+    def _evict(self) -> None:
+        """Drop least recently used partitions until the cache fits its budget (lock held)."""
+        if self._size is not None and self._size <= self.max_bytes:
+            return
+        partitions = self._partitions()
+        self._size = sum(size for _, size, _ in partitions)
+        if self._size <= self.max_bytes:
+            return
+
+        manifests = {}
+        # Evict down to 90% of the budget so the next writes do not trigger another scan
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(partitions):
+            if self._size <= target:
+                break
+            dataset = path.parent
+            if dataset not in manifests:
+                manifests[dataset] = self._load_manifest(dataset)
+            day = path.stem.split('=', 1)[1]
+            manifests[dataset]['days'].pop(day, None)
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            self._size -= size
+
+        for dataset, manifest in manifests.items():
+            self._save_manifest(dataset, manifest)
+
+    def size(self) -> int:
+        """Total bytes held in cached partitions."""
+        with self._lock:
+            self._size = sum(size for _, size, _ in self._partitions())
+            return self._size
+
+    def clear(self, ticker: Optional[str] = None, resolution: Optional[str] = None) -> None:
+        """Remove cached data for one (ticker, resolution) dataset, or everything when no ticker is given."""
+        with self._lock:
+            if ticker is None:
+                targets = list(self.root.glob('resolution=*/symbol=*'))
+            else:
+                targets = [self._dataset_dir(ticker, resolution)]
+            for dataset in targets:
+                if not dataset.exists():
+                    continue
+                for path in dataset.iterdir():
+                    path.unlink()
+                dataset.rmdir()
+            self._size = None
@@ -0,0 +1,100 @@
+"""
+Columnar JSON encoding of candle data.
+
+Candles are sent as parallel arrays instead of one object per row:
+
+    {"format": "columnar", "symbol": ..., "chunks": [{"t": [...], "open": [...], ...}], "count": N}
+
+"t" holds epoch milliseconds of the stored IST wall-clock time (the naive
+timestamp read as UTC), so clients rebuild the same wall-clock time from the UTC
+fields. Large ranges are emitted as several chunks so the response can be
+streamed while rows are still being read. orjson is used when installed.
+"""
+
+import json
+from typing import Any, Dict, Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Value columns sent next to the "t" array
+CANDLE_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+# Rows per chunk of a streamed response
+STREAM_CHUNK_ROWS = 50000
+
+
+def to_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Convert a frame with timestamp and OHLCV columns to parallel arrays.
+
+    Args:
+        df: Candles with a naive timestamp column
+
+    Returns:
+        Dict[str, np.ndarray]: "t" in epoch milliseconds and one array per CANDLE_FIELDS column
+    """
+    timestamps = pd.to_datetime(df['timestamp'])
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_localize(None)
+    columns = {'t': timestamps.to_numpy(dtype='datetime64[ms]').astype(np.int64)}
+    for field in CANDLE_FIELDS:
+        columns[field] = df[field].to_numpy()
+    return columns
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=_to_builtin, separators=(',', ':')).encode('utf-8')
+
+
+def _to_builtin(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_columnar(df: pd.DataFrame, **meta) -> bytes:
+    """
+    Encode a whole frame as a single-chunk columnar document.
+
+    Args:
+        df: Candles with timestamp and OHLCV columns
+        **meta: Extra top-level fields (e.g. symbol, date)
+
+    Returns:
+        bytes: JSON document
+    """
+    return dumps({'format': 'columnar', **meta, 'chunks': [to_columns(df)], 'count': len(df)})
+
+
+def iter_columnar(frames: Iterable[pd.DataFrame], **meta) -> Iterator[bytes]:
+    """
+    Encode frames lazily as a columnar document with one chunk per frame.
+
+    Args:
+        frames: Candle frames in timestamp order
+        **meta: Extra top-level fields (e.g. symbol)
+
+    Yields:
+        bytes: Consecutive pieces of the JSON document
+    """
+    header = dumps({'format': 'columnar', **meta})
+    # Reopen the header object to append the chunk list
+    yield header[:-1] + b',"chunks":['
+    count = 0
+    for frame in frames:
+        if frame.empty:
+            continue
+        yield (b',' if count else b'') + dumps(to_columns(frame))
+        count += len(frame)
+    yield b'],"count":' + str(count).encode('ascii') + b'}'
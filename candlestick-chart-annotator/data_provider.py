@@ -6,22 +6,34 @@ This module contains the DataProvider interface and implementations for differen
 
 import os
 import json
-import hashlib
+import numpy as np
 import pandas as pd
 import pytz
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Tuple, Union
 
 from rich.console import Console
 from fyers import FyersBroker
+from candle_cache import CandleCache, CANDLE_COLUMNS, DEFAULT_MAX_BYTES
 import yfinance as yf
 
 # Define timezone
 IST = pytz.timezone('Asia/Kolkata')
 console = Console()
 
+# Output modes of structure_data: the full broker-style metrics, or only plain OHLCV columns
+OUTPUT_FULL = 'full'
+OUTPUT_OHLCV = 'ohlcv'
+OHLCV_COLUMNS = ['datetime', 'symbol', 'open', 'high', 'low', 'close', 'volume']
+
+
+def _check_output(output: str) -> str:
+    if output not in (OUTPUT_FULL, OUTPUT_OHLCV):
+        raise ValueError(f"Unknown output mode: {output}")
+    return output
+
 class DataProvider(ABC):
     """Abstract interface for data providers."""
     
@@ -54,31 +66,90 @@ class DataProvider(ABC):
             pd.DataFrame: Structured DataFrame with required fields
         """
         pass
+    
+    def plan_requests(self, ticker: str, resolution: str, start_date: str, end_date: str) -> List[Tuple[str, str]]:
+        """
+        Split a date range into the windows this provider fetches in one request.
+        
+        Args:
+            ticker: Stock ticker symbol
+            resolution: Time resolution (e.g., '1', '5', '15' for minutes)
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+            
+        Returns:
+            List[Tuple[str, str]]: (start_date, end_date) windows in YYYY-MM-DD format
+        """
+        return [(start_date, end_date)]
+    
+    def plan_windows(self, ticker: str, resolution: str, windows: List[Tuple[str, str]],
+                     max_gap_days: int = 0) -> List[Tuple[str, str]]:
+        """
+        Plan the requests covering several date windows.
+        
+        Args:
+            ticker: Stock ticker symbol
+            resolution: Time resolution (e.g., '1', '5', '15' for minutes)
+            windows: (start_date, end_date) pairs in YYYY-MM-DD format
+            max_gap_days: Allowed gap of unrequested trading days between windows
+                that share a request (ignored by providers that do not coalesce)
+            
+        Returns:
+            List[Tuple[str, str]]: (start_date, end_date) windows in YYYY-MM-DD format
+        """
+        requests = []
+        for window_start, window_end in windows:
+            requests.extend(self.plan_requests(ticker, resolution, window_start, window_end))
+        return requests
+    
+    def estimate_seconds(self, requests: int) -> Optional[float]:
+        """
+        Estimate the time needed to issue a number of requests.
+        
+        Args:
+            requests: Number of requests
+            
+        Returns:
+            Optional[float]: Estimated seconds, or None if the provider has no rate limit model
+        """
+        return None
 
 
 class FyersDataProvider(DataProvider):
     """Data provider implementation for Fyers API."""
     
-    def __init__(self, cache_dir: str = ".cache/data", use_cache: bool = True):
+    def __init__(self, cache_dir: str = ".cache/data", use_cache: bool = True, cache_max_bytes: int = DEFAULT_MAX_BYTES,
+                 output: str = OUTPUT_FULL):
         """
         Initialize Fyers data provider.
         
         Args:
             cache_dir: Directory to store cached data
             use_cache: Whether to use cached data
+            cache_max_bytes: Size budget of the candle cache in bytes
+            output: OUTPUT_FULL for broker-style metrics or OUTPUT_OHLCV for plain OHLCV columns
         """
         self.fyers_broker = FyersBroker()
+        self.output = _check_output(output)
         self.cache_dir = Path(cache_dir)
-        self.use_cache = use_cache
+        self.use_cache = use_cache and CandleCache.available()
+        self.candle_cache = None
+        
+        if use_cache and not self.use_cache:
+            console.print("[yellow]pyarrow is not installed; candle cache disabled[/yellow]")
         
         # Create cache directory if it doesn't exist
         if self.use_cache:
             self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self.candle_cache = CandleCache(cache_dir, max_bytes=cache_max_bytes)
     
     def get_historical_data(self, ticker: str, resolution: str, start_date: str, end_date: str) -> pd.DataFrame:
         """
         Get historical data for a ticker between start and end dates.
         
+        Cached days are read from the candle cache and only uncovered days are
+        fetched from the API.
+        
         Args:
             ticker: Stock ticker symbol
             resolution: Time resolution (e.g., '1', '5', '15' for minutes)
@@ -88,13 +159,47 @@ class FyersDataProvider(DataProvider):
         Returns:
             pd.DataFrame: Historical data as a DataFrame
         """
+        frames = []
+        windows = [(start_date, end_date)]
+        
         # Check cache first if enabled
-        self.use_cache = False
         if self.use_cache:
-            cached_data = self._get_from_cache(ticker, resolution, start_date, end_date)
-            if cached_data is not None:
-                return cached_data
+            cached, windows = self.candle_cache.lookup(ticker, resolution, start_date, end_date)
+            if not cached.empty:
+                frames.append(cached)
+        
+        for window_start, window_end in windows:
+            candles = self._fetch_candles(ticker, resolution, window_start, window_end)
+            if candles is None:
+                # Failed fetches are not stored, so their days stay uncovered and are fetched again
+                continue
+            # Cache data if enabled
+            if self.use_cache:
+                self.candle_cache.store(ticker, resolution, window_start, window_end, candles)
+            if not candles.empty:
+                frames.append(candles)
+        
+        if not frames:
+            return pd.DataFrame()  # Return empty DataFrame
         
+        candles = pd.concat(frames, ignore_index=True)
+        candles = candles.drop_duplicates('t', keep='last').sort_values('t', ignore_index=True)
+        return self.structure_data(ticker, candles)
+    
+    def _fetch_candles(self, ticker: str, resolution: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+        """
+        Fetch raw candles from the API with retries.
+        
+        Args:
+            ticker: Stock ticker symbol
+            resolution: Time resolution
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+            
+        Returns:
+            Optional[pd.DataFrame]: Raw candles (possibly empty), or None if every attempt failed,
+            including attempts the API answered with an error
+        """
         # Define retry parameters
         max_attempts = 3
         attempts = 0
@@ -119,26 +224,62 @@ class FyersDataProvider(DataProvider):
                     console.print(f"[yellow]API Error: {data.get('message', 'Unknown error')}[/yellow]")
                     attempts += 1
                     continue
-                    
-                if not data.get('candles', []):
-                    # console.print(f"[yellow]No candles returned for {ticker} from {start_date} to {end_date}[/yellow]")
-                    return pd.DataFrame()  # Return empty DataFrame
                 
-                # Structure data
-                df = self.structure_data(ticker, data)
-                # Cache data if enabled
-                if self.use_cache:
-                    self._save_to_cache(ticker, resolution, start_date, end_date, df)
-                
-                return df
+                return pd.DataFrame(data.get('candles', []), columns=CANDLE_COLUMNS)
                 
             except Exception as e:
                 console.print(f"[red]Error fetching data for {ticker}: {str(e)}[/red]")
                 attempts += 1
         
-        # If all attempts fail, return empty DataFrame
+        # If all attempts fail, nothing is returned or cached
         console.print(f"[red]Failed to fetch data for {ticker} after {max_attempts} attempts[/red]")
-        return pd.DataFrame()
+        return None
+    
+    def plan_requests(self, ticker: str, resolution: str, start_date: str, end_date: str) -> List[Tuple[str, str]]:
+        """
+        Split a date range into windows that fit a single Fyers history request.
+        
+        Args:
+            ticker: Stock ticker symbol
+            resolution: Time resolution (e.g., '1', '5', '15' for minutes)
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+            
+        Returns:
+            List[Tuple[str, str]]: (start_date, end_date) windows in YYYY-MM-DD format
+        """
+        return self.fyers_broker.plan_history_chunks(resolution, start_date, end_date)
+    
+    def plan_windows(self, ticker: str, resolution: str, windows: List[Tuple[str, str]],
+                     max_gap_days: int = 0) -> List[Tuple[str, str]]:
+        """
+        Plan Fyers history requests covering several date windows.
+        
+        Windows are merged on the NSE trading calendar so that adjacent windows
+        share requests and spans without trading days cost nothing.
+        
+        Args:
+            ticker: Stock ticker symbol
+            resolution: Time resolution (e.g., '1', '5', '15' for minutes)
+            windows: (start_date, end_date) pairs in YYYY-MM-DD format
+            max_gap_days: Join windows separated by up to this many unrequested trading days
+            
+        Returns:
+            List[Tuple[str, str]]: (start_date, end_date) windows in YYYY-MM-DD format
+        """
+        return self.fyers_broker.plan_history_windows(resolution, windows, max_gap_days)
+    
+    def estimate_seconds(self, requests: int) -> Optional[float]:
+        """
+        Estimate the time the shared Fyers rate limit needs for a number of requests.
+        
+        Args:
+            requests: Number of requests
+            
+        Returns:
+            Optional[float]: Estimated seconds
+        """
+        return self.fyers_broker.estimate_history_time(requests)
     
     def structure_data(self, ticker: str, data: Any) -> pd.DataFrame:
         """
@@ -151,20 +292,36 @@ class FyersDataProvider(DataProvider):
         Returns:
             pd.DataFrame: Structured DataFrame with required fields
         """
-        # Check if data is already a DataFrame
+        # Raw candle frames (e.g. from the cache) are structured below; anything else is already structured
         if isinstance(data, pd.DataFrame):
-            return data
-            
-        # Handle empty or invalid responses
-        if not isinstance(data, dict) or 'candles' not in data or not data['candles']:
-            console.print(f"[yellow]Warning: Empty or invalid data structure for {ticker}[/yellow]")
-            return pd.DataFrame()  # Return empty DataFrame
-            
-        # Create DataFrame from fetched data
-        df = pd.DataFrame(data['candles'], columns=['t', 'o', 'h', 'l', 'c', 'v'])
+            if 't' not in data.columns:
+                return data
+            if data.empty:
+                return pd.DataFrame()
+            df = data[CANDLE_COLUMNS].reset_index(drop=True)
+        else:
+            # Handle empty or invalid responses
+            if not isinstance(data, dict) or 'candles' not in data or not data['candles']:
+                console.print(f"[yellow]Warning: Empty or invalid data structure for {ticker}[/yellow]")
+                return pd.DataFrame()  # Return empty DataFrame
+                
+            # Create DataFrame from fetched data
+            df = pd.DataFrame(data['candles'], columns=CANDLE_COLUMNS)
         
         # Convert timestamp to datetime with proper timezone
-        df['datetime'] = pd.to_datetime(df['t'], unit='s').dt.tz_localize(pytz.UTC).dt.tz_convert(IST)
+        df['datetime'] = pd.to_datetime(df['t'], unit='s', utc=True).dt.tz_convert(IST)
+        
+        if self.output == OUTPUT_OHLCV:
+            # Plain OHLCV reuses the candle columns without rounding or derived metrics
+            return pd.DataFrame({
+                'datetime': df['datetime'],
+                'symbol': ticker,
+                'open': df['o'],
+                'high': df['h'],
+                'low': df['l'],
+                'close': df['c'],
+                'volume': df['v']
+            }, copy=False)
         
         # Calculate cumulative volume
         df['cum_vol'] = df['v'].cumsum()
@@ -204,104 +361,57 @@ class FyersDataProvider(DataProvider):
         })
         
         return metrics_df
-    
-    def _get_cache_path(self, ticker: str, resolution: str, start_date: str, end_date: str) -> Path:
-        """Generate a unique cache file path based on query parameters."""
-        # Create a unique key based on parameters
-        key = f"{ticker}_{resolution}_{start_date}_{end_date}"
-        filename = hashlib.md5(key.encode()).hexdigest() + ".csv"
-        return self.cache_dir / filename
-    
-    def _get_from_cache(self, ticker: str, resolution: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
-        """Try to get data from cache."""
-        if not self.use_cache:
-            return None
-            
-        cache_path = self._get_cache_path(ticker, resolution, start_date, end_date)
-        
-        if not cache_path.exists():
-            return None
-            
-        try:
-            # Read cache file
-            # with open(cache_path, 'r') as f:
-            #     cache_data = json.load(f)
-                
-            # # Check if cache is valid (has metadata and actual data)
-            # if not isinstance(cache_data, dict) or 'metadata' not in cache_data or 'data' not in cache_data:
-            #     console.print(f"[yellow]Invalid cache format for {ticker}[/yellow]")
-            #     return None
-                
-            # # Check if cache is expired
-            # cache_timestamp = cache_data['metadata'].get('timestamp', 0)
-            # cache_age = datetime.now().timestamp() - cache_timestamp
-            
-            # # Cache expires after 7 days for historical data
-            # if cache_age > 7 * 24 * 60 * 60:
-            #     console.print(f"[yellow]Cache expired for {ticker}[/yellow]")
-            #     return None
-            df = pd.read_csv(cache_path)
-            df['datetime'] = pd.to_datetime(df['datetime'])
-            
-            # Return structured data
-            # console.print(f"[green]Using cached data for {ticker} from {start_date} to {end_date}[/green]")
-            return df
-            
-        except Exception as e:
-            console.print(f"[yellow]Error reading cache for {ticker}: {str(e)}[/yellow]")
-            return None
-    
-    def _save_to_cache(self, ticker: str, resolution: str, start_date: str, end_date: str, data: Dict[str, Any]) -> None:
-        """Save data to cache."""
-        if not self.use_cache:
-            return
-            
-        cache_path = self._get_cache_path(ticker, resolution, start_date, end_date)
-        
-        try:
-            # Prepare cache data with metadata
-            # cache_data = {
-            #     'metadata': {
-            #         'ticker': ticker,
-            #         'resolution': resolution,
-            #         'start_date': start_date,
-            #         'end_date': end_date,
-            #         'timestamp': datetime.now().timestamp()
-            #     },
-            #     'data': data
-            # }
-            
-            # # Write to cache file
-            # with open(cache_path, 'w') as f:
-            #     json.dump(cache_data, f)
-            data.to_csv(cache_path, index=False)
-            # console.print(f"[green]Cached data for {ticker} from {start_date} to {end_date}[/green]")
-            
-        except Exception as e:
-            console.print(f"[yellow]Error caching data for {ticker}: {str(e)}[/yellow]")
+
+
+# Rows parsed per chunk when streaming CSV files
+CSV_CHUNK_ROWS = 500000
+
+# Bytes of lines scanned per block when building a CSV day index
+CSV_INDEX_BLOCK_BYTES = 16 * 1024 * 1024
+
+# CSV column aliases used to find the OHLCV columns
+CSV_REQUIRED_COLUMNS = {
+    'datetime': 'datetime',
+    'open': 'o',
+    'high': 'h',
+    'low': 'l',
+    'close': 'c',
+    'volume': 'v'
+}
 
 
 class CsvDataProvider(DataProvider):
     """Data provider implementation for CSV files."""
     
-    def __init__(self, data_dir: str):
+    def __init__(self, data_dir: str, output: str = OUTPUT_FULL, chunksize: int = CSV_CHUNK_ROWS,
+                 build_index: bool = False):
         """
         Initialize CSV data provider.
         
         Args:
             data_dir: Directory containing CSV files
+            output: OUTPUT_FULL for broker-style metrics or OUTPUT_OHLCV for plain OHLCV columns
+            chunksize: Number of rows parsed per chunk
+            build_index: Build a sidecar day index for files that have none (or a stale one)
         """
         self.data_dir = Path(data_dir)
+        self.output = _check_output(output)
+        self.chunksize = chunksize
+        self.build_index = build_index
         
     def get_historical_data(self, ticker: str, resolution: str, start_date: str, end_date: str) -> pd.DataFrame:
         """
         Get historical data for a ticker between start and end dates.
         
+        The file is streamed in chunks and only the date and OHLCV columns are
+        parsed. For files sorted by time, reading stops after end_date and a day
+        index (when present) lets the read start at start_date.
+        
         Args:
             ticker: Stock ticker symbol
             resolution: Time resolution (e.g., '1', '5', '15' for minutes)
             start_date: Start date in YYYY-MM-DD format
-            end_date: End date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format (inclusive)
             
         Returns:
             pd.DataFrame: Historical data as a DataFrame
@@ -314,30 +424,186 @@ class CsvDataProvider(DataProvider):
             return pd.DataFrame()
             
         try:
-            # Read CSV file
-            df = pd.read_csv(csv_path)
-            
-            # Convert date column to datetime
-            date_column = next((col for col in df.columns if 'date' in col.lower() or 'time' in col.lower()), None)
+            # Read the header only to pick the columns to parse
+            columns = list(pd.read_csv(csv_path, nrows=0).columns)
+            date_column = self._find_date_column(columns)
             
             if date_column is None:
                 console.print(f"[yellow]No date/time column found in CSV for {ticker}[/yellow]")
                 return pd.DataFrame()
-                
-            df['datetime'] = pd.to_datetime(df[date_column])
             
-            # Filter by date range
+            column_mapping = self._map_columns(columns)
+            value_columns = list(dict.fromkeys(
+                column_mapping[col] for col in ['open', 'high', 'low', 'close', 'volume'] if col in column_mapping
+            ))
+            usecols = [date_column] + [col for col in value_columns if col != date_column]
+            dtypes = {col: 'float64' for col in value_columns if col != date_column}
+            
+            # Filter by date range, including the whole end day
             start_dt = pd.to_datetime(start_date)
-            end_dt = pd.to_datetime(end_date)
-            df = df[(df['datetime'] >= start_dt) & (df['datetime'] <= end_dt)]
+            end_dt = pd.to_datetime(end_date) + pd.Timedelta(days=1)
+            
+            offset = 0
+            index = self._load_day_index(csv_path)
+            if index is None and self.build_index:
+                index = self.build_day_index(csv_path)
+            if index is not None and index['sorted']:
+                offset = self._index_offset(index, start_dt, end_dt)
+                if offset is None:
+                    return pd.DataFrame()
+            
+            frames = []
+            sorted_so_far = True
+            last_seen = None
+            with open(csv_path, 'rb') as f:
+                if offset:
+                    f.seek(offset)
+                    reader = pd.read_csv(f, header=None, names=columns, usecols=usecols, dtype=dtypes,
+                                         chunksize=self.chunksize)
+                else:
+                    reader = pd.read_csv(f, usecols=usecols, dtype=dtypes, chunksize=self.chunksize)
+                
+                for chunk in reader:
+                    if chunk.empty:
+                        continue
+                    times = pd.to_datetime(chunk[date_column])
+                    mask = (times >= start_dt) & (times < end_dt)
+                    if mask.any():
+                        frames.append(chunk[mask].assign(datetime=times[mask]))
+                    
+                    # Stop once a time-sorted file is past the end of the range
+                    if sorted_so_far:
+                        sorted_so_far = times.is_monotonic_increasing and (last_seen is None or times.iloc[0] >= last_seen)
+                        last_seen = times.iloc[-1]
+                        if sorted_so_far and last_seen >= end_dt:
+                            break
+            
+            if not frames:
+                return pd.DataFrame()
             
             # Structure data
-            return self.structure_data(ticker, df)
+            return self.structure_data(ticker, pd.concat(frames, ignore_index=True))
             
         except Exception as e:
             console.print(f"[red]Error reading CSV for {ticker}: {str(e)}[/red]")
             return pd.DataFrame()
     
+    @staticmethod
+    def _find_date_column(columns: List[str]) -> Optional[str]:
+        return next((col for col in columns if 'date' in col.lower() or 'time' in col.lower()), None)
+    
+    @staticmethod
+    def _map_columns(columns: List[str]) -> Dict[str, str]:
+        """Map required column names to CSV columns in one pass over the header."""
+        column_mapping = {}
+        for csv_col in columns:
+            lower_col = str(csv_col).lower()
+            for req_col, alias in CSV_REQUIRED_COLUMNS.items():
+                if req_col not in column_mapping and (alias == csv_col or req_col in lower_col):
+                    column_mapping[req_col] = csv_col
+        return column_mapping
+    
+    @staticmethod
+    def _index_path(csv_path: Path) -> Path:
+        return csv_path.with_name(csv_path.name + '.days.json')
+    
+    def _load_day_index(self, csv_path: Path) -> Optional[Dict[str, Any]]:
+        """Load the sidecar day index if it matches the current file."""
+        index_path = self._index_path(csv_path)
+        if not index_path.exists():
+            return None
+        try:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        stat = csv_path.stat()
+        if index.get('size') != stat.st_size or index.get('mtime_ns') != stat.st_mtime_ns:
+            return None
+        return index
+    
+    @staticmethod
+    def _index_offset(index: Dict[str, Any], start_dt: pd.Timestamp, end_dt: pd.Timestamp) -> Optional[int]:
+        """Byte offset of the first indexed day in [start_dt, end_dt), or None if no day falls in it."""
+        start_day = start_dt.date().isoformat()
+        end_day = end_dt.date().isoformat()
+        days = sorted(day for day in index['days'] if start_day <= day < end_day)
+        if not days:
+            return None
+        return index['days'][days[0]][0]
+    
+    @staticmethod
+    def _field(line: bytes, position: int) -> bytes:
+        fields = line.split(b',', position + 1)
+        return fields[position] if len(fields) > position else b''
+    
+    def build_day_index(self, csv_path: Path) -> Optional[Dict[str, Any]]:
+        """
+        Build the sidecar index mapping each day to the byte range of its rows.
+        
+        Lines are split on commas to find the date field, so the date column
+        must not be quoted with embedded commas.
+        
+        Args:
+            csv_path: Path of the CSV file
+            
+        Returns:
+            Optional[Dict[str, Any]]: The index, or None if the file has no date column
+        """
+        csv_path = Path(csv_path)
+        columns = list(pd.read_csv(csv_path, nrows=0).columns)
+        date_column = self._find_date_column(columns)
+        if date_column is None:
+            return None
+        position = columns.index(date_column)
+        
+        stat = csv_path.stat()
+        days = {}
+        is_sorted = True
+        previous_day = None
+        with open(csv_path, 'rb') as f:
+            f.readline()
+            offset = f.tell()
+            while True:
+                lines = f.readlines(CSV_INDEX_BLOCK_BYTES)
+                if not lines:
+                    break
+                ends = offset + np.cumsum([len(line) for line in lines])
+                starts = np.concatenate(([offset], ends[:-1]))
+                values = pd.Series([self._field(line, position) for line in lines]).str.decode('utf-8')
+                # Blank or malformed lines belong to the day around them
+                parsed = pd.to_datetime(values.str.strip().str.strip('"'), errors='coerce').ffill().bfill()
+                if parsed.isna().all():
+                    offset = int(ends[-1])
+                    continue
+                block_days = parsed.dt.strftime('%Y-%m-%d').to_numpy()
+                
+                # Rows where the day changes start a new run
+                breaks = np.flatnonzero(block_days[1:] != block_days[:-1]) + 1
+                run_starts = np.concatenate(([0], breaks))
+                run_ends = np.concatenate((breaks, [len(block_days)]))
+                for first, last in zip(run_starts, run_ends):
+                    day = block_days[first]
+                    if day == previous_day:
+                        days[day][1] = int(ends[last - 1])
+                        continue
+                    if day in days or (previous_day is not None and day < previous_day):
+                        is_sorted = False
+                    days.setdefault(day, [int(starts[first]), int(ends[last - 1])])
+                    previous_day = day
+                offset = int(ends[-1])
+        
+        index = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'date_column': date_column,
+            'sorted': is_sorted,
+            'days': days
+        }
+        with open(self._index_path(csv_path), 'w') as f:
+            json.dump(index, f)
+        return index
+    
     def structure_data(self, ticker: str, data: Union[pd.DataFrame, Any]) -> pd.DataFrame:
         """
         Structure data into a standard format for backtesting.
@@ -354,69 +620,83 @@ class CsvDataProvider(DataProvider):
             
         # Map CSV columns to required format
         # This is a simplified example - adjust to match your CSV format
-        required_columns = {
-            'datetime': 'datetime',
-            'open': 'o',
-            'high': 'h',
-            'low': 'l',
-            'close': 'c',
-            'volume': 'v'
-        }
+        column_mapping = self._map_columns(list(data.columns))
         
-        # Create a mapping between CSV columns and required columns
-        column_mapping = {}
-        for req_col, alias in required_columns.items():
-            found = False
-            for csv_col in data.columns:
-                if alias == csv_col or req_col.lower() in csv_col.lower():
-                    column_mapping[req_col] = csv_col
-                    found = True
-                    break
-            
-            if not found and req_col != 'datetime':  # datetime already handled
-                console.print(f"[yellow]Column {req_col} not found in CSV for {ticker}[/yellow]")
-                # Use sensible defaults
-                if req_col in ['open', 'high', 'low', 'close'] and 'close' in column_mapping:
-                    column_mapping[req_col] = column_mapping['close']
-                elif req_col == 'volume':
-                    # Set volume to 0 if not available
-                    data['volume'] = 0
-                    column_mapping[req_col] = 'volume'
-        
-        # Create a copy with only the required columns
-        metrics_df = pd.DataFrame()
-        metrics_df['datetime'] = data['datetime']
-        metrics_df['symbol'] = ticker
-        
-        # Map the rest of the columns
-        metrics_df['ltp'] = data[column_mapping.get('close')].round(2)
-        metrics_df['open_price'] = data[column_mapping.get('open')].round(2)
-        metrics_df['high_price'] = data[column_mapping.get('high')].round(2)
-        metrics_df['low_price'] = data[column_mapping.get('low')].round(2)
+        for req_col in ['open', 'high', 'low', 'close', 'volume']:
+            if req_col in column_mapping:
+                continue
+            console.print(f"[yellow]Column {req_col} not found in CSV for {ticker}[/yellow]")
+            # Use sensible defaults
+            if req_col in ['open', 'high', 'low'] and 'close' in column_mapping:
+                column_mapping[req_col] = column_mapping['close']
+            elif req_col != 'volume':
+                return pd.DataFrame()
+        
+        timestamps = data['datetime'].reset_index(drop=True)
+        open_price = data[column_mapping['open']].to_numpy(dtype=np.float64)
+        high_price = data[column_mapping['high']].to_numpy(dtype=np.float64)
+        low_price = data[column_mapping['low']].to_numpy(dtype=np.float64)
+        close_price = data[column_mapping['close']].to_numpy(dtype=np.float64)
+        if 'volume' in column_mapping:
+            volume = data[column_mapping['volume']].to_numpy(dtype=np.int64)
+        else:
+            # Set volume to 0 if not available
+            volume = np.zeros(len(data), dtype=np.int64)
+        
+        if self.output == OUTPUT_OHLCV:
+            return pd.DataFrame({
+                'datetime': timestamps,
+                'symbol': ticker,
+                'open': open_price,
+                'high': high_price,
+                'low': low_price,
+                'close': close_price,
+                'volume': volume
+            }, copy=False)
+        
+        ltp = close_price.round(2)
+        open_price = open_price.round(2)
+        high_price = high_price.round(2)
+        low_price = low_price.round(2)
         
         # Generate other required fields
-        metrics_df['vol_traded_today'] = data[column_mapping.get('volume')].cumsum().astype(int)
-        metrics_df['last_traded_qty'] = data[column_mapping.get('volume')].astype(int)
-        metrics_df['tot_buy_qty'] = (metrics_df['vol_traded_today'] // 2).astype(int)
-        metrics_df['tot_sell_qty'] = (metrics_df['vol_traded_today'] - metrics_df['tot_buy_qty']).astype(int)
-        metrics_df['prev_close_price'] = metrics_df['ltp'].shift(1).fillna(metrics_df['open_price']).round(2)
-        metrics_df['ch'] = (metrics_df['ltp'] - metrics_df['prev_close_price']).round(2)
-        metrics_df['chp'] = (metrics_df['ch'] / metrics_df['prev_close_price'] * 100).fillna(0).round(2)
-        metrics_df['avg_trade_price'] = ((metrics_df['open_price'] + metrics_df['high_price'] + 
-                                       metrics_df['low_price'] + metrics_df['ltp']) / 4).round(2)
-        
-        # Add broker-specific fields
-        metrics_df['bid_size'] = 0
-        metrics_df['ask_size'] = 0
-        metrics_df['bid_price'] = (metrics_df['ltp'] - 0.05).round(2)
-        metrics_df['ask_price'] = (metrics_df['ltp'] + 0.05).round(2)
-        metrics_df['type'] = "historical"
-        
-        # Convert datetime to timestamp for compatibility
-        metrics_df['last_traded_time'] = metrics_df['datetime'].apply(lambda x: int(x.timestamp()))
-        metrics_df['exch_feed_time'] = metrics_df['last_traded_time']
+        vol_traded_today = volume.cumsum()
+        tot_buy_qty = vol_traded_today // 2
+        prev_close_price = np.empty_like(ltp)
+        prev_close_price[0] = open_price[0]
+        prev_close_price[1:] = ltp[:-1]
+        prev_close_price = np.where(np.isnan(prev_close_price), open_price, prev_close_price).round(2)
+        ch = (ltp - prev_close_price).round(2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chp = np.nan_to_num(ch / prev_close_price * 100, nan=0.0).round(2)
         
-        return metrics_df
+        # Convert datetime to epoch seconds for compatibility (naive values are read as UTC)
+        epoch = timestamps.to_numpy(dtype='datetime64[ns]').astype('datetime64[s]').astype(np.int64)
+        
+        return pd.DataFrame({
+            'datetime': timestamps,
+            'symbol': ticker,
+            'ltp': ltp,
+            'open_price': open_price,
+            'high_price': high_price,
+            'low_price': low_price,
+            'vol_traded_today': vol_traded_today,
+            'last_traded_qty': volume,
+            'tot_buy_qty': tot_buy_qty,
+            'tot_sell_qty': vol_traded_today - tot_buy_qty,
+            'prev_close_price': prev_close_price,
+            'ch': ch,
+            'chp': chp,
+            'avg_trade_price': ((open_price + high_price + low_price + ltp) / 4).round(2),
+            # Add broker-specific fields
+            'bid_size': 0,
+            'ask_size': 0,
+            'bid_price': (ltp - 0.05).round(2),
+            'ask_price': (ltp + 0.05).round(2),
+            'type': "historical",
+            'last_traded_time': epoch,
+            'exch_feed_time': epoch
+        }, copy=False)
 
 
 class YfinanceDataProvider(DataProvider):
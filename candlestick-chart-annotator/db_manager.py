@@ -1,16 +1,23 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text, UniqueConstraint, func
+from sqlalchemy import create_engine, event, Column, Integer, BigInteger, String, Float, Date, DateTime, ForeignKey, Text, UniqueConstraint, Index, func, inspect, insert, or_, select, union
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.pool import QueuePool
 from sqlalchemy.sql import text
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import pandas as pd
+import io
+import logging
+import math
 import os
+import sqlite3
 import threading
 from contextlib import contextmanager
 import time
 import traceback
 
+logger = logging.getLogger(__name__)
+
 # Create the base class for declarative models
 Base = declarative_base()
 
@@ -21,8 +28,149 @@ DB_HOST = os.getenv('DB_HOST', 'localhost')
 DB_PORT = os.getenv('DB_PORT', '5432')
 DB_NAME = os.getenv('DB_NAME', 'stock_annotator')
 
-# Create database URL
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Storage backend: 'postgresql' (default) or 'sqlite' for a single-file local database
+DB_BACKEND = os.getenv('DB_BACKEND', 'postgresql')
+DB_SQLITE_PATH = os.getenv('DB_SQLITE_PATH', 'stock_annotator.db')
+
+# Create database URL; DATABASE_URL overrides the backend settings above
+if DB_BACKEND == 'sqlite':
+    DATABASE_URL = os.getenv('DATABASE_URL', f"sqlite:///{DB_SQLITE_PATH}")
+else:
+    DATABASE_URL = os.getenv('DATABASE_URL', f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+# Connection pool per process; size it to the concurrent requests one server worker handles
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+
+# SQLite keeps timestamps as text in SQLAlchemy's fixed-width format, so raw SQL
+# parameters and computed bucket starts use the same format to compare as text
+SQLITE_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Rows per COPY round trip when bulk loading candles
+COPY_CHUNK_ROWS = 100000
+
+# Rows fetched per round trip when streaming candles out
+STREAM_FETCH_ROWS = 50000
+
+# Rollups are aggregated from 1-minute candles into these buckets (minutes, None for daily)
+ROLLUP_SOURCE_RESOLUTION = '1'
+ROLLUP_BUCKETS = {'5': 5, '15': 15, '60': 60, '1D': None}
+
+# Minutes from midnight to the 09:15 session open that intraday buckets align to
+SESSION_OPEN_MINUTES = 555
+
+# The stocks table is range partitioned by month; the unique key covers the OHLCV
+# columns so day lookups are index-only scans of a single partition
+STOCKS_PARTITIONED_DDL = """
+    CREATE TABLE stocks (
+        id BIGSERIAL,
+        symbol VARCHAR NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        open DOUBLE PRECISION NOT NULL,
+        high DOUBLE PRECISION NOT NULL,
+        low DOUBLE PRECISION NOT NULL,
+        close DOUBLE PRECISION NOT NULL,
+        volume INTEGER NOT NULL,
+        resolution VARCHAR NOT NULL DEFAULT '1D',
+        PRIMARY KEY (id, timestamp),
+        CONSTRAINT uix_symbol_timestamp UNIQUE (symbol, timestamp)
+            INCLUDE (open, high, low, close, volume, resolution)
+    ) PARTITION BY RANGE (timestamp)
+"""
+
+# Set DB_STORAGE=compact before the stocks table is first created to store candles
+# in the compact layout below; an existing database keeps the layout it has
+DB_STORAGE = os.getenv('DB_STORAGE', 'standard')
+
+# Prices are stored in paise in the compact layout
+PRICE_SCALE = 100
+
+# Compact layout: symbols and resolutions are smallint dictionary ids, prices are
+# integer paise and there is no surrogate key. Columns are ordered widest first so
+# a candle row carries no alignment padding. stocks becomes a view over candles
+# with the standard columns, so reads are unchanged; the view id is derived from
+# the key. Single-row writes through the view go through INSTEAD OF triggers.
+# symbols/resolutions ids are only drawn for new names: ON CONFLICT would burn a
+# sequence value per conflicting row and exhaust smallint ids.
+COMPACT_STORAGE_DDL = [
+    """
+    CREATE TABLE symbols (
+        id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        symbol VARCHAR NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE resolutions (
+        id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        resolution VARCHAR NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE candles (
+        timestamp TIMESTAMP NOT NULL,
+        open INTEGER NOT NULL,
+        high INTEGER NOT NULL,
+        low INTEGER NOT NULL,
+        close INTEGER NOT NULL,
+        volume INTEGER NOT NULL,
+        symbol_id SMALLINT NOT NULL,
+        resolution_id SMALLINT NOT NULL,
+        CONSTRAINT candles_pkey PRIMARY KEY (symbol_id, timestamp)
+            INCLUDE (open, high, low, close, volume, resolution_id)
+    ) PARTITION BY RANGE (timestamp)
+    """,
+    f"""
+    CREATE VIEW stocks AS
+    SELECT
+        (c.symbol_id::BIGINT << 32) + extract(epoch FROM c.timestamp)::BIGINT AS id,
+        s.symbol,
+        c.timestamp,
+        c.open::DOUBLE PRECISION / {PRICE_SCALE} AS open,
+        c.high::DOUBLE PRECISION / {PRICE_SCALE} AS high,
+        c.low::DOUBLE PRECISION / {PRICE_SCALE} AS low,
+        c.close::DOUBLE PRECISION / {PRICE_SCALE} AS close,
+        c.volume,
+        r.resolution
+    FROM candles c
+    JOIN symbols s ON s.id = c.symbol_id
+    JOIN resolutions r ON r.id = c.resolution_id
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION stocks_view_insert() RETURNS trigger AS $$
+    DECLARE
+        sid SMALLINT;
+        rid SMALLINT;
+    BEGIN
+        NEW.resolution := COALESCE(NEW.resolution, '1D');
+        SELECT id INTO sid FROM symbols WHERE symbol = NEW.symbol;
+        IF sid IS NULL THEN
+            INSERT INTO symbols (symbol) VALUES (NEW.symbol) RETURNING id INTO sid;
+        END IF;
+        SELECT id INTO rid FROM resolutions WHERE resolution = NEW.resolution;
+        IF rid IS NULL THEN
+            INSERT INTO resolutions (resolution) VALUES (NEW.resolution) RETURNING id INTO rid;
+        END IF;
+        INSERT INTO candles (timestamp, open, high, low, close, volume, symbol_id, resolution_id)
+        VALUES (NEW.timestamp, ROUND(NEW.open * {PRICE_SCALE}), ROUND(NEW.high * {PRICE_SCALE}),
+                ROUND(NEW.low * {PRICE_SCALE}), ROUND(NEW.close * {PRICE_SCALE}), NEW.volume, sid, rid);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION stocks_view_delete() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM candles
+        WHERE symbol_id = (SELECT id FROM symbols WHERE symbol = OLD.symbol)
+            AND timestamp = OLD.timestamp;
+        RETURN OLD;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "CREATE TRIGGER stocks_view_insert INSTEAD OF INSERT ON stocks FOR EACH ROW EXECUTE FUNCTION stocks_view_insert()",
+    "CREATE TRIGGER stocks_view_delete INSTEAD OF DELETE ON stocks FOR EACH ROW EXECUTE FUNCTION stocks_view_delete()",
+]
 
 # Define models
 class Stock(Base):
@@ -42,6 +190,32 @@ class Stock(Base):
         UniqueConstraint('symbol', 'timestamp', name='uix_symbol_timestamp'),
     )
 
+class StockCatalog(Base):
+    """Per-(symbol, resolution) summary of the rows held in the stocks table"""
+    __tablename__ = 'stock_catalog'
+
+    symbol = Column(String(), primary_key=True)
+    resolution = Column(String(), primary_key=True)
+    start_timestamp = Column(DateTime, nullable=False)
+    end_timestamp = Column(DateTime, nullable=False)
+    row_count = Column(Integer, nullable=False, default=0)
+    trading_days = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class StockRollup(Base):
+    """OHLCV of 1-minute candles aggregated per (symbol, bucket size, bucket start)"""
+    __tablename__ = 'stock_rollups'
+
+    symbol = Column(String(), primary_key=True)
+    bucket = Column(String(), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(BigInteger, nullable=False)
+    bar_count = Column(Integer, nullable=False)
+
 class Annotation(Base):
     __tablename__ = 'annotations'
     
@@ -51,6 +225,192 @@ class Annotation(Base):
     signal = Column(String(), nullable=False)
     price = Column(Float)
     reason = Column(Text, nullable=True)  # Adding reason column for annotation reasons
+    client_id = Column(String(), nullable=True)  # Client-generated id making batch creates idempotent
+
+    __table_args__ = (
+        Index('idx_annotations_stock_timestamp', 'stock', 'timestamp'),
+        Index('uix_annotations_client_id', 'client_id', unique=True),
+    )
+
+class AnnotationChange(Base):
+    """Append-only log of annotation adds and deletes; version orders the changes"""
+    __tablename__ = 'annotation_changes'
+
+    version = Column(Integer, primary_key=True)
+    action = Column(String(), nullable=False)  # 'added' or 'deleted'
+    annotation_id = Column(Integer, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    stock = Column(String(), nullable=False)
+    signal = Column(String(), nullable=False)
+    price = Column(Float)
+    reason = Column(Text, nullable=True)
+    changed_at = Column(DateTime, nullable=False, default=datetime.now)
+
+def _annotation_record(annotation):
+    """Plain dict of an Annotation row"""
+    return {
+        'id': annotation.id,
+        'timestamp': annotation.timestamp,
+        'stock': annotation.stock,
+        'signal': annotation.signal,
+        'price': annotation.price,
+        'reason': annotation.reason,
+        'client_id': annotation.client_id
+    }
+
+def _month_starts(first, last):
+    """First day of every month from first to last (inclusive)"""
+    month = datetime(first.year, first.month, 1)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return months
+
+def _create_stock_partitions(conn, months, table='stocks'):
+    """Create the monthly partitions of the candle table starting at the given month starts"""
+    for month in months:
+        next_month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {table}_y{month.year}m{month.month:02d} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+        ))
+
+def _add_compact_dictionary_entries(conn, source):
+    """Register the symbols and resolutions of a staging table that have no id yet"""
+    conn.execute(text(f"""
+        INSERT INTO symbols (symbol)
+        SELECT DISTINCT src.symbol FROM {source} src
+        WHERE NOT EXISTS (SELECT 1 FROM symbols s WHERE s.symbol = src.symbol)
+        ON CONFLICT (symbol) DO NOTHING
+    """))
+    conn.execute(text(f"""
+        INSERT INTO resolutions (resolution)
+        SELECT DISTINCT src.resolution FROM {source} src
+        WHERE NOT EXISTS (SELECT 1 FROM resolutions r WHERE r.resolution = src.resolution)
+        ON CONFLICT (resolution) DO NOTHING
+    """))
+
+def _compact_candles_select(source):
+    """SELECT translating standard candle rows of source into candles columns"""
+    return f"""
+        SELECT src.timestamp,
+            ROUND(src.open * {PRICE_SCALE})::INTEGER,
+            ROUND(src.high * {PRICE_SCALE})::INTEGER,
+            ROUND(src.low * {PRICE_SCALE})::INTEGER,
+            ROUND(src.close * {PRICE_SCALE})::INTEGER,
+            ROUND(src.volume)::INTEGER,
+            s.id,
+            r.id
+        FROM {source} src
+        JOIN symbols s ON s.symbol = src.symbol
+        JOIN resolutions r ON r.resolution = src.resolution
+    """
+
+def _day_bounds(date):
+    """Half-open [start, end) timestamp range of a day given as a date or YYYY-MM-DD string"""
+    if isinstance(date, str):
+        date = datetime.strptime(date, '%Y-%m-%d')
+    start = datetime(date.year, date.month, date.day)
+    return start, start + timedelta(days=1)
+
+def _bucket_sql(bucket_minutes, dialect='postgresql'):
+    """SQL expression for the start of the bucket holding stocks.timestamp"""
+    if dialect == 'sqlite':
+        return _sqlite_bucket_sql(bucket_minutes)
+    if not bucket_minutes:
+        return "date_trunc('day', timestamp)"
+    seconds = int(bucket_minutes) * 60
+    return (
+        f"date_trunc('day', timestamp) + interval '{SESSION_OPEN_MINUTES} minutes'"
+        f" + floor(extract(epoch from timestamp - date_trunc('day', timestamp) - interval '{SESSION_OPEN_MINUTES} minutes')"
+        f" / {seconds})::integer * {seconds} * interval '1 second'"
+    )
+
+def _sqlite_bucket_sql(bucket_minutes):
+    """SQLite counterpart of _bucket_sql, producing text timestamps in the stored format"""
+    if not bucket_minutes:
+        return "date(timestamp) || ' 00:00:00.000000'"
+    seconds = int(bucket_minutes) * 60
+    session_open = f"(CAST(strftime('%s', timestamp, 'start of day') AS INTEGER) + {SESSION_OPEN_MINUTES * 60})"
+    offset = f"(CAST(strftime('%s', timestamp) AS INTEGER) - {session_open})"
+    # Integer % truncates towards zero, so fold negative (pre-open) offsets back to a floor
+    start = f"({session_open} + {offset} - (({offset} % {seconds}) + {seconds}) % {seconds})"
+    return f"strftime('%Y-%m-%d %H:%M:%S', {start}, 'unixepoch') || '.000000'"
+
+def _bucket_floor(timestamp, bucket_minutes):
+    """Python counterpart of _bucket_sql for a single timestamp"""
+    timestamp = pd.Timestamp(timestamp).to_pydatetime()
+    day = datetime(timestamp.year, timestamp.month, timestamp.day)
+    if not bucket_minutes:
+        return day
+    session_open = day + timedelta(minutes=SESSION_OPEN_MINUTES)
+    offset = math.floor((timestamp - session_open).total_seconds() / (bucket_minutes * 60))
+    return session_open + timedelta(minutes=offset * bucket_minutes)
+
+def _bucket_length(bucket_minutes):
+    return timedelta(minutes=bucket_minutes) if bucket_minutes else timedelta(days=1)
+
+# Aggregates shared by on-the-fly bucketing and the rollup refresh
+_OHLCV_AGGREGATES = """
+    (array_agg(open ORDER BY timestamp))[1] AS open,
+    max(high) AS high,
+    min(low) AS low,
+    (array_agg(close ORDER BY timestamp DESC))[1] AS close,
+    sum(volume) AS volume
+"""
+
+# SQLite has no ordered array_agg; stored timestamps are fixed-width text, so the
+# first open and last close are the suffixes of min/max(timestamp || price)
+_SQLITE_OHLCV_AGGREGATES = """
+    CAST(substr(min(timestamp || open), 27) AS REAL) AS open,
+    max(high) AS high,
+    min(low) AS low,
+    CAST(substr(max(timestamp || close), 27) AS REAL) AS close,
+    sum(volume) AS volume
+"""
+
+def _ohlcv_aggregates(dialect):
+    return _SQLITE_OHLCV_AGGREGATES if dialect == 'sqlite' else _OHLCV_AGGREGATES
+
+def _managed_tables():
+    """Tables left to create_all/drop_all; the stocks storage is managed by DBManager"""
+    return [table for table in Base.metadata.sorted_tables if table.name != Stock.__tablename__]
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer; NORMAL sync is safe under WAL"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def _sqlite_timestamp(value):
+    return value.strftime(SQLITE_TIMESTAMP_FORMAT)
+
+def _register_sqlite_adapters():
+    """Bind raw-SQL datetime/date parameters in the stored text format"""
+    sqlite3.register_adapter(datetime, _sqlite_timestamp)
+    sqlite3.register_adapter(pd.Timestamp, _sqlite_timestamp)
+    sqlite3.register_adapter(date, lambda value: _sqlite_timestamp(datetime(value.year, value.month, value.day)))
+
+def _prepare_stock_frame(df):
+    """Normalise an incoming candle frame to the columns of the stocks table"""
+    timestamps = pd.to_datetime(df['timestamp'] if 'timestamp' in df.columns else df['date'])
+    if timestamps.dt.tz is not None:
+        # Candles are stored as naive IST wall-clock time
+        timestamps = timestamps.dt.tz_convert('Asia/Kolkata').dt.tz_localize(None)
+    frame = pd.DataFrame({
+        'symbol': df['symbol'].values,
+        'timestamp': timestamps.values,
+        'open': df['open'].values,
+        'high': df['high'].values,
+        'low': df['low'].values,
+        'close': df['close'].values,
+        'volume': df['volume'].values,
+        'resolution': df['resolution'].values if 'resolution' in df.columns else '1D'
+    })
+    return frame
 
 class DBManager:
     _instance = None
@@ -65,16 +425,50 @@ class DBManager:
                     cls._instance = DBManager()
         return cls._instance
 
-    def __init__(self):
-        self.engine = create_engine(
-            DATABASE_URL,
-            poolclass=QueuePool,
-            pool_size=5,
-            max_overflow=10,
-            pool_timeout=30,
-            pool_recycle=1800
-        )
+    def __init__(self, database_url=DATABASE_URL):
+        if database_url.startswith('sqlite'):
+            self.engine = create_engine(database_url, connect_args={'timeout': 30})
+            event.listen(self.engine, 'connect', _configure_sqlite_connection)
+            _register_sqlite_adapters()
+        else:
+            self.engine = create_engine(
+                database_url,
+                poolclass=QueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=1800
+            )
+        self.dialect = self.engine.dialect.name
         self.Session = scoped_session(sessionmaker(bind=self.engine))
+        self._compact = None
+        self._partitioned = None
+        self._known_partitions = set()
+        self._write_listeners = []
+
+    def add_write_listener(self, listener):
+        """Call listener(changes) after candles are written or deleted
+
+        changes maps each affected symbol to the set of days written, or to
+        None when all of its data was deleted.
+        """
+        self._write_listeners.append(listener)
+
+    def _notify_write(self, changes):
+        """Tell the write listeners which symbols and days changed"""
+        for listener in self._write_listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                print(f"Error in write listener: {str(e)}")
+
+    @staticmethod
+    def _frame_days(frame):
+        """Days touched by a candle frame, per symbol"""
+        return {
+            symbol: set(timestamps.dt.date)
+            for symbol, timestamps in frame.groupby('symbol')['timestamp']
+        }
 
     @contextmanager
     def get_session(self):
@@ -91,19 +485,174 @@ class DBManager:
 
     def init_db(self):
         """Initialize the database by creating all tables"""
-        Base.metadata.create_all(self.engine)
+        if self.dialect == 'sqlite':
+            # Partitioning and the compact layout are PostgreSQL features
+            self._compact = False
+            self._partitioned = False
+            Base.metadata.create_all(self.engine)
+        else:
+            with self.engine.begin() as conn:
+                relkind = self._stocks_relkind(conn)
+                if relkind is None:
+                    if DB_STORAGE == 'compact':
+                        for ddl in COMPACT_STORAGE_DDL:
+                            conn.execute(text(ddl))
+                        relkind = 'v'
+                    else:
+                        conn.execute(text(STOCKS_PARTITIONED_DDL))
+            # A stocks view means candles are kept in the compact layout
+            self._compact = relkind == 'v'
+            self._partitioned = None
+            self._known_partitions = set()
+            Base.metadata.create_all(self.engine, tables=_managed_tables())
+        # create_all skips columns and indexes of tables that already exist
+        annotation_columns = {column['name'] for column in inspect(self.engine).get_columns('annotations')}
+        if 'client_id' not in annotation_columns:
+            with self.engine.begin() as conn:
+                conn.execute(text("ALTER TABLE annotations ADD COLUMN client_id VARCHAR"))
+        for index in Annotation.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
+        # Backfill the catalog for databases created before it existed
+        with self.get_session() as session:
+            catalog_empty = session.query(StockCatalog.symbol).first() is None
+            has_stocks = session.query(Stock.id).first() is not None
+        if catalog_empty and has_stocks:
+            self.rebuild_stock_catalog()
+        # Backfill rollups for 1-minute data loaded before they existed
+        with self.get_session() as session:
+            rollups_empty = session.query(StockRollup.symbol).first() is None
+            has_minute_data = session.query(Stock.id).filter(
+                Stock.resolution == ROLLUP_SOURCE_RESOLUTION
+            ).first() is not None
+        if rollups_empty and has_minute_data:
+            self.rebuild_rollups()
 
     def drop_and_recreate_tables(self):
         """Drop all tables and recreate them"""
-        Base.metadata.drop_all(self.engine)
-        Base.metadata.create_all(self.engine)
+        if self.dialect == 'sqlite':
+            Base.metadata.drop_all(self.engine)
+            self.init_db()
+            return
+        with self.engine.begin() as conn:
+            if self._stocks_relkind(conn) == 'v':
+                conn.execute(text("DROP VIEW stocks"))
+                conn.execute(text("DROP TABLE IF EXISTS candles, symbols, resolutions"))
+            else:
+                conn.execute(text("DROP TABLE IF EXISTS stocks"))
+        Base.metadata.drop_all(self.engine, tables=_managed_tables())
+        self.init_db()
+
+    @staticmethod
+    def _stocks_relkind(conn):
+        """pg_class relkind of stocks: 'r' plain, 'p' partitioned, 'v' compact view, None if missing"""
+        return conn.execute(text(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass('stocks')"
+        )).scalar()
+
+    @property
+    def compact(self):
+        """Whether candles are kept in the compact layout (detected once per instance)"""
+        if self._compact is None:
+            if self.dialect != 'postgresql':
+                self._compact = False
+            else:
+                with self.engine.connect() as conn:
+                    self._compact = self._stocks_relkind(conn) == 'v'
+        return self._compact
+
+    @property
+    def candle_table(self):
+        """Physical table the candles are written to"""
+        return 'candles' if self.compact else 'stocks'
+
+    def _stocks_partitioned(self):
+        """Whether the candle table is range partitioned (cached)"""
+        if self._partitioned is None and self.dialect != 'postgresql':
+            self._partitioned = False
+        if self._partitioned is None:
+            with self.engine.connect() as conn:
+                relkind = conn.execute(text(
+                    f"SELECT relkind FROM pg_class WHERE oid = to_regclass('{self.candle_table}')"
+                )).scalar()
+            self._partitioned = relkind == 'p'
+        return self._partitioned
+
+    def ensure_stock_partitions(self, first, last):
+        """Create any missing monthly partitions for candles between first and last"""
+        if not self._stocks_partitioned():
+            return
+        missing = [m for m in _month_starts(first, last) if m not in self._known_partitions]
+        if not missing:
+            return
+        # Committed separately so the partition locks are not held during the load
+        with self.engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('stocks_partitions'))"))
+            _create_stock_partitions(conn, missing, self.candle_table)
+        self._known_partitions.update(missing)
+
+    def partition_stocks_table(self):
+        """Migrate an unpartitioned stocks table into monthly partitions, keeping ids"""
+        if self.dialect != 'postgresql':
+            print(f"Partitioning is not supported on {self.dialect}")
+            return False
+        if self._stocks_partitioned():
+            print(f"{self.candle_table} is already partitioned")
+            return False
+        with self.engine.begin() as conn:
+            conn.execute(text("LOCK TABLE stocks IN ACCESS EXCLUSIVE MODE"))
+            first, last = conn.execute(text("SELECT min(timestamp), max(timestamp) FROM stocks")).first()
+            conn.execute(text("ALTER TABLE stocks RENAME TO stocks_unpartitioned"))
+            conn.execute(text("ALTER TABLE stocks_unpartitioned RENAME CONSTRAINT uix_symbol_timestamp TO uix_symbol_timestamp_unpartitioned"))
+            conn.execute(text("ALTER INDEX IF EXISTS stocks_pkey RENAME TO stocks_unpartitioned_pkey"))
+            conn.execute(text(STOCKS_PARTITIONED_DDL))
+            if first is not None:
+                _create_stock_partitions(conn, _month_starts(first, last))
+            conn.execute(text("""
+                INSERT INTO stocks (id, symbol, timestamp, open, high, low, close, volume, resolution)
+                SELECT id, symbol, timestamp, open, high, low, close, volume, resolution
+                FROM stocks_unpartitioned
+            """))
+            conn.execute(text(
+                "SELECT setval(pg_get_serial_sequence('stocks', 'id'), COALESCE(max(id), 0) + 1, false) FROM stocks"
+            ))
+            conn.execute(text("DROP TABLE stocks_unpartitioned"))
+        self._partitioned = True
+        self._known_partitions = set()
+        return True
+
+    def compact_stocks_table(self):
+        """Migrate a standard stocks table into the compact candles layout"""
+        if self.dialect != 'postgresql':
+            print(f"The compact layout is not supported on {self.dialect}")
+            return False
+        if self.compact:
+            print("stocks already uses the compact layout")
+            return False
+        with self.engine.begin() as conn:
+            conn.execute(text("LOCK TABLE stocks IN ACCESS EXCLUSIVE MODE"))
+            first, last = conn.execute(text("SELECT min(timestamp), max(timestamp) FROM stocks")).first()
+            conn.execute(text("ALTER TABLE stocks RENAME TO stocks_standard"))
+            for ddl in COMPACT_STORAGE_DDL:
+                conn.execute(text(ddl))
+            if first is not None:
+                _create_stock_partitions(conn, _month_starts(first, last), 'candles')
+            _add_compact_dictionary_entries(conn, 'stocks_standard')
+            conn.execute(text(f"""
+                INSERT INTO candles (timestamp, open, high, low, close, volume, symbol_id, resolution_id)
+                {_compact_candles_select('stocks_standard')}
+            """))
+            conn.execute(text("DROP TABLE stocks_standard"))
+        self._compact = True
+        self._partitioned = True
+        self._known_partitions = set()
+        return True
 
     def get_available_stocks(self):
         """Get list of available stocks"""
         try:
             with self.get_session() as session:
                 # Use distinct to avoid duplicates
-                stocks = session.query(Stock.symbol.distinct()).all()
+                stocks = session.query(StockCatalog.symbol.distinct()).all()
                 return sorted([stock[0] for stock in stocks])
         except Exception as e:
             print(f"Error getting available stocks: {str(e)}")
@@ -117,21 +666,14 @@ class DBManager:
                 query = session.query(Stock).filter(Stock.symbol == symbol)
                 
                 if date:
-                    print(f"Filtering by date: {date}")
-                    # Try to parse the date if it's a string
-                    if isinstance(date, str):
-                        try:
-                            # Assuming date format is YYYY-MM-DD
-                            date_obj = datetime.strptime(date, '%Y-%m-%d').date()
-                            print(f"Parsed date: {date_obj}")
-                            query = query.filter(func.date(Stock.timestamp) == date_obj)
-                        except ValueError as e:
-                            print(f"Error parsing date string: {e}")
-                            # If date parsing fails, try to use the string directly
-                            query = query.filter(func.date(Stock.timestamp) == date)
-                    else:
-                        # If date is already a date object, use it directly
-                        query = query.filter(func.date(Stock.timestamp) == date)
+                    logger.debug("Filtering by date: %s", date)
+                    try:
+                        # Half-open range on the raw column so the (symbol, timestamp) index is used
+                        day_start, day_end = _day_bounds(date)
+                    except ValueError as e:
+                        print(f"Error parsing date string: {e}")
+                        return pd.DataFrame()
+                    query = query.filter(Stock.timestamp >= day_start, Stock.timestamp < day_end)
                 
                 # Order by timestamp
                 query = query.order_by(Stock.timestamp)
@@ -142,48 +684,636 @@ class DBManager:
                 
                 # Execute the query and convert to DataFrame
                 result = pd.read_sql(query.statement, session.bind)
-                print(f"Query returned {len(result)} rows")
+                logger.debug("Query returned %d rows", len(result))
                 return result
         except Exception as e:
             print(f"Error in get_stock_data: {e}")
             traceback.print_exc()
             return pd.DataFrame()  # Return empty DataFrame on error
 
-    def get_stock_date_range(self, symbol):
-        """Get the date range for a stock"""
+    def iter_stock_data(self, symbol, chunk_rows=STREAM_FETCH_ROWS):
+        """Yield a symbol's candles (timestamp and OHLCV) in timestamp order, chunk_rows at a time"""
+        query = select(
+            Stock.timestamp, Stock.open, Stock.high, Stock.low, Stock.close, Stock.volume
+        ).where(Stock.symbol == symbol).order_by(Stock.timestamp)
+        # Server-side cursor so only one chunk is held in memory
+        with self.engine.connect() as conn:
+            if self.dialect == 'postgresql':
+                conn = conn.execution_options(stream_results=True)
+            for chunk in pd.read_sql(query, conn, chunksize=chunk_rows):
+                yield chunk
+
+    def get_stock_date_range(self, symbol, resolution=None):
+        """Get the date range for a stock, optionally for a single resolution"""
         with self.get_session() as session:
-            result = session.query(
+            query = session.query(
                 func.min(Stock.timestamp),
                 func.max(Stock.timestamp)
-            ).filter(Stock.symbol == symbol).first()
+            ).filter(Stock.symbol == symbol)
+            if resolution:
+                query = query.filter(Stock.resolution == resolution)
+            result = query.first()
             return result[0], result[1]
 
-    def save_stock_data(self, df):
-        """Save stock data to database"""
+    def get_stock_trading_days(self, symbol, resolution=None, start_date=None, end_date=None):
+        """Get the sorted dates that have candles for a stock within an optional date range"""
+        if resolution == ROLLUP_SOURCE_RESOLUTION:
+            # One daily rollup row per trading day instead of scanning every candle
+            with self.get_session() as session:
+                query = session.query(StockRollup.bucket_start).filter(
+                    StockRollup.symbol == symbol,
+                    StockRollup.bucket == '1D'
+                )
+                if start_date:
+                    query = query.filter(StockRollup.bucket_start >= start_date)
+                if end_date:
+                    query = query.filter(StockRollup.bucket_start < end_date + timedelta(days=1))
+                return [row[0].date() for row in query.order_by(StockRollup.bucket_start).all()]
+        with self.get_session() as session:
+            query = session.query(func.date(Stock.timestamp, type_=Date).distinct()).filter(Stock.symbol == symbol)
+            if resolution:
+                query = query.filter(Stock.resolution == resolution)
+            if start_date:
+                query = query.filter(Stock.timestamp >= start_date)
+            if end_date:
+                query = query.filter(Stock.timestamp < end_date + timedelta(days=1))
+            return sorted(row[0] for row in query.all())
+
+    def get_stock_buckets(self, symbol, start_date, end_date, bucket_minutes=None, resolution=None):
+        """Aggregate candles between two dates (inclusive) into buckets aligned to the 09:15 session open, or daily buckets when bucket_minutes is None"""
+        params = {
+            'symbol': symbol,
+            'start': start_date,
+            'end': end_date + timedelta(days=1),
+            'resolution': resolution
+        }
+        rollup = next((name for name, minutes in ROLLUP_BUCKETS.items() if minutes == bucket_minutes), None)
+        if resolution == ROLLUP_SOURCE_RESOLUTION and rollup is not None:
+            # Maintained on ingest, so read the pre-aggregated rows
+            params['bucket'] = rollup
+            query = text("""
+                SELECT bucket_start AS timestamp, open, high, low, close, volume
+                FROM stock_rollups
+                WHERE symbol = :symbol AND bucket = :bucket
+                  AND bucket_start >= :start AND bucket_start < :end
+                ORDER BY bucket_start
+            """)
+        else:
+            resolution_filter = "AND resolution = :resolution" if resolution else ""
+            query = text(f"""
+                SELECT {_bucket_sql(bucket_minutes, self.dialect)} AS timestamp, {_ohlcv_aggregates(self.dialect)}
+                FROM stocks
+                WHERE symbol = :symbol
+                  AND timestamp >= :start AND timestamp < :end
+                  {resolution_filter}
+                GROUP BY 1
+                ORDER BY 1
+            """)
+        with self.engine.connect() as conn:
+            return pd.read_sql(query, conn, params=params, parse_dates=['timestamp'])
+
+    def get_stock_closes(self, symbol, start_date, end_date, resolution=None):
+        """Get timestamps and closes between two dates (inclusive) at stored resolution"""
+        query = select(Stock.timestamp, Stock.close).where(
+            Stock.symbol == symbol,
+            Stock.timestamp >= start_date,
+            Stock.timestamp < end_date + timedelta(days=1)
+        ).order_by(Stock.timestamp)
+        if resolution:
+            query = query.where(Stock.resolution == resolution)
+        with self.engine.connect() as conn:
+            return pd.read_sql(query, conn)
+
+    def get_stock_catalog(self, symbol=None):
+        """Get the maintained per-(symbol, resolution) catalog entries"""
+        with self.get_session() as session:
+            query = session.query(StockCatalog)
+            if symbol:
+                query = query.filter(StockCatalog.symbol == symbol)
+            entries = query.order_by(StockCatalog.symbol, StockCatalog.resolution).all()
+            return [{
+                'symbol': e.symbol,
+                'resolution': e.resolution,
+                'start_date': e.start_timestamp,
+                'end_date': e.end_timestamp,
+                'row_count': e.row_count,
+                'trading_days': e.trading_days
+            } for e in entries]
+
+    def get_stock_date_ranges(self):
+        """Get the first and last timestamp of every stock from the catalog"""
+        with self.get_session() as session:
+            rows = session.query(
+                StockCatalog.symbol,
+                func.min(StockCatalog.start_timestamp),
+                func.max(StockCatalog.end_timestamp)
+            ).group_by(StockCatalog.symbol).order_by(StockCatalog.symbol).all()
+            return {row[0]: {'min_date': row[1], 'max_date': row[2]} for row in rows}
+
+    def rebuild_stock_catalog(self, symbol=None):
+        """Recompute catalog entries from the stocks table"""
+        with self.get_session() as session:
+            query = session.query(
+                Stock.symbol,
+                Stock.resolution,
+                func.min(Stock.timestamp),
+                func.max(Stock.timestamp),
+                func.count(Stock.id),
+                func.count(func.distinct(func.date(Stock.timestamp, type_=Date)))
+            )
+            catalog_query = session.query(StockCatalog)
+            if symbol:
+                query = query.filter(Stock.symbol == symbol)
+                catalog_query = catalog_query.filter(StockCatalog.symbol == symbol)
+            catalog_query.delete(synchronize_session=False)
+            for row in query.group_by(Stock.symbol, Stock.resolution).all():
+                session.add(StockCatalog(
+                    symbol=row[0],
+                    resolution=row[1],
+                    start_timestamp=row[2],
+                    end_timestamp=row[3],
+                    row_count=row[4],
+                    trading_days=row[5],
+                    updated_at=datetime.now()
+                ))
+
+    def rebuild_rollups(self, symbol=None):
+        """Recompute every rollup bucket from the 1-minute candles"""
+        symbol_filter = "AND symbol = :symbol" if symbol else ""
+        with self.get_session() as session:
+            session.execute(
+                text(f"DELETE FROM stock_rollups WHERE TRUE {symbol_filter}"),
+                {'symbol': symbol}
+            )
+            for bucket, minutes in ROLLUP_BUCKETS.items():
+                session.execute(text(f"""
+                    INSERT INTO stock_rollups (symbol, bucket, bucket_start, open, high, low, close, volume, bar_count)
+                    SELECT symbol, :bucket, {_bucket_sql(minutes, self.dialect)}, {_ohlcv_aggregates(self.dialect)}, COUNT(*)
+                    FROM stocks
+                    WHERE resolution = :resolution {symbol_filter}
+                    GROUP BY 1, 3
+                """), {'bucket': bucket, 'resolution': ROLLUP_SOURCE_RESOLUTION, 'symbol': symbol})
+
+    def _refresh_rollups(self, session, frame):
+        """Recompute the rollup buckets touched by a batch of candles"""
+        minute_rows = frame[frame['resolution'] == ROLLUP_SOURCE_RESOLUTION]
+        if minute_rows.empty:
+            return
+        ranges = minute_rows.groupby('symbol')['timestamp'].agg(['min', 'max'])
+        for symbol, (first, last) in ranges.iterrows():
+            for bucket, minutes in ROLLUP_BUCKETS.items():
+                params = {
+                    'symbol': symbol,
+                    'bucket': bucket,
+                    'resolution': ROLLUP_SOURCE_RESOLUTION,
+                    'start': _bucket_floor(first, minutes),
+                    'end': _bucket_floor(last, minutes) + _bucket_length(minutes)
+                }
+                session.execute(text("""
+                    DELETE FROM stock_rollups
+                    WHERE symbol = :symbol AND bucket = :bucket
+                      AND bucket_start >= :start AND bucket_start < :end
+                """), params)
+                session.execute(text(f"""
+                    INSERT INTO stock_rollups (symbol, bucket, bucket_start, open, high, low, close, volume, bar_count)
+                    SELECT :symbol, :bucket, {_bucket_sql(minutes, self.dialect)}, {_ohlcv_aggregates(self.dialect)}, COUNT(*)
+                    FROM stocks
+                    WHERE symbol = :symbol AND resolution = :resolution
+                      AND timestamp >= :start AND timestamp < :end
+                    GROUP BY 3
+                """), params)
+
+    def _lock_catalog_entries(self, session, frame):
+        """Lock the catalog rows touched by a batch and count the trading days it adds
+
+        Missing rows are created first (INSERT ... ON CONFLICT DO NOTHING), since
+        SELECT ... FOR UPDATE locks nothing on a row that does not exist yet and
+        two writers of a new (symbol, resolution) would both try to add it.
+        """
+        dialect_insert = postgresql.insert if self.dialect == 'postgresql' else sqlite.insert
+        pending = []
+        for (symbol, resolution), group in frame.groupby(['symbol', 'resolution']):
+            start = group['timestamp'].min().to_pydatetime()
+            end = group['timestamp'].max().to_pydatetime()
+            session.execute(dialect_insert(StockCatalog).values(
+                symbol=symbol,
+                resolution=resolution,
+                start_timestamp=start,
+                end_timestamp=end,
+                row_count=0,
+                trading_days=0,
+                updated_at=datetime.now()
+            ).on_conflict_do_nothing(index_elements=['symbol', 'resolution']))
+            entry = session.query(StockCatalog).filter(
+                StockCatalog.symbol == symbol,
+                StockCatalog.resolution == resolution
+            ).with_for_update().one()
+
+            batch_days = set(group['timestamp'].dt.date.unique())
+            first_day, last_day = min(batch_days), max(batch_days)
+            rows = session.query(func.date(Stock.timestamp, type_=Date).distinct()).filter(
+                Stock.symbol == symbol,
+                Stock.resolution == resolution,
+                Stock.timestamp >= first_day,
+                Stock.timestamp < last_day + timedelta(days=1)
+            ).all()
+            existing_days = {row[0] for row in rows}
+
+            pending.append({
+                'entry': entry,
+                'symbol': symbol,
+                'resolution': resolution,
+                'start': start,
+                'end': end,
+                'new_days': len(batch_days - existing_days)
+            })
+        return pending
+
+    def _apply_catalog_entries(self, session, pending, inserted_rows):
+        """Fold a committed batch into the catalog rows locked by _lock_catalog_entries"""
+        for item in pending:
+            entry = item['entry']
+            entry.start_timestamp = min(entry.start_timestamp, item['start'])
+            entry.end_timestamp = max(entry.end_timestamp, item['end'])
+            entry.row_count += inserted_rows.get((item['symbol'], item['resolution']), 0)
+            entry.trading_days += item['new_days']
+            entry.updated_at = datetime.now()
+
+    def _merge_candles_postgres(self, session, frame, on_conflict):
+        """COPY a batch into a staging table and merge it, returning per-(symbol, resolution) counts"""
+        session.execute(text("""
+            CREATE TEMP TABLE stocks_staging (
+                symbol TEXT,
+                timestamp TIMESTAMP,
+                open DOUBLE PRECISION,
+                high DOUBLE PRECISION,
+                low DOUBLE PRECISION,
+                close DOUBLE PRECISION,
+                volume DOUBLE PRECISION,
+                resolution TEXT
+            ) ON COMMIT DROP
+        """))
+
+        cursor = session.connection().connection.cursor()
         try:
+            for start in range(0, len(frame), COPY_CHUNK_ROWS):
+                buffer = io.StringIO()
+                frame.iloc[start:start + COPY_CHUNK_ROWS].to_csv(
+                    buffer, index=False, header=False,
+                    date_format='%Y-%m-%d %H:%M:%S'
+                )
+                buffer.seek(0)
+                cursor.copy_expert(
+                    "COPY stocks_staging (symbol, timestamp, open, high, low, close, volume, resolution) "
+                    "FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+        finally:
+            cursor.close()
+
+        table = self.candle_table
+        if on_conflict == 'update':
+            conflict_clause = f"""
+                DO UPDATE SET
+                    open = EXCLUDED.open,
+                    high = EXCLUDED.high,
+                    low = EXCLUDED.low,
+                    close = EXCLUDED.close,
+                    volume = EXCLUDED.volume
+                WHERE ({table}.open, {table}.high, {table}.low, {table}.close, {table}.volume)
+                    IS DISTINCT FROM
+                    (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close, EXCLUDED.volume)
+            """
+        else:
+            conflict_clause = "DO NOTHING"
+
+        # xmax is 0 only for freshly inserted row versions
+        if self.compact:
+            _add_compact_dictionary_entries(session, 'stocks_staging')
+            return session.execute(text(f"""
+                WITH merged AS (
+                    INSERT INTO candles (timestamp, open, high, low, close, volume, symbol_id, resolution_id)
+                    {_compact_candles_select('stocks_staging')}
+                    ON CONFLICT (symbol_id, timestamp) {conflict_clause}
+                    RETURNING symbol_id, resolution_id, (xmax = 0) AS inserted
+                )
+                SELECT
+                    s.symbol,
+                    r.resolution,
+                    COUNT(*) FILTER (WHERE inserted) AS inserted,
+                    COUNT(*) FILTER (WHERE NOT inserted) AS updated
+                FROM merged
+                JOIN symbols s ON s.id = merged.symbol_id
+                JOIN resolutions r ON r.id = merged.resolution_id
+                GROUP BY s.symbol, r.resolution
+            """))
+        return session.execute(text(f"""
+            WITH merged AS (
+                INSERT INTO stocks (symbol, timestamp, open, high, low, close, volume, resolution)
+                SELECT symbol, timestamp, open, high, low, close, ROUND(volume)::INTEGER, resolution
+                FROM stocks_staging
+                ON CONFLICT (symbol, timestamp) {conflict_clause}
+                RETURNING symbol, resolution, (xmax = 0) AS inserted
+            )
+            SELECT
+                symbol,
+                resolution,
+                COUNT(*) FILTER (WHERE inserted) AS inserted,
+                COUNT(*) FILTER (WHERE NOT inserted) AS updated
+            FROM merged
+            GROUP BY symbol, resolution
+        """))
+
+    def _merge_candles_sqlite(self, session, frame, on_conflict):
+        """Stage a batch with executemany and merge it with an UPSERT, returning per-(symbol, resolution) counts"""
+        session.execute(text("DROP TABLE IF EXISTS temp.stocks_staging"))
+        session.execute(text("""
+            CREATE TEMP TABLE stocks_staging (
+                symbol TEXT,
+                timestamp TEXT,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                resolution TEXT
+            )
+        """))
+        staged = frame.assign(
+            timestamp=frame['timestamp'].dt.strftime(SQLITE_TIMESTAMP_FORMAT),
+            volume=frame['volume'].astype(float)
+        )
+        cursor = session.connection().connection.cursor()
+        try:
+            for start in range(0, len(staged), COPY_CHUNK_ROWS):
+                cursor.executemany(
+                    "INSERT INTO stocks_staging (symbol, timestamp, open, high, low, close, volume, resolution) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    staged.iloc[start:start + COPY_CHUNK_ROWS].itertuples(index=False, name=None)
+                )
+        finally:
+            cursor.close()
+
+        # No xmax here, so count new and changed rows before merging
+        changed = """
+            (s.open, s.high, s.low, s.close, s.volume)
+                IS NOT (st.open, st.high, st.low, st.close, ROUND(st.volume))
+        """ if on_conflict == 'update' else "0"
+        result = session.execute(text(f"""
+            SELECT
+                st.symbol,
+                st.resolution,
+                SUM(CASE WHEN s.symbol IS NULL THEN 1 ELSE 0 END) AS inserted,
+                SUM(CASE WHEN s.symbol IS NOT NULL AND {changed} THEN 1 ELSE 0 END) AS updated
+            FROM stocks_staging st
+            LEFT JOIN stocks s ON s.symbol = st.symbol AND s.timestamp = st.timestamp
+            GROUP BY st.symbol, st.resolution
+        """)).all()
+
+        if on_conflict == 'update':
+            conflict_clause = """
+                DO UPDATE SET
+                    open = excluded.open,
+                    high = excluded.high,
+                    low = excluded.low,
+                    close = excluded.close,
+                    volume = excluded.volume
+                WHERE (stocks.open, stocks.high, stocks.low, stocks.close, stocks.volume)
+                    IS NOT (excluded.open, excluded.high, excluded.low, excluded.close, excluded.volume)
+            """
+        else:
+            conflict_clause = "DO NOTHING"
+        # WHERE TRUE keeps SQLite from parsing ON CONFLICT as a join constraint
+        session.execute(text(f"""
+            INSERT INTO stocks (symbol, timestamp, open, high, low, close, volume, resolution)
+            SELECT symbol, timestamp, open, high, low, close, CAST(ROUND(volume) AS INTEGER), resolution
+            FROM stocks_staging
+            WHERE TRUE
+            ON CONFLICT (symbol, timestamp) {conflict_clause}
+        """))
+        session.execute(text("DROP TABLE temp.stocks_staging"))
+        return result
+
+    def bulk_upsert_stock_data(self, df, on_conflict='update'):
+        """Bulk load candles through COPY and merge them into the stocks table
+
+        Rows are streamed into a temporary staging table and merged with
+        INSERT ... ON CONFLICT, so re-loading an overlapping range is safe.
+        on_conflict='update' overwrites changed candles, 'nothing' keeps the
+        stored ones. Returns a dict of inserted/updated/skipped counts, or
+        None if the load failed.
+        """
+        if on_conflict not in ('update', 'nothing'):
+            raise ValueError(f"Unknown on_conflict mode: {on_conflict}")
+        try:
+            frame = _prepare_stock_frame(df)
+            # A key repeated inside one batch cannot be merged by a single INSERT
+            frame = frame.drop_duplicates(['symbol', 'timestamp'], keep='last')
+            stats = {'inserted': 0, 'updated': 0, 'skipped': 0}
+            if frame.empty:
+                return stats
+
+            self.ensure_stock_partitions(frame['timestamp'].min(), frame['timestamp'].max())
             with self.get_session() as session:
-                records = df.to_dict('records')
+                pending = self._lock_catalog_entries(session, frame)
+                if self.dialect == 'sqlite':
+                    result = self._merge_candles_sqlite(session, frame, on_conflict)
+                else:
+                    result = self._merge_candles_postgres(session, frame, on_conflict)
+
+                inserted_rows = {}
+                for row in result:
+                    inserted_rows[(row.symbol, row.resolution)] = row.inserted
+                    stats['inserted'] += row.inserted
+                    stats['updated'] += row.updated
+                stats['skipped'] = len(frame) - stats['inserted'] - stats['updated']
+
+                self._apply_catalog_entries(session, pending, inserted_rows)
+                self._refresh_rollups(session, frame)
+            self._notify_write(self._frame_days(frame))
+            return stats
+        except Exception as e:
+            print(f"Error bulk loading stock data: {str(e)}")
+            traceback.print_exc()
+            return None
+
+    def save_stock_data(self, df, on_conflict=None):
+        """Save stock data to database
+
+        Passing on_conflict ('update' or 'nothing') uses the idempotent
+        bulk upsert path instead of failing on existing candles.
+        """
+        if on_conflict is not None:
+            return self.bulk_upsert_stock_data(df, on_conflict=on_conflict) is not None
+        try:
+            frame = _prepare_stock_frame(df)
+            if frame.empty:
+                return True
+            self.ensure_stock_partitions(frame['timestamp'].min(), frame['timestamp'].max())
+            with self.get_session() as session:
+                pending = self._lock_catalog_entries(session, frame)
+                records = frame.to_dict('records')
                 stock_objects = []
                 for record in records:
                     stock = Stock(
                         symbol=record['symbol'],
-                        timestamp=record['timestamp'] if 'timestamp' in record else record['date'],
+                        timestamp=record['timestamp'],
                         open=record['open'],
                         high=record['high'],
                         low=record['low'],
                         close=record['close'],
                         volume=record['volume'],
-                        resolution=record.get('resolution', '1D')
+                        resolution=record['resolution']
                     )
                     stock_objects.append(stock)
                 session.bulk_save_objects(stock_objects)
-                return True
+                inserted_rows = frame.groupby(['symbol', 'resolution']).size().to_dict()
+                self._apply_catalog_entries(session, pending, inserted_rows)
+                self._refresh_rollups(session, frame)
+            self._notify_write(self._frame_days(frame))
+            return True
         except Exception as e:
             print(f"Error saving stock data: {str(e)}")
             return False
 
+    def _record_annotation_changes(self, session, action, records):
+        """Append one change per annotation record (multi-row) and set each record's version"""
+        if not records:
+            return records
+        if self.dialect == 'postgresql':
+            # Serialise writers so versions become visible in order
+            session.execute(text("SELECT pg_advisory_xact_lock(hashtext('annotation_changes'))"))
+        changed_at = datetime.now()
+        versions = session.execute(
+            insert(AnnotationChange).returning(AnnotationChange.version, sort_by_parameter_order=True),
+            [{
+                'action': action,
+                'annotation_id': record['id'],
+                'timestamp': record['timestamp'],
+                'stock': record['stock'],
+                'signal': record['signal'],
+                'price': record['price'],
+                'reason': record['reason'],
+                'changed_at': changed_at
+            } for record in records]
+        ).scalars().all()
+        for record, version in zip(records, versions):
+            record['version'] = version
+        return records
+
+    def _record_annotation_change(self, session, action, annotation):
+        """Append an annotation change and return the annotation with its version"""
+        return self._record_annotation_changes(session, action, [_annotation_record(annotation)])[0]
+
+    def _create_annotations(self, session, operations, result):
+        """Multi-row insert of create operations, skipping client ids that already exist
+
+        A client id repeated within the batch is created once. Rows with a
+        client id are inserted with ON CONFLICT (client_id) DO NOTHING, so a
+        concurrent replay of the same batch reports the rows the other writer
+        created as existing instead of failing on the unique index.
+        """
+        rows = []
+        seen = set()
+        for op in operations:
+            client_id = op.get('client_id') or None
+            if client_id:
+                if client_id in seen:
+                    continue
+                seen.add(client_id)
+            rows.append({
+                'timestamp': op['timestamp'],
+                'stock': op['stock'],
+                'signal': op['signal'],
+                'price': op.get('price'),
+                'reason': op.get('reason'),
+                'client_id': client_id
+            })
+        if not rows:
+            return
+
+        created = {}
+        keyed = [row for row in rows if row['client_id']]
+        if keyed:
+            dialect_insert = postgresql.insert if self.dialect == 'postgresql' else sqlite.insert
+            inserted = session.execute(
+                dialect_insert(Annotation)
+                .on_conflict_do_nothing(index_elements=['client_id'])
+                .returning(Annotation.id, Annotation.client_id),
+                keyed
+            ).all()
+            created = {client_id: annotation_id for annotation_id, client_id in inserted}
+            skipped = [row['client_id'] for row in keyed if row['client_id'] not in created]
+            if skipped:
+                existing = session.query(Annotation).filter(Annotation.client_id.in_(skipped)).order_by(Annotation.id)
+                result['existing'].extend(_annotation_record(annotation) for annotation in existing)
+
+        unkeyed = [row for row in rows if not row['client_id']]
+        unkeyed_ids = iter(session.execute(
+            insert(Annotation).returning(Annotation.id, sort_by_parameter_order=True), unkeyed
+        ).scalars().all() if unkeyed else [])
+
+        # Record the changes in batch order
+        records = []
+        for row in rows:
+            if not row['client_id']:
+                records.append({'id': next(unkeyed_ids), **row})
+            elif row['client_id'] in created:
+                records.append({'id': created[row['client_id']], **row})
+        if not records:
+            return
+        result['created'].extend(self._record_annotation_changes(session, 'added', records))
+        result['changes'].extend({'action': 'added', 'annotation': r, 'version': r['version']} for r in records)
+
+    def _delete_annotations(self, session, operations, result):
+        """Delete the annotations named by id or client_id in one statement"""
+        ids = {op['id'] for op in operations if op.get('id') is not None}
+        client_ids = {op['client_id'] for op in operations if op.get('client_id')}
+        annotations = session.query(Annotation).filter(
+            or_(Annotation.id.in_(ids), Annotation.client_id.in_(client_ids))
+        ).order_by(Annotation.id).all()
+        found_ids = {a.id for a in annotations}
+        found_client_ids = {a.client_id for a in annotations}
+        result['missing'].extend(
+            op for op in operations
+            if op.get('id') not in found_ids and (not op.get('client_id') or op['client_id'] not in found_client_ids)
+        )
+        if not annotations:
+            return
+        records = self._record_annotation_changes(session, 'deleted', [_annotation_record(a) for a in annotations])
+        session.query(Annotation).filter(Annotation.id.in_(found_ids)).delete(synchronize_session=False)
+        result['deleted'].extend(records)
+        result['changes'].extend({'action': 'deleted', 'annotation': r, 'version': r['version']} for r in records)
+
+    def apply_annotation_batch(self, operations):
+        """Apply create/delete annotation operations in a single transaction
+
+        Each operation is {'op': 'create', 'timestamp', 'stock', 'signal',
+        'price', 'reason', 'client_id'} or {'op': 'delete', 'id' or
+        'client_id'}. Consecutive operations of the same kind are written
+        with one multi-row statement; a create whose client_id already
+        exists is skipped. Returns the created, deleted, existing and
+        missing rows plus the ordered changes with their versions.
+        """
+        result = {'created': [], 'deleted': [], 'existing': [], 'missing': [], 'changes': []}
+        runs = []
+        for op in operations:
+            if op.get('op') not in ('create', 'delete'):
+                raise ValueError(f"Unknown annotation operation: {op.get('op')}")
+            if runs and runs[-1][0] == op['op']:
+                runs[-1][1].append(op)
+            else:
+                runs.append((op['op'], [op]))
+        with self.get_session() as session:
+            for kind, run in runs:
+                if kind == 'create':
+                    self._create_annotations(session, run, result)
+                else:
+                    self._delete_annotations(session, run, result)
+        return result
+
     def save_annotation(self, timestamp, stock, signal, price=None, reason=None):
-        """Save annotation to database"""
+        """Save annotation to database, returning it with its change version"""
         try:
             with self.get_session() as session:
                 annotation = Annotation(
@@ -194,86 +1324,133 @@ class DBManager:
                     reason=reason
                 )
                 session.add(annotation)
-                return True
+                session.flush()
+                return self._record_annotation_change(session, 'added', annotation)
         except Exception as e:
             print(f"Error saving annotation: {str(e)}")
             return False
 
     def delete_annotation(self, annotation_id):
-        """Delete a specific annotation by ID"""
+        """Delete a specific annotation by ID, returning the deleted row with its change version"""
         try:
             with self.get_session() as session:
                 annotation = session.query(Annotation).filter(Annotation.id == annotation_id).first()
                 if annotation:
+                    record = self._record_annotation_change(session, 'deleted', annotation)
                     session.delete(annotation)
-                    return True
+                    return record
                 return False
         except Exception as e:
             print(f"Error deleting annotation: {str(e)}")
             return False
 
     def delete_last_annotation(self):
-        """Delete the most recent annotation"""
+        """Delete the most recent annotation, returning the deleted row with its change version"""
         try:
             with self.get_session() as session:
                 last_annotation = session.query(Annotation).order_by(Annotation.id.desc()).first()
                 if last_annotation:
+                    record = self._record_annotation_change(session, 'deleted', last_annotation)
                     session.delete(last_annotation)
-                    return True
+                    return record
                 return False
         except Exception as e:
             print(f"Error deleting last annotation: {str(e)}")
             return False
 
-    def get_annotations(self):
-        """Get all annotations"""
+    def get_annotation_version(self):
+        """Version of the latest annotation change (0 if there is none)"""
+        with self.get_session() as session:
+            return session.query(func.max(AnnotationChange.version)).scalar() or 0
+
+    def get_annotation_changes(self, since, limit=None):
+        """Get annotation changes after a version, oldest first"""
         with self.get_session() as session:
-            annotations = session.query(Annotation).all()
-            return pd.DataFrame([{
-                'id': a.id,
-                'timestamp': a.timestamp,
-                'stock': a.stock,
-                'signal': a.signal,
-                'price': a.price,
-                'reason': a.reason
-            } for a in annotations])
+            query = session.query(AnnotationChange).filter(
+                AnnotationChange.version > since
+            ).order_by(AnnotationChange.version)
+            if limit:
+                query = query.limit(limit)
+            return [{
+                'version': c.version,
+                'action': c.action,
+                'annotation': {
+                    'id': c.annotation_id,
+                    'timestamp': c.timestamp,
+                    'stock': c.stock,
+                    'signal': c.signal,
+                    'price': c.price,
+                    'reason': c.reason
+                }
+            } for c in query.all()]
+
+    def get_annotations(self, stock=None, date=None, start=None, end=None, signal=None, limit=None, offset=None):
+        """Get annotations, optionally filtered by stock, day or inclusive time range and signal, in timestamp order"""
+        with self.get_session() as session:
+            query = session.query(Annotation)
+            if stock:
+                query = query.filter(Annotation.stock == stock)
+            if date:
+                day_start, day_end = _day_bounds(date)
+                query = query.filter(Annotation.timestamp >= day_start, Annotation.timestamp < day_end)
+            if start is not None:
+                query = query.filter(Annotation.timestamp >= start)
+            if end is not None:
+                query = query.filter(Annotation.timestamp <= end)
+            if signal:
+                query = query.filter(Annotation.signal == signal)
+            query = query.order_by(Annotation.timestamp, Annotation.id)
+            if offset:
+                query = query.offset(offset)
+            if limit:
+                query = query.limit(limit)
+            return pd.DataFrame(
+                [_annotation_record(a) for a in query.all()],
+                columns=['id', 'timestamp', 'stock', 'signal', 'price', 'reason', 'client_id']
+            )
 
     def get_annotation_status(self):
         """Get annotation status for all stocks"""
         try:
+            stocks = self.get_available_stocks()
+            if not stocks:
+                return {}
+
+            # 1-minute trading days come from the daily rollups, other resolutions from the candles
+            candle_days = union(
+                select(
+                    StockRollup.symbol,
+                    func.date(StockRollup.bucket_start, type_=Date).label('day')
+                ).where(StockRollup.bucket == '1D'),
+                select(
+                    Stock.symbol,
+                    func.date(Stock.timestamp, type_=Date).label('day')
+                ).where(Stock.resolution != ROLLUP_SOURCE_RESOLUTION)
+            )
+            annotation_days = select(
+                Annotation.stock,
+                func.date(Annotation.timestamp, type_=Date).label('day')
+            ).distinct()
+
+            all_dates = {stock: set() for stock in stocks}
+            annotated = {stock: set() for stock in stocks}
             with self.get_session() as session:
-                stocks = self.get_available_stocks()
-                if not stocks:
-                    return {}
-                
-                result = {}
-                for stock in stocks:
-                    total_dates = session.query(
-                        func.count(func.distinct(func.date(Stock.timestamp)))
-                    ).filter(Stock.symbol == stock).scalar()
-                    
-                    annotated_dates = session.query(
-                        func.distinct(func.date(Annotation.timestamp))
-                    ).filter(Annotation.stock == stock).all()
-                    annotated_dates = [date[0] for date in annotated_dates]
-                    
-                    completion = len(annotated_dates) / total_dates if total_dates > 0 else 0
-                    
-                    all_dates = session.query(
-                        func.distinct(func.date(Stock.timestamp))
-                    ).filter(Stock.symbol == stock).all()
-                    all_dates = [date[0] for date in all_dates]
-                    
-                    pending_dates = [date for date in all_dates if date not in annotated_dates]
-                    
-                    result[stock] = {
-                        'completion': completion,
-                        'total_dates': total_dates,
-                        'annotated_dates': annotated_dates,
-                        'pending_dates': pending_dates
-                    }
-                
-                return result
+                for symbol, day in session.execute(candle_days):
+                    all_dates.setdefault(symbol, set()).add(day)
+                for stock, day in session.execute(annotation_days):
+                    annotated.setdefault(stock, set()).add(day)
+
+            result = {}
+            for stock in stocks:
+                total_dates = len(all_dates[stock])
+                annotated_dates = sorted(annotated[stock])
+                result[stock] = {
+                    'completion': len(annotated_dates) / total_dates if total_dates > 0 else 0,
+                    'total_dates': total_dates,
+                    'annotated_dates': annotated_dates,
+                    'pending_dates': sorted(all_dates[stock] - annotated[stock])
+                }
+            return result
         except Exception as e:
             print(f"Error getting annotation status: {str(e)}")
             return {}
@@ -282,9 +1459,20 @@ class DBManager:
         """Delete all data for a specific stock from the database"""
         try:
             with self.get_session() as session:
-                session.query(Stock).filter(Stock.symbol == symbol).delete()
+                if self.compact:
+                    # Skip the per-row INSTEAD OF trigger of the stocks view
+                    session.execute(text(
+                        "DELETE FROM candles WHERE symbol_id = (SELECT id FROM symbols WHERE symbol = :symbol)"
+                    ), {'symbol': symbol})
+                else:
+                    session.query(Stock).filter(Stock.symbol == symbol).delete()
+                session.query(StockCatalog).filter(StockCatalog.symbol == symbol).delete()
+                session.query(StockRollup).filter(StockRollup.symbol == symbol).delete()
+                annotations = session.query(Annotation).filter(Annotation.stock == symbol).order_by(Annotation.id).all()
+                self._record_annotation_changes(session, 'deleted', [_annotation_record(a) for a in annotations])
                 session.query(Annotation).filter(Annotation.stock == symbol).delete()
-                return True
+            self._notify_write({symbol: None})
+            return True
         except Exception as e:
             print(f"Error deleting stock data: {str(e)}")
             return False
@@ -292,30 +1480,17 @@ class DBManager:
     def get_stocks_summary(self):
         """Get summary of available stock data"""
         try:
-            with self.get_session() as session:
-                query = """
-                    SELECT 
-                        symbol,
-                        MIN(timestamp) as start_date,
-                        MAX(timestamp) as end_date,
-                        resolution,
-                        COUNT(*) as row_count
-                    FROM stocks
-                    GROUP BY symbol, resolution
-                    ORDER BY symbol
-                """
-                result = session.execute(text(query))
-                
-                summary = []
-                for row in result:
-                    summary.append({
-                        'symbol': row.symbol,
-                        'start_date': row.start_date.strftime('%Y-%m-%d'),
-                        'end_date': row.end_date.strftime('%Y-%m-%d'),
-                        'resolution': row.resolution,
-                        'row_count': row.row_count
-                    })
-                return summary
+            summary = []
+            for entry in self.get_stock_catalog():
+                summary.append({
+                    'symbol': entry['symbol'],
+                    'start_date': entry['start_date'].strftime('%Y-%m-%d'),
+                    'end_date': entry['end_date'].strftime('%Y-%m-%d'),
+                    'resolution': entry['resolution'],
+                    'row_count': entry['row_count'],
+                    'trading_days': entry['trading_days']
+                })
+            return summary
         except Exception as e:
             print(f"Error getting stocks summary: {str(e)}")
             return []
@@ -330,12 +1505,25 @@ db.init_db()
 # Export functions for backward compatibility
 get_available_stocks = db.get_available_stocks
 get_stock_data = db.get_stock_data
+iter_stock_data = db.iter_stock_data
 get_stock_date_range = db.get_stock_date_range
+get_stock_trading_days = db.get_stock_trading_days
+get_stock_buckets = db.get_stock_buckets
+get_stock_closes = db.get_stock_closes
+rebuild_rollups = db.rebuild_rollups
+partition_stocks_table = db.partition_stocks_table
+compact_stocks_table = db.compact_stocks_table
 save_stock_data = db.save_stock_data
+bulk_upsert_stock_data = db.bulk_upsert_stock_data
 save_annotation = db.save_annotation
 delete_annotation = db.delete_annotation
 delete_last_annotation = db.delete_last_annotation
 get_annotations = db.get_annotations
+get_annotation_version = db.get_annotation_version
+get_annotation_changes = db.get_annotation_changes
+apply_annotation_batch = db.apply_annotation_batch
 get_annotation_status = db.get_annotation_status
 delete_stock_data = db.delete_stock_data
-get_stocks_summary = db.get_stocks_summary 
\ No newline at end of file
+get_stocks_summary = db.get_stocks_summary
+get_stock_catalog = db.get_stock_catalog
+get_stock_date_ranges = db.get_stock_date_ranges 
\ No newline at end of file
@@ -0,0 +1,368 @@
+"""
+Download scheduler for historical candle backfills.
+
+Work is split into (symbol, window) units planned by the data provider, fetched
+concurrently by a bounded worker pool (the provider's broker enforces the shared
+API rate limit) and handed to a single writer thread through a bounded queue, so
+network time and database inserts overlap.
+"""
+
+import os
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import pytz
+
+from trading_calendar import covers, trading_days
+
+IST = pytz.timezone('Asia/Kolkata')
+
+# Number of concurrent fetch workers
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '4'))
+
+# Fetched chunks waiting for the writer before fetch workers block
+WRITE_QUEUE_SIZE = 16
+
+# Provider output columns mapped to the stocks table schema (OHLCV output only needs the datetime rename)
+PROVIDER_COLUMN_MAP = {
+    'datetime': 'timestamp',
+    'open_price': 'open',
+    'high_price': 'high',
+    'low_price': 'low',
+    'ltp': 'close',
+    'last_traded_qty': 'volume'
+}
+
+STOCK_COLUMNS = ['symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'resolution']
+
+# History fetched for a symbol that has no stored candles yet when syncing
+SYNC_DEFAULT_LOOKBACK_DAYS = int(os.getenv('SYNC_DEFAULT_LOOKBACK_DAYS', '365'))
+
+# Stored trading days a sync may re-fetch to join two missing windows into one request
+SYNC_COALESCE_GAP_DAYS = int(os.getenv('SYNC_COALESCE_GAP_DAYS', '2'))
+
+_STOP = object()
+
+
+def to_stock_frame(df: pd.DataFrame, symbol: str, resolution: str) -> pd.DataFrame:
+    """
+    Convert a provider DataFrame to the columns of the stocks table.
+
+    Args:
+        df: Structured DataFrame returned by a data provider
+        symbol: Stock symbol to tag the rows with
+        resolution: Resolution to tag the rows with
+
+    Returns:
+        pd.DataFrame: Frame with symbol, timestamp, OHLCV and resolution columns
+    """
+    frame = df.rename(columns=PROVIDER_COLUMN_MAP)
+    frame['symbol'] = symbol
+    frame['resolution'] = resolution
+    return frame[STOCK_COLUMNS]
+
+
+def _empty_symbol_result() -> Dict[str, Any]:
+    return {
+        'chunks': 0,
+        'chunks_done': 0,
+        'rows': 0,
+        'inserted': 0,
+        'updated': 0,
+        'skipped': 0,
+        'errors': []
+    }
+
+
+def missing_windows(stored_days: Iterable[date], start: date, end: date,
+                    refresh_days: Iterable[date] = ()) -> List[Tuple[str, str]]:
+    """
+    Find the contiguous runs of trading days in a range that have no stored candles.
+
+    In years the calendar does not cover, an unlisted holiday looks like a missing
+    day, so there only days extending the stored range count as missing; holes
+    inside it are not fetched again on every sync.
+
+    Args:
+        stored_days: Days that already have candles
+        start: First day to check
+        end: Last day to check
+        refresh_days: Days to fetch again even though they are stored (e.g. a partial last day)
+
+    Returns:
+        List[Tuple[str, str]]: (start_date, end_date) windows in YYYY-MM-DD format
+    """
+    stored = set(stored_days) - set(refresh_days)
+    first_stored, last_stored = (min(stored), max(stored)) if stored else (None, None)
+    windows = []
+    window_start = window_end = None
+    for day in trading_days(start, end):
+        if day in stored or (stored and first_stored < day < last_stored and not covers(day)):
+            if window_start is not None:
+                windows.append((window_start.isoformat(), window_end.isoformat()))
+                window_start = None
+            continue
+        if window_start is None:
+            window_start = day
+        window_end = day
+    if window_start is not None:
+        windows.append((window_start.isoformat(), window_end.isoformat()))
+    return windows
+
+
+class DownloadScheduler:
+    """Fan (symbol, window) downloads out over a worker pool and stream them into the database."""
+
+    def __init__(self, provider, db, max_workers: int = DOWNLOAD_WORKERS, on_conflict: str = 'update'):
+        """
+        Initialize the scheduler.
+
+        Args:
+            provider: DataProvider used to fetch candles
+            db: DBManager used to store them
+            max_workers: Number of concurrent fetch workers
+            on_conflict: Conflict mode passed to DBManager.bulk_upsert_stock_data
+        """
+        self.provider = provider
+        self.db = db
+        self.max_workers = max_workers
+        self.on_conflict = on_conflict
+
+    def plan(self, symbols: List[str], resolution: str, start_date: str, end_date: str) -> List[Dict[str, str]]:
+        """
+        Build the list of work units for a download.
+
+        Args:
+            symbols: Stock symbols to download
+            resolution: Time resolution
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+
+        Returns:
+            List[Dict[str, str]]: One unit per (symbol, window)
+        """
+        units = []
+        for symbol in symbols:
+            for chunk_start, chunk_end in self.provider.plan_windows(symbol, resolution, [(start_date, end_date)]):
+                units.append({'symbol': symbol, 'start_date': chunk_start, 'end_date': chunk_end})
+        return units
+
+    def plan_sync(self, symbols: List[str], resolution: str,
+                  start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Build work units that fetch only the candles missing from the database.
+
+        For every symbol this covers the missing days between start_date and
+        end_date: days before the first stored candle (when start_date is
+        earlier), holes inside the stored range and the tail from the last stored
+        day (re-fetched in case it was partial).
+
+        Args:
+            symbols: Stock symbols to sync
+            resolution: Time resolution
+            start_date: Optional start date in YYYY-MM-DD format; defaults to the first stored day
+            end_date: Optional end date in YYYY-MM-DD format; defaults to today
+
+        Returns:
+            List[Dict[str, str]]: One unit per (symbol, window)
+        """
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else datetime.now(IST).date()
+        requested_start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+
+        units = []
+        for symbol in symbols:
+            first, last = self.db.get_stock_date_range(symbol, resolution)
+            if first is None:
+                start = requested_start or end - timedelta(days=SYNC_DEFAULT_LOOKBACK_DAYS)
+                windows = [(start.isoformat(), end.isoformat())]
+            else:
+                start = requested_start or first.date()
+                stored_days = self.db.get_stock_trading_days(symbol, resolution, start, end)
+                windows = missing_windows(stored_days, start, end, refresh_days=[last.date()])
+
+            chunks = self.provider.plan_windows(symbol, resolution, windows, max_gap_days=SYNC_COALESCE_GAP_DAYS)
+            for chunk_start, chunk_end in chunks:
+                units.append({'symbol': symbol, 'start_date': chunk_start, 'end_date': chunk_end})
+        return units
+
+    def estimate(self, units: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Summarize planned work units without fetching anything (dry run).
+
+        Args:
+            units: Work units as returned by plan() or plan_sync()
+
+        Returns:
+            Dict[str, Any]: Request counts and windows per symbol, the total number
+            of API calls and the estimated time the rate limit needs for them
+        """
+        symbols = {}
+        for unit in units:
+            entry = symbols.setdefault(unit['symbol'], {'calls': 0, 'windows': []})
+            entry['calls'] += 1
+            entry['windows'].append([unit['start_date'], unit['end_date']])
+        return {
+            'calls': len(units),
+            'estimated_seconds': self.provider.estimate_seconds(len(units)),
+            'symbols': symbols
+        }
+
+    def sync(self, symbols: List[str], resolution: str,
+             start_date: Optional[str] = None, end_date: Optional[str] = None,
+             on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+             cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Fetch only the missing candles for several symbols.
+
+        Args:
+            symbols: Stock symbols to sync
+            resolution: Time resolution
+            start_date: Optional start date in YYYY-MM-DD format
+            end_date: Optional end date in YYYY-MM-DD format; defaults to today
+            on_progress: Optional callback receiving a dict after every stored chunk
+            cancel_event: Optional event that stops scheduling further chunks when set
+
+        Returns:
+            Dict[str, Any]: Per-symbol results and overall totals
+        """
+        units = self.plan_sync(symbols, resolution, start_date, end_date)
+        result = self.run_units(units, resolution, on_progress=on_progress, cancel_event=cancel_event)
+        # Symbols that were already up to date produce no units
+        for symbol in symbols:
+            result['symbols'].setdefault(symbol, _empty_symbol_result())
+        return result
+
+    def run(self, symbols: List[str], resolution: str, start_date: str, end_date: str,
+            on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+            cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Download and store candles for several symbols.
+
+        Args:
+            symbols: Stock symbols to download
+            resolution: Time resolution
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+            on_progress: Optional callback receiving a dict after every stored chunk
+            cancel_event: Optional event that stops scheduling further chunks when set
+
+        Returns:
+            Dict[str, Any]: Per-symbol results and overall totals
+        """
+        units = self.plan(symbols, resolution, start_date, end_date)
+        return self.run_units(units, resolution, on_progress=on_progress, cancel_event=cancel_event)
+
+    def run_units(self, units: List[Dict[str, str]], resolution: str,
+                  on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                  cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Fetch and store a prepared list of (symbol, window) units.
+
+        Args:
+            units: Work units as returned by plan() or plan_sync()
+            resolution: Time resolution
+            on_progress: Optional callback receiving a dict after every stored chunk
+            cancel_event: Optional event that stops scheduling further chunks when set
+
+        Returns:
+            Dict[str, Any]: Per-symbol results and overall totals
+        """
+        cancel_event = cancel_event or threading.Event()
+        results = {}
+        for unit in units:
+            results.setdefault(unit['symbol'], _empty_symbol_result())['chunks'] += 1
+
+        write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        lock = threading.Lock()
+
+        def report(unit):
+            if on_progress is None:
+                return
+            symbol_result = results[unit['symbol']]
+            progress = {
+                'symbol': unit['symbol'],
+                'start_date': unit['start_date'],
+                'end_date': unit['end_date'],
+                'symbol_chunks_done': symbol_result['chunks_done'],
+                'symbol_chunks': symbol_result['chunks'],
+                'symbol_complete': symbol_result['chunks_done'] == symbol_result['chunks'],
+                'chunks_done': sum(r['chunks_done'] for r in results.values()),
+                'chunks': len(units)
+            }
+            try:
+                on_progress(progress)
+            except Exception as e:
+                # A failing progress listener must not take the writer down with it
+                print(f"Error reporting download progress: {str(e)}")
+
+        def finish(unit, error=None, stats=None, rows=0):
+            with lock:
+                symbol_result = results[unit['symbol']]
+                symbol_result['chunks_done'] += 1
+                symbol_result['rows'] += rows
+                if stats:
+                    for key in ('inserted', 'updated', 'skipped'):
+                        symbol_result[key] += stats[key]
+                if error:
+                    symbol_result['errors'].append(error)
+                report(unit)
+
+        def fetch(unit):
+            if cancel_event.is_set():
+                return
+            try:
+                df = self.provider.get_historical_data(
+                    unit['symbol'], resolution, unit['start_date'], unit['end_date']
+                )
+                # A frame with unexpected columns or dtypes fails this chunk, not the whole job
+                frame = None if df is None or df.empty else to_stock_frame(df, unit['symbol'], resolution)
+            except Exception as e:
+                finish(unit, error=f"{unit['start_date']}..{unit['end_date']}: {str(e)}")
+                return
+            if frame is None:
+                finish(unit)
+                return
+            write_queue.put((unit, frame))
+
+        def write():
+            while True:
+                item = write_queue.get()
+                if item is _STOP:
+                    return
+                unit, frame = item
+                # Keep draining whatever happens, or fetchers block on the full queue
+                try:
+                    stats = self.db.bulk_upsert_stock_data(frame, on_conflict=self.on_conflict)
+                    if stats is None:
+                        finish(unit, error=f"{unit['start_date']}..{unit['end_date']}: failed to save data", rows=len(frame))
+                    else:
+                        finish(unit, stats=stats, rows=len(frame))
+                except Exception as e:
+                    traceback.print_exc()
+                    finish(unit, error=f"{unit['start_date']}..{unit['end_date']}: {str(e)}", rows=len(frame))
+
+        writer = threading.Thread(target=write, name='download-writer', daemon=True)
+        writer.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='download') as executor:
+                futures = [executor.submit(fetch, unit) for unit in units]
+                for future in futures:
+                    future.result()
+        finally:
+            write_queue.put(_STOP)
+            writer.join()
+
+        totals = {'inserted': 0, 'updated': 0, 'skipped': 0, 'rows': 0}
+        for symbol_result in results.values():
+            for key in totals:
+                totals[key] += symbol_result[key]
+        return {
+            'symbols': results,
+            'totals': totals,
+            'cancelled': cancel_event.is_set()
+        }
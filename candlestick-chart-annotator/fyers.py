@@ -12,9 +12,21 @@ import logging
 from fyers_apiv3 import fyersModel
 from fyers_apiv3.FyersWebsocket import data_ws
 
+from rate_limiter import RateLimiter
+from trading_calendar import trading_days
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.WARNING)
 
+# Documented Fyers API v3 limits as (requests, seconds)
+FYERS_RATE_LIMITS = ((10, 1), (200, 60))
+
+# Resolutions whose request span is capped in trading days rather than calendar days
+SECOND_RESOLUTIONS = ("5S", "10S", "15S", "30S", "45S")
+
+# Shared by every FyersBroker in the process so parallel downloads respect one quota
+history_rate_limiter = RateLimiter(FYERS_RATE_LIMITS)
+
 from dotenv import load_dotenv
 load_dotenv() 
 
@@ -161,7 +173,9 @@ class FyersBroker():
             is_async=False,
             log_path=os.getcwd()
         )
+        self._context_lock = threading.Lock()
         self._init_context()
+        self.rate_limiter = history_rate_limiter
         
         # WebSocket parameters
         self.symbols = symbols or ['NSE:SBIN-EQ', 'NSE:ADANIENT-EQ']
@@ -253,15 +267,161 @@ class FyersBroker():
             json.dump(self.context, f)
 
     def update_context(self):
-        self.context['TOTAL_API_CALLS'] += 1
-        self.context['DATE'] = str(datetime.now().date())
-        with open("FyersModel.json", "w") as f:
-            json.dump(self.context, f)
+        with self._context_lock:
+            self.context['TOTAL_API_CALLS'] += 1
+            self.context['DATE'] = str(datetime.now().date())
+            with open("FyersModel.json", "w") as f:
+                json.dump(self.context, f)
 
     def get_access_token(self):
         return self.access_token
 
     # REST-based data retrieval methods
+    @staticmethod
+    def format_symbol(symbol: str) -> str:
+        """Return the exchange-qualified symbol expected by the API."""
+        return f"NSE:{symbol}-EQ" if not symbol.startswith('NSE') else symbol
+
+    @staticmethod
+    def history_request_span(resolution: str):
+        """
+        Maximum span of a single history request for a resolution.
+        
+        Args:
+            resolution (str): Timeframe resolution (e.g., "1", "5", "D", "1D", "5S")
+        
+        Returns:
+            tuple: (max_days, counts_trading_days) where counts_trading_days tells
+            whether the cap applies to trading days instead of calendar days
+        """
+        if resolution in ["D", "1D"]:
+            # For daily resolution: up to 366 days per request
+            return 366, False
+        if resolution in SECOND_RESOLUTIONS:
+            # For seconds resolution: up to 30 trading days
+            return 30, True
+        # For minute resolutions: up to 100 days per request
+        return 100, False
+
+    @staticmethod
+    def plan_history_chunks(resolution: str, start_date: str, end_date: str):
+        """
+        Split a date range into windows that fit a single history request.
+        
+        Args:
+            resolution (str): Timeframe resolution (e.g., "1", "5", "D", "1D", "5S")
+            start_date (str): Start date in format YYYY-MM-DD
+            end_date (str): End date in format YYYY-MM-DD
+        
+        Returns:
+            list: (chunk_start, chunk_end) date strings in YYYY-MM-DD format
+        """
+        return FyersBroker.plan_history_windows(resolution, [(start_date, end_date)])
+
+    @staticmethod
+    def plan_history_windows(resolution: str, windows, max_gap_days: int = 0):
+        """
+        Plan the history requests covering several date windows.
+        
+        Trading days of all windows are merged, so overlapping windows and windows
+        separated only by weekends or holidays share requests, and spans without
+        trading days are skipped. Every chunk starts and ends on a trading day and
+        fits the per-request cap of the resolution.
+        
+        Args:
+            resolution (str): Timeframe resolution (e.g., "1", "5", "D", "1D", "5S")
+            windows (list): (start_date, end_date) pairs in format YYYY-MM-DD
+            max_gap_days (int): Join windows separated by up to this many unrequested
+                trading days, re-fetching the gap to save a request
+        
+        Returns:
+            list: (chunk_start, chunk_end) date strings in format YYYY-MM-DD
+        """
+        max_days, counts_trading_days = FyersBroker.history_request_span(resolution)
+        
+        requested = set()
+        for window_start, window_end in windows:
+            requested.update(trading_days(
+                datetime.strptime(window_start, "%Y-%m-%d").date(),
+                datetime.strptime(window_end, "%Y-%m-%d").date()
+            ))
+        
+        chunks = []
+        chunk_start = chunk_end = None
+        chunk_days = 0
+        for day in sorted(requested):
+            if chunk_start is not None:
+                gap = len(trading_days(chunk_end + timedelta(days=1), day - timedelta(days=1)))
+                if counts_trading_days:
+                    fits = chunk_days + gap + 1 <= max_days
+                else:
+                    fits = (day - chunk_start).days < max_days
+                if gap <= max_gap_days and fits:
+                    chunk_end = day
+                    chunk_days += gap + 1
+                    continue
+                chunks.append((chunk_start.strftime("%Y-%m-%d"), chunk_end.strftime("%Y-%m-%d")))
+            chunk_start = chunk_end = day
+            chunk_days = 1
+        if chunk_start is not None:
+            chunks.append((chunk_start.strftime("%Y-%m-%d"), chunk_end.strftime("%Y-%m-%d")))
+        return chunks
+
+    @staticmethod
+    def estimate_history_time(calls: int):
+        """
+        Estimate how long a number of history requests takes under the shared rate limit.
+        
+        Args:
+            calls (int): Number of history requests
+        
+        Returns:
+            float: Seconds spent waiting on the rate limiter, assuming an idle quota
+        """
+        return history_rate_limiter.estimate_seconds(calls)
+
+    def get_history_chunk(self, symbol: str, resolution: str, chunk_start: str, chunk_end: str):
+        """
+        Fetch a single history window, waiting on the shared rate limiter first.
+        
+        Args:
+            symbol (str): Trading symbol (e.g., "SBIN" or "NSE:SBIN-EQ")
+            resolution (str): Timeframe resolution
+            chunk_start (str): Window start date in format YYYY-MM-DD
+            chunk_end (str): Window end date in format YYYY-MM-DD
+        
+        Returns:
+            list: Candles returned for the window (possibly empty)
+        
+        Raises:
+            RuntimeError: If the API answers with an error (rate limit, expired token, bad symbol)
+        """
+        formatted_symbol = self.format_symbol(symbol)
+        logger.info(f"Fetching {formatted_symbol} data from {chunk_start} to {chunk_end} with resolution {resolution}")
+        
+        # Prepare request parameters
+        data_headers = {
+            "symbol": formatted_symbol,
+            "resolution": resolution,
+            "date_format": "1",
+            "range_from": chunk_start,
+            "range_to": chunk_end,
+            "cont_flag": "1"
+        }
+        self.rate_limiter.acquire()
+        chunk_data = self.fyers_model.history(data_headers)
+        self.update_context()
+        
+        # An error must not look like a window without candles, or callers would cache it as empty
+        if not isinstance(chunk_data, dict) or chunk_data.get('s') not in ('ok', 'no_data'):
+            message = chunk_data.get('message', chunk_data) if isinstance(chunk_data, dict) else chunk_data
+            raise RuntimeError(f"History request for {formatted_symbol} {chunk_start}..{chunk_end} failed: {message}")
+        
+        # Check if we got valid data
+        if 'candles' in chunk_data and len(chunk_data['candles']) > 0:
+            return chunk_data['candles']
+        return []
+
     def get_history(self, symbol: str, resolution: str, start_date: str, end_date: str):
         """
         Retrieve historical data via REST, handling API limitations by breaking requests into
@@ -275,64 +435,13 @@ class FyersBroker():
         
         Returns:
             dict: Combined historical data response with all candles
-        """
-        # Format symbol if needed
-        formatted_symbol = f"NSE:{symbol}-EQ" if not symbol.startswith('NSE') else symbol
         
-        # Convert string dates to datetime objects
-        start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-        end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-        
-        # Determine chunk size based on resolution
-        if resolution in ["D", "1D"]:
-            # For daily resolution: up to 366 days per request
-            max_days = 366
-        elif resolution in ["5S", "10S", "15S", "30S", "45S"]:
-            # For seconds resolution: up to 30 trading days
-            max_days = 30
-        else:
-            # For minute resolutions: up to 100 days per request
-            max_days = 100
-        
-        # Initialize result container
+        Raises:
+            RuntimeError: If the API answers any chunk with an error
+        """
         all_candles = []
-        
-        # Break the date range into chunks
-        current_start = start_dt
-        while current_start <= end_dt:
-            # Calculate end date for this chunk
-            current_end = min(current_start + timedelta(days=max_days-1), end_dt)
-            
-            # Format dates for API request
-            chunk_start = current_start.strftime("%Y-%m-%d")
-            chunk_end = current_end.strftime("%Y-%m-%d")
-            
-            logger.info(f"Fetching {formatted_symbol} data from {chunk_start} to {chunk_end} with resolution {resolution}")
-            
-            # Prepare request parameters
-            data_headers = {
-                "symbol": formatted_symbol,
-                "resolution": resolution,
-                "date_format": "1",
-                "range_from": chunk_start,
-                "range_to": chunk_end,
-                "cont_flag": "1"
-            }
-            # Make the API call
-            chunk_data = self.fyers_model.history(data_headers)
-            self.update_context()
-            
-            # Check if we got valid data
-            if 'candles' in chunk_data and len(chunk_data['candles']) > 0:
-                all_candles.extend(chunk_data['candles'])
-            else:
-                # logger.warning(f"No data returned for {formatted_symbol} from {chunk_start} to {chunk_end}")
-                pass
-            # Add a small delay to avoid rate limiting
-            time.sleep(0.5)
-            
-            # Move to next chunk
-            current_start = current_end + timedelta(days=1)
+        for chunk_start, chunk_end in self.plan_history_chunks(resolution, start_date, end_date):
+            all_candles.extend(self.get_history_chunk(symbol, resolution, chunk_start, chunk_end))
         
         # Return combined result
         if not all_candles:
@@ -0,0 +1,176 @@
+"""
+Background job subsystem.
+
+Long-running work such as historical downloads is submitted to a JobManager,
+which runs it on a background executor and reports status and progress through
+an event callback (the app forwards these over Socket.IO). HTTP handlers only
+submit jobs and return their id.
+"""
+
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class Job:
+    """A unit of background work with its status, progress and result."""
+
+    def __init__(self, kind: str, params: Dict[str, Any]):
+        """
+        Initialize a job.
+
+        Args:
+            kind: Job type (e.g., 'download')
+            params: Parameters the job was submitted with
+        """
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON-serializable view of the job."""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class JobManager:
+    """Run jobs on a background executor and keep a bounded history of them."""
+
+    def __init__(self, max_workers: int = 2, max_history: int = 100,
+                 on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        """
+        Initialize the job manager.
+
+        Args:
+            max_workers: Number of jobs allowed to run at the same time
+            max_history: Number of finished jobs kept for inspection
+            on_event: Optional callback receiving (event_name, payload) for status and progress changes
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.max_history = max_history
+        self.on_event = on_event
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _emit(self, event: str, payload: Dict[str, Any]) -> None:
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(event, payload)
+        except Exception as e:
+            print(f"Error emitting job event {event}: {e}")
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job_id]
+
+    def submit(self, kind: str, params: Dict[str, Any], target: Callable[['Job'], Any]) -> Job:
+        """
+        Queue a job for background execution.
+
+        Args:
+            kind: Job type
+            params: Parameters to record on the job
+            target: Callable run with the job; its return value becomes the job result
+
+        Returns:
+            Job: The queued job
+        """
+        job = Job(kind, params)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.future = self.executor.submit(self._run, job, target)
+        self._emit('job_updated', job.to_dict())
+        return job
+
+    def _run(self, job: Job, target: Callable[['Job'], Any]) -> None:
+        if job.cancel_event.is_set():
+            # Cancelled while being picked up, too late for future.cancel()
+            job.status = CANCELLED
+            job.finished_at = datetime.now()
+            self._emit('job_updated', job.to_dict())
+            return
+        job.status = RUNNING
+        job.started_at = datetime.now()
+        self._emit('job_updated', job.to_dict())
+        try:
+            job.result = target(job)
+            job.status = CANCELLED if job.cancel_event.is_set() else COMPLETED
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = FAILED
+        job.finished_at = datetime.now()
+        self._emit('job_updated', job.to_dict())
+
+    def update_progress(self, job: Job, progress: Dict[str, Any]) -> None:
+        """Record progress for a running job and broadcast it."""
+        job.progress = progress
+        self._emit('job_progress', {'id': job.id, 'kind': job.kind, 'progress': progress})
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Get a job by id."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        """List known jobs, newest first."""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Request cancellation of a job.
+
+        Queued jobs are dropped immediately; running jobs stop at their next
+        cancellation check.
+
+        Args:
+            job_id: Id of the job to cancel
+
+        Returns:
+            Optional[Job]: The job, or None if it is unknown
+        """
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.status = CANCELLED
+            job.finished_at = datetime.now()
+            self._emit('job_updated', job.to_dict())
+        return job
@@ -0,0 +1,120 @@
+"""
+Load test for the chart and annotation endpoints.
+
+Each simulated annotator opens the page through /api/bootstrap and then steps
+through consecutive trading days of one stock, loading each day's candles and
+annotations, with occasional date catalog and range chart requests. With
+--annotate, some steps also add an annotation and delete it again. Requests/sec
+and latency percentiles are reported per endpoint.
+
+    python loadtest.py --url http://localhost:8050 --users 32 --duration 30
+"""
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+
+class Recorder:
+    """Collects request durations and errors per endpoint."""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def request(self, name, url, method='GET', body=None):
+        """Send one request and record it under name; returns the decoded JSON body or None"""
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers, method=method)) as response:
+                payload = response.read()
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.durations[name].append(elapsed)
+            return json.loads(payload) if payload[:1] == b'{' else None
+        except (urllib.error.URLError, OSError, ValueError):
+            with self._lock:
+                self.errors[name] += 1
+            return None
+
+
+def annotator(base_url, recorder, deadline, annotate, seed):
+    """One simulated annotator stepping through the days of a stock"""
+    rng = random.Random(seed)
+    boot = recorder.request('bootstrap', f'{base_url}/api/bootstrap')
+    if not boot or not boot.get('stocks'):
+        return
+    stock = rng.choice(boot['stocks'])
+    catalog = recorder.request('dates', f'{base_url}/api/stock/{stock}/dates')
+    dates = (catalog or {}).get('dates') or []
+    if not dates:
+        return
+    position = rng.randrange(len(dates))
+
+    while time.monotonic() < deadline:
+        date = dates[position]
+        recorder.request('day candles', f'{base_url}/api/stock/{stock}/date/{date}')
+        recorder.request('annotations', f'{base_url}/api/annotations?' + urlencode({'stock': stock, 'date': date}))
+
+        roll = rng.random()
+        if roll < 0.05:
+            recorder.request('dates', f'{base_url}/api/stock/{stock}/dates')
+        elif roll < 0.10:
+            start = dates[max(0, position - 20)]
+            recorder.request('range candles', f'{base_url}/api/stock/{stock}/candles?' + urlencode({'start': start, 'end': date}))
+        if annotate and roll > 0.8:
+            saved = recorder.request('add annotation', f'{base_url}/api/annotations', method='POST', body={
+                'timestamp': f'{date}T10:00:00',
+                'stock': stock,
+                'signal': 'long_entry',
+                'reason': 'loadtest'
+            })
+            if saved and saved.get('id') is not None:
+                recorder.request('delete annotation', f"{base_url}/api/annotations/{saved['id']}", method='DELETE')
+
+        # Mostly forward, like an annotator working through the days in order
+        step = 1 if rng.random() < 0.9 else -1
+        position = min(max(position + step, 0), len(dates) - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the chart and annotation endpoints.')
+    parser.add_argument('--url', default='http://localhost:8050', help='Base URL of the server')
+    parser.add_argument('--users', type=int, default=16, help='Concurrent simulated annotators')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--annotate', action='store_true', help='Also add and delete annotations')
+    args = parser.parse_args()
+
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + args.duration
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        for user in range(args.users):
+            executor.submit(annotator, args.url.rstrip('/'), recorder, deadline, args.annotate, user)
+    elapsed = time.monotonic() - started
+
+    total = sum(len(durations) for durations in recorder.durations.values())
+    print(f"{args.users} users, {elapsed:.1f} s, {total} requests, {total / elapsed:.1f} req/s")
+    for name in sorted(set(recorder.durations) | set(recorder.errors)):
+        durations = sorted(recorder.durations[name])
+        if durations:
+            p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+            print(f"  {name:<18} {len(durations) / elapsed:8.1f} req/s   median {statistics.median(durations):8.1f} ms"
+                  f"   p95 {p95:8.1f} ms   errors {recorder.errors[name]}")
+        else:
+            print(f"  {name:<18} errors {recorder.errors[name]}")
+
+
+if __name__ == '__main__':
+    main()
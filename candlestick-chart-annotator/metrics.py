@@ -0,0 +1,251 @@
+"""
+Request and database metrics.
+
+Records per-endpoint latency histograms, status codes and response sizes,
+database query counts, durations and row counts (through SQLAlchemy cursor
+events, attributed to the endpoint or socket event that issued them) and chart
+cache lookups, and renders them in the Prometheus text exposition format.
+Queries slower than a threshold are written to the slow-query log.
+
+Metrics are kept per process; with several server workers, scrape each one.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+# Histogram buckets: seconds, bytes and queries per request
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+
+# Label of work that does not run inside a request or socket event (e.g. prefetch)
+BACKGROUND = 'background'
+
+# Statement kinds kept as labels; anything else is reported as OTHER
+STATEMENT_KINDS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'CREATE', 'ALTER', 'DROP', 'COPY')
+
+DESCRIPTIONS = {
+    'http_requests_total': ('counter', 'HTTP requests by endpoint, method and status'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint'),
+    'http_response_bytes': ('histogram', 'HTTP response body size by endpoint'),
+    'http_request_db_queries': ('histogram', 'Database queries issued per HTTP request or socket event'),
+    'socket_event_duration_seconds': ('histogram', 'Socket.IO event handler latency by event'),
+    'db_queries_total': ('counter', 'Database queries by endpoint and statement kind'),
+    'db_query_duration_seconds': ('histogram', 'Database query latency by endpoint and statement kind'),
+    'db_rows_total': ('counter', 'Rows returned or affected, where the driver reports them'),
+    'db_query_errors_total': ('counter', 'Database queries that raised, by endpoint'),
+    'db_slow_queries_total': ('counter', 'Database queries slower than the slow-query threshold'),
+    'cache_lookups_total': ('counter', 'Chart cache lookups by key kind and the tier that answered (miss = computed)'),
+    'cache_memory_bytes': ('gauge', 'Bytes held by the in-process chart cache tier'),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+slow_query_logger = logging.getLogger('slow_queries')
+
+
+def configure_slow_query_log(path: Optional[str] = None) -> None:
+    """
+    Send the slow-query log to a file, or to stderr when no path is given.
+
+    Args:
+        path: Log file path
+    """
+    handler = logging.FileHandler(path) if path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_query_logger.addHandler(handler)
+    slow_query_logger.setLevel(logging.WARNING)
+    slow_query_logger.propagate = False
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _statement_kind(statement: str) -> str:
+    words = statement.lstrip(' \n\t(').split(None, 1)
+    kind = words[0].upper() if words else ''
+    return kind if kind in STATEMENT_KINDS else 'OTHER'
+
+
+class Histogram:
+    """Bucketed observations with their count and sum."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and histograms with Flask and SQLAlchemy hooks."""
+
+    def __init__(self, slow_query_seconds: float = 0.2):
+        """
+        Args:
+            slow_query_seconds: Queries taking longer are counted and logged as slow
+        """
+        self.slow_query_seconds = slow_query_seconds
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self._gauges: Dict[str, Dict[Labels, float]] = defaultdict(dict)
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = defaultdict(dict)
+        self._lock = threading.Lock()
+        # Endpoint and query count of the request or socket event running in this thread/greenlet
+        self._local = threading.local()
+
+    def inc(self, name: str, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name][labels] += amount
+
+    def set_gauge(self, name: str, value: float, labels: Labels = ()) -> None:
+        with self._lock:
+            self._gauges[name][labels] = value
+
+    def observe(self, name: str, value: float, labels: Labels = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        with self._lock:
+            histogram = self._histograms[name].get(labels)
+            if histogram is None:
+                histogram = self._histograms[name][labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    @property
+    def current_endpoint(self) -> str:
+        return getattr(self._local, 'endpoint', None) or BACKGROUND
+
+    def _begin(self, endpoint: str) -> None:
+        self._local.endpoint = endpoint
+        self._local.queries = 0
+        self._local.started = time.perf_counter()
+
+    def _end(self) -> Tuple[float, int]:
+        elapsed = time.perf_counter() - self._local.started
+        queries = self._local.queries
+        self._local.endpoint = None
+        return elapsed, queries
+
+    @contextmanager
+    def track(self, event_name: str):
+        """Attribute the queries of a Socket.IO handler to its event and time it."""
+        self._begin(f'socket:{event_name}')
+        try:
+            yield
+        finally:
+            elapsed, queries = self._end()
+            labels = (('event', event_name),)
+            self.observe('socket_event_duration_seconds', elapsed, labels)
+            self.observe('http_request_db_queries', queries, (('endpoint', f'socket:{event_name}'),), COUNT_BUCKETS)
+
+    def init_app(self, app) -> None:
+        """Time every request of a Flask app and record its status and response size."""
+        from flask import request
+
+        @app.before_request
+        def start_request_timer():
+            # The URL rule keeps label cardinality bounded (one series per route, not per symbol)
+            self._begin(request.url_rule.rule if request.url_rule else 'unmatched')
+
+        @app.after_request
+        def record_request(response):
+            if getattr(self._local, 'endpoint', None) is None:
+                return response
+            endpoint = self._local.endpoint
+            elapsed, queries = self._end()
+            self.observe('http_request_duration_seconds', elapsed,
+                         (('endpoint', endpoint), ('method', request.method)))
+            self.inc('http_requests_total',
+                     (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))))
+            self.observe('http_request_db_queries', queries, (('endpoint', endpoint),), COUNT_BUCKETS)
+            # Streamed responses have no length up front
+            if response.content_length is not None:
+                self.observe('http_response_bytes', response.content_length, (('endpoint', endpoint),), SIZE_BUCKETS)
+            return response
+
+        @app.teardown_request
+        def clear_request(exc):
+            self._local.endpoint = None
+
+    def instrument_engine(self, engine) -> None:
+        """Count and time every query an SQLAlchemy engine runs."""
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def record_query(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+            endpoint = self.current_endpoint
+            labels = (('endpoint', endpoint), ('statement', _statement_kind(statement)))
+            self.inc('db_queries_total', labels)
+            self.observe('db_query_duration_seconds', elapsed, labels)
+            rows = getattr(cursor, 'rowcount', -1)
+            if rows is not None and rows >= 0:
+                self.inc('db_rows_total', labels, rows)
+            if getattr(self._local, 'endpoint', None) is not None:
+                self._local.queries += 1
+            if elapsed >= self.slow_query_seconds:
+                self.inc('db_slow_queries_total', labels)
+                slow_query_logger.warning('%.1f ms endpoint=%s rows=%s %s', elapsed * 1000, endpoint, rows,
+                                          ' '.join(statement.split())[:2000])
+
+        @event.listens_for(engine, 'handle_error')
+        def discard_query_timer(context):
+            # A failed query never reaches after_cursor_execute; drop its start time so the list cannot grow
+            starts = context.connection.info.get('metrics_query_start') if context.connection is not None else None
+            if starts and context.cursor is not None:
+                starts.pop()
+                self.inc('db_query_errors_total', (('endpoint', self.current_endpoint),))
+
+    def record_cache_lookup(self, key: str, outcome: str) -> None:
+        """Count a chart cache lookup; outcome is the tier that answered ('memory', 'shared') or 'miss'."""
+        self.inc('cache_lookups_total', (('kind', key.split(':', 1)[0]), ('outcome', outcome)))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (kind, description) in DESCRIPTIONS.items():
+                series = self._histograms.get(name) if kind == 'histogram' else (
+                    self._gauges.get(name) if kind == 'gauge' else self._counters.get(name))
+                if not series:
+                    continue
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in sorted(series.items()):
+                    if kind != 'histogram':
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets, value.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(labels, [("le", f"{bound:g}")])} {cumulative}')
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {value.count}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value.sum)}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {value.count}')
+        return '\n'.join(lines) + '\n'
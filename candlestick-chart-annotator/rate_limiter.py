@@ -0,0 +1,82 @@
+"""
+Rate limiting helpers for broker API clients.
+
+A RateLimiter combines several token buckets (for example a per-second and a
+per-minute quota) and blocks callers until every bucket has a token to spend.
+One limiter instance is meant to be shared by all threads talking to the same API.
+"""
+
+import threading
+import time
+from typing import Iterable, Tuple
+
+
+class TokenBucket:
+    """A single token bucket refilled continuously at capacity/period tokens per second."""
+
+    def __init__(self, capacity: int, period: float):
+        """
+        Initialize the bucket.
+
+        Args:
+            capacity: Maximum number of requests allowed per period
+            period: Length of the period in seconds
+        """
+        self.capacity = float(capacity)
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Add the tokens accrued since the last refill."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until one token is available."""
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Thread-safe limiter enforcing several (requests, seconds) quotas at once."""
+
+    def __init__(self, limits: Iterable[Tuple[int, float]]):
+        """
+        Initialize the limiter.
+
+        Args:
+            limits: Iterable of (max_requests, period_seconds) pairs
+        """
+        self.buckets = [TokenBucket(capacity, period) for capacity, period in limits]
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request may be issued and consume one token from every bucket."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                for bucket in self.buckets:
+                    bucket.refill(now)
+                wait = max((bucket.wait_time() for bucket in self.buckets), default=0.0)
+                if wait <= 0:
+                    for bucket in self.buckets:
+                        bucket.tokens -= 1
+                    return
+            time.sleep(wait)
+
+    def estimate_seconds(self, requests: int) -> float:
+        """
+        Estimate how long issuing a number of requests takes, starting from full buckets.
+
+        Args:
+            requests: Number of requests to issue
+
+        Returns:
+            float: Seconds spent waiting for tokens
+        """
+        return max(
+            (max(0.0, (requests - bucket.capacity) / bucket.rate) for bucket in self.buckets),
+            default=0.0
+        )
@@ -0,0 +1,118 @@
+"""
+Bucket selection and downsampling for zoomed-out chart views.
+
+Stored bars are re-aggregated in SQL into session-aligned buckets (see
+DBManager.get_stock_buckets). This module picks the bucket size for a range and
+point budget, and implements Largest-Triangle-Three-Buckets (LTTB) downsampling
+for line overlays.
+"""
+
+import math
+from datetime import date
+from typing import Optional, Tuple
+
+import numpy as np
+
+from trading_calendar import trading_days
+
+# Bucket labels and their size in minutes (None for one bucket per day), finest first
+BUCKETS = [('1', 1), ('5', 5), ('15', 15), ('60', 60), ('1D', None)]
+
+# Minutes in an NSE cash session (09:15-15:30 IST)
+SESSION_MINUTES = 375
+
+DEFAULT_MAX_POINTS = 2000
+MAX_POINTS_LIMIT = 20000
+
+
+def resolution_minutes(resolution: Optional[str]) -> Optional[int]:
+    """
+    Size of a stored resolution in minutes.
+
+    Args:
+        resolution: Stored resolution (e.g. '1', '5', '1D', '5S')
+
+    Returns:
+        Optional[int]: Minutes per bar, 0 for sub-minute bars, None for daily bars
+    """
+    if resolution in ('D', '1D'):
+        return None
+    if resolution and resolution.endswith('S'):
+        return 0
+    return int(resolution) if resolution and resolution.isdigit() else 1
+
+
+def bucket_minutes(label: str) -> Optional[int]:
+    """Minutes of a bucket label, raising ValueError for unknown labels."""
+    for name, minutes in BUCKETS:
+        if name == label:
+            return minutes
+    raise ValueError(f"Unknown bucket: {label}")
+
+
+def choose_bucket(start: date, end: date, max_points: int, resolution: Optional[str] = '1') -> Tuple[str, Optional[int]]:
+    """
+    Pick the finest bucket that keeps a range within a point budget.
+
+    Args:
+        start: First day of the range
+        end: Last day of the range
+        max_points: Maximum number of candles to return
+        resolution: Stored resolution; buckets finer than it are skipped
+
+    Returns:
+        Tuple[str, Optional[int]]: Bucket label and size in minutes (None for daily)
+    """
+    base = resolution_minutes(resolution)
+    if base is None:
+        return '1D', None
+    days = max(1, len(trading_days(start, end)))
+    for label, minutes in BUCKETS:
+        if minutes is None:
+            return label, None
+        if minutes < base:
+            continue
+        if days * math.ceil(SESSION_MINUTES / minutes) <= max_points:
+            return label, minutes
+    return '1D', None
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Args:
+        x: Monotonic x values (e.g. epoch ms)
+        y: Values to preserve the visual shape of
+        threshold: Number of points to keep
+
+    Returns:
+        np.ndarray: Indices of the kept points, in order
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        # Average point of the next bucket is the third triangle vertex
+        next_start = int(math.floor((i + 1) * every)) + 1
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
@@ -0,0 +1,210 @@
+"""
+Two-tier cache for chart endpoint data.
+
+Values are kept in an in-process LRU bounded by a byte budget in front of a
+shared tier (any flask_caching backend, e.g. the filesystem cache shared by all
+workers). Entries are never invalidated in place: each key embeds the versions
+of the scopes it depends on (e.g. a symbol or one of its days), and writers bump
+those versions so later lookups miss and recompute. Versions live in the shared
+tier so every worker sees a bump; a version that has been evicted is replaced
+with a fresh one rather than reset, so old entries can never be served again.
+A Prefetcher fills the cache in the background ahead of expected requests.
+"""
+
+import pickle
+import traceback
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# Default byte budget of the in-process tier
+DEFAULT_MEMORY_BYTES = 256 * 1024 * 1024
+
+VERSION_PREFIX = 'version:'
+
+
+def _sizeof(value: Any) -> int:
+    """Approximate in-memory size of a cached value."""
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class MemoryLRU:
+    """Thread-safe LRU mapping bounded by the approximate size of its values."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self._entries: 'OrderedDict[str, Tuple[Any, int, Optional[float]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Look up a key, refreshing its recency.
+
+        Returns:
+            Tuple[bool, Any]: Whether the key was found and its value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.used_bytes -= size
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, timeout: int = 0) -> None:
+        """
+        Store a value, evicting least recently used entries beyond the budget.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            timeout: Seconds to keep the value, 0 for no expiry
+        """
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.used_bytes -= previous[1]
+            self._entries[key] = (value, size, expires_at)
+            self.used_bytes += size
+            while self.used_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.used_bytes -= evicted_size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.used_bytes = 0
+
+
+class TieredCache:
+    """In-process LRU in front of a shared flask_caching cache, with versioned scopes."""
+
+    def __init__(self, shared, memory_bytes: int = DEFAULT_MEMORY_BYTES,
+                 on_lookup: Optional[Callable[[str, str], None]] = None):
+        """
+        Args:
+            shared: flask_caching Cache used as the shared tier
+            memory_bytes: Byte budget of the in-process tier
+            on_lookup: Called with the key and 'memory', 'shared' or 'miss' after each lookup
+        """
+        self.shared = shared
+        self.memory = MemoryLRU(memory_bytes)
+        self.on_lookup = on_lookup
+
+    def versions(self, scopes: Iterable[str]) -> Dict[str, str]:
+        """
+        Current version of each scope.
+
+        Args:
+            scopes: Scope names (e.g. 'symbol:INFY')
+
+        Returns:
+            Dict[str, str]: Version token per scope
+        """
+        scopes = list(scopes)
+        keys = [VERSION_PREFIX + scope for scope in scopes]
+        values = self.shared.get_many(*keys) if keys else []
+        versions = {}
+        for scope, key, value in zip(scopes, keys, values):
+            if value is None:
+                # Missing (never bumped or evicted): start a namespace no entry uses yet
+                self.shared.add(key, uuid.uuid4().hex, timeout=0)
+                value = self.shared.get(key)
+            versions[scope] = value
+        return versions
+
+    def bump(self, *scopes: str) -> None:
+        """Invalidate every entry depending on the given scopes."""
+        if scopes:
+            self.shared.set_many({VERSION_PREFIX + scope: uuid.uuid4().hex for scope in scopes}, timeout=0)
+
+    def _record_lookup(self, key: str, outcome: str) -> None:
+        if self.on_lookup is not None:
+            self.on_lookup(key, outcome)
+
+    def get_or_compute(self, key: str, scopes: Iterable[str], compute: Callable[[], Any], timeout: int = 0) -> Any:
+        """
+        Return the cached value for key under the current scope versions, computing it on a miss.
+
+        Args:
+            key: Cache key, without versions
+            scopes: Scopes whose bumps invalidate the value
+            compute: Produces the value on a miss
+            timeout: Seconds to keep the value, 0 for no expiry
+
+        Returns:
+            Any: The cached or freshly computed value
+        """
+        versions = self.versions(scopes)
+        versioned_key = key + ''.join(f'|{versions[scope]}' for scope in sorted(versions))
+        found, value = self.memory.get(versioned_key)
+        if found:
+            self._record_lookup(key, 'memory')
+            return value
+        value = self.shared.get(versioned_key)
+        self._record_lookup(key, 'miss' if value is None else 'shared')
+        if value is None:
+            value = compute()
+            if value is None:
+                return None
+            self.shared.set(versioned_key, value, timeout=timeout)
+        self.memory.set(versioned_key, value, timeout)
+        return value
+
+
+class Prefetcher:
+    """Runs cache-filling work in the background, at most once per key at a time."""
+
+    def __init__(self, max_workers: int = 2):
+        """
+        Args:
+            max_workers: Number of background prefetch threads
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, fn: Callable[[], Any]) -> bool:
+        """
+        Run fn in the background unless work for the same key is already queued.
+
+        Args:
+            key: Identifies the work (e.g. the cache key it fills)
+            fn: Work to run
+
+        Returns:
+            bool: Whether the work was queued
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+
+        def run():
+            try:
+                fn()
+            except Exception as e:
+                print(f"Error prefetching {key}: {e}")
+                traceback.print_exc()
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        self._executor.submit(run)
+        return True
@@ -0,0 +1,101 @@
+"""
+Production entry point for the chart annotator.
+
+Serves the app with gevent; the standard library is monkey-patched before
+anything else is imported, so database and cache I/O yield to other requests.
+PostgreSQL queries only yield when psycogreen is installed.
+
+    python server.py --port 8050
+    python server.py --port 8050 --workers 4 --message-queue redis://localhost:6379/0
+
+With several workers, worker i listens on port + i and Socket.IO broadcasts are
+relayed between workers through the message queue (a local `redis-server` or
+`docker run -p 6379:6379 redis` will do). psycogreen and redis come with the
+"server" extra: pip install "data_annotator[server]".
+Put a load balancer with sticky sessions (e.g. nginx ip_hash) in front of the
+ports: Socket.IO long-polling sessions and background jobs live in one worker.
+
+The database pool of each worker is sized with DB_POOL_SIZE and DB_MAX_OVERFLOW;
+with gevent one worker serves many requests at once, so raise them together
+with the expected concurrency (and keep workers x pool under max_connections).
+"""
+
+from gevent import monkey
+
+monkey.patch_all()
+
+try:
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+except ImportError:
+    print("psycogreen not installed; PostgreSQL queries will block their worker")
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+
+
+def serve(host, port, message_queue=None):
+    """Run one worker in this process"""
+    # app reads these when it creates its Socket.IO server
+    os.environ['SOCKETIO_ASYNC_MODE'] = 'gevent'
+    if message_queue:
+        os.environ['SOCKETIO_MESSAGE_QUEUE'] = message_queue
+
+    try:
+        from app import app, socketio, warm_chart_cache
+    except ImportError:
+        print("Error importing app from current directory")
+        try:
+            from data_annotator.app import app, socketio, warm_chart_cache
+        except ImportError:
+            print("Error importing app from data_annotator package")
+            raise
+
+    warm_chart_cache()
+    print(f"Worker {os.getpid()} serving on http://{host}:{port}")
+    socketio.run(app, host=host, port=port, debug=False, log_output=False)
+
+
+def run_workers(host, port, workers, message_queue):
+    """Start one worker process per port and wait for them to exit"""
+    processes = []
+    for index in range(workers):
+        command = [sys.executable, os.path.abspath(__file__), '--host', host,
+                   '--port', str(port + index), '--workers', '1', '--message-queue', message_queue]
+        processes.append(subprocess.Popen(command))
+
+    def stop(signum, frame):
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for process in processes:
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the chart annotator under gevent.')
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'), help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8050)),
+                        help='Port of the first worker')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WORKERS', 1)),
+                        help='Worker processes, each on its own port')
+    parser.add_argument('--message-queue', default=os.environ.get('SOCKETIO_MESSAGE_QUEUE'),
+                        help='Socket.IO message queue URL shared by the workers (e.g. redis://localhost:6379/0)')
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if not args.message_queue:
+            parser.error('--workers > 1 needs --message-queue so Socket.IO events reach every worker')
+        run_workers(args.host, args.port, args.workers, args.message_queue)
+    else:
+        serve(args.host, args.port, args.message_queue)
+
+
+if __name__ == '__main__':
+    main()
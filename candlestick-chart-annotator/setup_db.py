@@ -50,20 +50,7 @@ def setup_database():
     cur = conn.cursor()
 
     try:
-        # Create stocks table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS stocks (
-                id SERIAL PRIMARY KEY,
-                symbol VARCHAR(10) NOT NULL,
-                timestamp TIMESTAMP NOT NULL,
-                open FLOAT NOT NULL,
-                high FLOAT NOT NULL,
-                low FLOAT NOT NULL,
-                close FLOAT NOT NULL,
-                volume INTEGER NOT NULL,
-                UNIQUE(symbol, timestamp)
-            )
-        """)
+        # The stocks table is created (range partitioned by month) by DBManager.init_db
 
         # Create annotations table
         cur.execute("""
@@ -77,11 +64,6 @@ def setup_database():
         """)
 
         # Create indexes for better performance
-        cur.execute("""
-            CREATE INDEX IF NOT EXISTS idx_stocks_symbol_timestamp 
-            ON stocks(symbol, timestamp)
-        """)
-        
         cur.execute("""
             CREATE INDEX IF NOT EXISTS idx_annotations_stock_timestamp 
             ON annotations(stock, timestamp)
@@ -97,5 +79,22 @@ def setup_database():
         cur.close()
         conn.close()
 
+def partition_stocks():
+    """Convert an existing unpartitioned stocks table into monthly partitions"""
+    from db_manager import partition_stocks_table
+    if partition_stocks_table():
+        print("stocks table partitioned by month")
+
+def compact_stocks():
+    """Convert an existing stocks table into the compact candles layout"""
+    from db_manager import compact_stocks_table
+    if compact_stocks_table():
+        print("stocks converted to the compact candles layout")
+
 if __name__ == '__main__':
-    setup_database() 
\ No newline at end of file
+    import sys
+    setup_database()
+    if '--partition-stocks' in sys.argv:
+        partition_stocks()
+    if '--compact-stocks' in sys.argv:
+        compact_stocks()
@@ -4,16 +4,18 @@ const socket = io();
 // Store current annotations
 let currentAnnotations = [];
 
-// Listen for annotation updates
-socket.on('annotations_updated', function(data) {
-    console.log('Received annotations update:', data);
-    
-    // Update global annotations
-    window.annotations = data.annotations || [];
-    
-    // Filter for current stock and date
+// Version of the last annotation change applied locally (null until a snapshot or delta arrives)
+let annotationsVersion = null;
+
+// Filters limiting annotation requests to the visible stock and day
+function visibleAnnotationScope() {
+    return currentStock && currentDate ? {stock: currentStock, date: currentDate} : null;
+}
+
+// Re-filter the current stock/date and refresh the table and chart
+function refreshCurrentAnnotations() {
     if (currentStock && currentDate) {
-        window.currentAnnotations = window.annotations.filter(function(annotation) {
+        window.currentAnnotations = (window.annotations || []).filter(function(annotation) {
             return annotation.stock === currentStock && 
                    annotation.timestamp.substring(0, 10) === currentDate;
         });
@@ -33,20 +35,97 @@ socket.on('annotations_updated', function(data) {
     if (typeof drawAnnotations === 'function') {
         drawAnnotations();
     }
+}
+
+// Apply one change; replays of an already applied change are harmless
+function applyAnnotationChange(action, annotation) {
+    const others = (window.annotations || []).filter(a => a.id !== annotation.id);
+    window.annotations = action === 'added' ? others.concat([annotation]) : others;
+}
+
+// Fetch the changes missed since the last applied version
+function resyncAnnotations() {
+    if (annotationsVersion === null) {
+        return;
+    }
+    fetch(`/api/annotations/changes?since=${annotationsVersion}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                throw new Error(data.error);
+            }
+            data.changes.forEach(change => applyAnnotationChange(change.action, change.annotation));
+            annotationsVersion = data.version;
+            refreshCurrentAnnotations();
+            if (data.more) {
+                resyncAnnotations();
+            }
+        })
+        .catch(error => {
+            console.error('Error resyncing annotations, reloading visible ones:', error);
+            const scope = visibleAnnotationScope();
+            if (scope) {
+                socket.emit('get_annotations', scope);
+            }
+        });
+}
+
+function handleAnnotationDelta(action, data) {
+    if (annotationsVersion !== null && data.version <= annotationsVersion) {
+        return;
+    }
+    if (annotationsVersion !== null && data.version !== annotationsVersion + 1) {
+        // Missed at least one change
+        resyncAnnotations();
+        return;
+    }
+    applyAnnotationChange(action, data.annotation);
+    annotationsVersion = data.version;
+    refreshCurrentAnnotations();
+}
+
+// Listen for incremental annotation changes
+socket.on('annotation_added', function(data) {
+    handleAnnotationDelta('added', data);
+});
+
+socket.on('annotation_deleted', function(data) {
+    handleAnnotationDelta('deleted', data);
+});
+
+// A batch arrives as one event holding consecutive versions
+socket.on('annotations_changed', function(data) {
+    const changes = data.changes || [];
+    if (!changes.length || (annotationsVersion !== null && data.version <= annotationsVersion)) {
+        return;
+    }
+    if (annotationsVersion !== null && changes[0].version > annotationsVersion + 1) {
+        resyncAnnotations();
+        return;
+    }
+    changes.forEach(change => {
+        if (annotationsVersion === null || change.version > annotationsVersion) {
+            applyAnnotationChange(change.action, change.annotation);
+        }
+    });
+    annotationsVersion = data.version;
+    refreshCurrentAnnotations();
+});
+
+// Catch up on changes missed while disconnected
+socket.io.on('reconnect', function() {
+    resyncAnnotations();
 });
 
 // Initial load of annotations
 socket.on('annotations_data', function(data) {
+    window.annotations = data.annotations || [];
+    annotationsVersion = data.version !== undefined ? data.version : annotationsVersion;
     currentAnnotations = data.annotations;
     updateAnnotationsTable(currentAnnotations);
     updateAnnotationsOnChart();
 });
 
-// Request annotations on page load
-document.addEventListener('DOMContentLoaded', function() {
-    socket.emit('get_annotations');
-});
-
 // Update annotations table with consistent formatting and alignment
 function updateAnnotationsTable(annotations) {
     console.log("Updating annotations table with:", annotations);
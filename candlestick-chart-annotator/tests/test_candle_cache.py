@@ -0,0 +1,61 @@
+"""
+Tests for the candle cache of FyersDataProvider.
+
+    python -m unittest discover -s candlestick-chart-annotator/tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candle_cache import CandleCache
+from data_provider import FyersDataProvider
+from fyers import FyersBroker
+
+
+def make_broker(response):
+    """FyersBroker answering every history request with response, without credentials or rate limiting"""
+    broker = FyersBroker.__new__(FyersBroker)
+    broker.fyers_model = mock.Mock()
+    broker.fyers_model.history.return_value = response
+    broker.rate_limiter = mock.Mock()
+    broker.update_context = mock.Mock()
+    return broker
+
+
+@unittest.skipUnless(CandleCache.available(), 'pyarrow is not installed')
+class FyersDataProviderCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        with mock.patch('data_provider.FyersBroker'):
+            self.provider = FyersDataProvider(cache_dir=self.cache_dir.name)
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_error_response_leaves_days_uncovered(self):
+        self.provider.fyers_broker = make_broker({'s': 'error', 'code': -429, 'message': 'request limit reached'})
+
+        data = self.provider.get_historical_data('SBIN', '1', '2024-01-08', '2024-01-10')
+
+        self.assertTrue(data.empty)
+        self.assertTrue(self.provider.fyers_broker.fyers_model.history.called)
+        _, windows = self.provider.candle_cache.lookup('SBIN', '1', '2024-01-08', '2024-01-10')
+        self.assertEqual(windows, [('2024-01-08', '2024-01-10')])
+
+    def test_no_data_response_marks_days_covered(self):
+        self.provider.fyers_broker = make_broker({'s': 'no_data', 'candles': []})
+
+        self.provider.get_historical_data('SBIN', '1', '2024-01-08', '2024-01-10')
+
+        _, windows = self.provider.candle_cache.lookup('SBIN', '1', '2024-01-08', '2024-01-10')
+        self.assertEqual(windows, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
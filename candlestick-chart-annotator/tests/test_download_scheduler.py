@@ -0,0 +1,51 @@
+"""
+Tests for sync planning in DownloadScheduler.
+
+    python -m unittest discover -s candlestick-chart-annotator/tests
+"""
+
+import os
+import sys
+import unittest
+from datetime import date, datetime
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_scheduler import DownloadScheduler
+
+
+class PlanSyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mock.Mock()
+        self.provider = mock.Mock()
+        # One request per window, so units mirror the missing windows
+        self.provider.plan_windows.side_effect = lambda symbol, resolution, windows, max_gap_days=0: windows
+        self.scheduler = DownloadScheduler(self.provider, self.db)
+
+    def test_narrow_window_only_checks_requested_days(self):
+        self.db.get_stock_date_range.return_value = (datetime(2020, 1, 1, 9, 15), datetime(2024, 6, 14, 15, 29))
+        self.db.get_stock_trading_days.return_value = [
+            date(2024, 6, 10), date(2024, 6, 11), date(2024, 6, 13), date(2024, 6, 14)
+        ]
+
+        units = self.scheduler.plan_sync(['SBIN'], '1', '2024-06-10', '2024-06-14')
+
+        self.db.get_stock_trading_days.assert_called_once_with('SBIN', '1', date(2024, 6, 10), date(2024, 6, 14))
+        # The hole on the 12th and the last stored day, refreshed in case it was partial
+        self.assertEqual([(unit['start_date'], unit['end_date']) for unit in units],
+                         [('2024-06-12', '2024-06-12'), ('2024-06-14', '2024-06-14')])
+
+    def test_earlier_start_reaches_before_first_stored_day(self):
+        self.db.get_stock_date_range.return_value = (datetime(2024, 6, 12, 9, 15), datetime(2024, 6, 14, 15, 29))
+        self.db.get_stock_trading_days.return_value = [date(2024, 6, 12), date(2024, 6, 13), date(2024, 6, 14)]
+
+        units = self.scheduler.plan_sync(['SBIN'], '1', '2024-06-10', '2024-06-14')
+
+        self.assertEqual([(unit['start_date'], unit['end_date']) for unit in units],
+                         [('2024-06-10', '2024-06-11'), ('2024-06-14', '2024-06-14')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+NSE equity trading calendar.
+
+Trading days are weekdays that are not exchange holidays. The built-in holiday
+list follows the NSE equity segment circulars; further dates (e.g. special
+closures or future years) can be listed one per line in YYYY-MM-DD format in the
+file named by the NSE_HOLIDAYS_FILE environment variable. Years without any
+listed holiday are not covered: there only weekends are known to be closed.
+"""
+
+import os
+from datetime import date, timedelta
+from typing import FrozenSet, List
+
+NSE_HOLIDAYS = [
+    # 2023
+    '2023-01-26', '2023-03-07', '2023-03-30', '2023-04-04', '2023-04-07',
+    '2023-04-14', '2023-05-01', '2023-06-28', '2023-08-15', '2023-09-19',
+    '2023-10-02', '2023-10-24', '2023-11-14', '2023-11-27', '2023-12-25',
+    # 2024
+    '2024-01-22', '2024-01-26', '2024-03-08', '2024-03-25', '2024-03-29',
+    '2024-04-11', '2024-04-17', '2024-05-01', '2024-05-20', '2024-06-17',
+    '2024-07-17', '2024-08-15', '2024-10-02', '2024-11-01', '2024-11-15',
+    '2024-11-20', '2024-12-25',
+    # 2025
+    '2025-02-26', '2025-03-14', '2025-03-31', '2025-04-10', '2025-04-14',
+    '2025-04-18', '2025-05-01', '2025-08-15', '2025-08-27', '2025-10-02',
+    '2025-10-21', '2025-10-22', '2025-11-05', '2025-12-25',
+    # 2026
+    '2026-01-15', '2026-01-26', '2026-03-03', '2026-03-26', '2026-03-31',
+    '2026-04-03', '2026-04-14', '2026-05-01', '2026-05-28', '2026-06-26',
+    '2026-09-14', '2026-10-02', '2026-10-20', '2026-11-10', '2026-11-24',
+    '2026-12-25',
+]
+
+_holidays = None
+
+
+def holidays() -> FrozenSet[date]:
+    """Return the set of exchange holidays, including any listed in NSE_HOLIDAYS_FILE."""
+    global _holidays
+    if _holidays is None:
+        dates = list(NSE_HOLIDAYS)
+        extra_file = os.getenv('NSE_HOLIDAYS_FILE')
+        if extra_file and os.path.exists(extra_file):
+            with open(extra_file, 'r') as f:
+                dates.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+        _holidays = frozenset(date.fromisoformat(d) for d in dates)
+    return _holidays
+
+
+def covers(day: date) -> bool:
+    """Whether the holidays of the day's year are known (listed built in or in NSE_HOLIDAYS_FILE)."""
+    return any(holiday.year == day.year for holiday in holidays())
+
+
+def is_trading_day(day: date) -> bool:
+    """Whether the exchange trades on the given day."""
+    return day.weekday() < 5 and day not in holidays()
+
+
+def trading_days(start: date, end: date) -> List[date]:
+    """
+    List the trading days between start and end (inclusive).
+
+    Args:
+        start: First day
+        end: Last day
+
+    Returns:
+        List[date]: Trading days in the range, in order
+    """
+    days = []
+    current = start
+    while current <= end:
+        if is_trading_day(current):
+            days.append(current)
+        current += timedelta(days=1)
+    return days
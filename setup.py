@@ -46,6 +46,9 @@ setup(
     },
     include_package_data=True,
     install_requires=dependencies,
+    extras_require={
+        "server": ["psycogreen>=1.0.2", "redis>=5.0.0"],
+    },
     python_requires=">=3.10",
     entry_points={
         "console_scripts": [